@@ -2,7 +2,7 @@ from django.contrib import admin
 
 # Register your models here.
 
-from .models import Author, Genre, Book, BookInstance, Language
+from .models import Author, Genre, Book, BookInstance, Hold, Language
 
 """Minimal registration of Models.
 admin.site.register(Book)
@@ -73,3 +73,16 @@ class BookInstanceAdmin(admin.ModelAdmin):
             'fields': ('status', 'due_back', 'borrower')
         }),
     )
+
+
+@admin.register(Hold)
+class HoldAdmin(admin.ModelAdmin):
+    """Administration object for Hold models.
+    Defines:
+     - fields to be displayed in list view (list_display)
+     - filters that will be displayed in sidebar (list_filter)
+     - id inputs instead of selects for the (large) related tables (raw_id_fields)
+    """
+    list_display = ('book', 'patron', 'status', 'priority', 'placed', 'expires')
+    list_filter = ('status',)
+    raw_id_fields = ('book', 'patron', 'copy')
@@ -0,0 +1,129 @@
+"""Per-book copy counts, materialized in BookAvailability.
+
+Signal handlers (catalog/signals.py) call refresh() inside the transaction that
+creates, deletes or changes a BookInstance. Pages and the API then read one row
+per book instead of aggregating its copies on every request. Code that writes
+copies without signals (bulk_create(), queryset.update()) must call refresh()
+for the affected books. refresh() also drops the cached representations of the
+books it recounts (catalog/reprcache.py). ``manage.py
+reconcile_counters`` rebuilds every row.
+"""
+from django.db import transaction
+from django.db.models import Count, F, Min, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from . import reprcache, versioning
+from .models import Book, BookAvailability, BookInstance
+
+STATUS_FIELDS = {
+    'a': 'available',
+    'o': 'on_loan',
+    'r': 'reserved',
+    'm': 'maintenance',
+}
+
+FIELDS = ('total', *STATUS_FIELDS.values(), 'next_due_back')
+
+EMPTY = {field: 0 for field in FIELDS} | {'next_due_back': None}
+
+
+def aggregates():
+    """{field: aggregate over a book's copies} for each field of its BookAvailability row."""
+    expressions = {
+        'total': Count('id'),
+        'next_due_back': Min('due_back', filter=Q(status='o')),
+    }
+    for status, field in STATUS_FIELDS.items():
+        expressions[field] = Count('id', filter=Q(status=status))
+    return expressions
+
+
+def counts(book_ids):
+    """The per-book aggregate query over the copies of the given books (read from catalog_copy_book_status)."""
+    return (
+        BookInstance.objects.filter(book_id__in=book_ids)
+        .order_by().values('book_id').annotate(**aggregates())
+    )
+
+
+def compute(book_ids):
+    """Return {book_id: counts} aggregated from the copies of the given books."""
+    return {row.pop('book_id'): row for row in counts(book_ids)}
+
+
+def recount():
+    """{field: correlated subquery} recomputing each field of a BookAvailability row in an UPDATE."""
+    copies = BookInstance.objects.filter(book_id=OuterRef('book_id')).order_by().values('book_id')
+    fields = {}
+    for field, aggregate in aggregates().items():
+        value = Subquery(copies.annotate(value=aggregate).values('value'))
+        # A book without copies has no group, so no row: zero copies rather than NULL.
+        fields[field] = value if field == 'next_due_back' else Coalesce(value, 0)
+    return fields
+
+
+def refresh(book_ids):
+    """Recompute the availability rows of the given books.
+
+    The rows are locked first (in primary key order), so concurrent changes to
+    copies of the same book are applied one after the other. Existing rows are
+    recomputed by one UPDATE with a correlated subquery per field, which the
+    (book, status) copy index answers, however many books there are.
+    """
+    book_ids = sorted(set(book_ids))
+    if not book_ids:
+        return
+    with transaction.atomic():
+        existing = set(BookAvailability.objects.select_for_update().filter(book_id__in=book_ids)
+                       .order_by('book_id').values_list('book_id', flat=True))
+        if existing:
+            BookAvailability.objects.filter(book_id__in=existing).update(**recount())
+        missing = [book_id for book_id in book_ids if book_id not in existing]
+        if missing:
+            values = compute(missing)
+            BookAvailability.objects.bulk_create(
+                BookAvailability(book_id=book_id, **values.get(book_id, EMPTY))
+                for book_id in Book.objects.filter(id__in=missing).values_list('id', flat=True))
+    # The book API includes these counts.
+    reprcache.invalidate('book', book_ids)
+
+
+def shift(book_id, old_status, new_status):
+    """Move one copy of book_id from old_status to new_status with a single UPDATE.
+
+    For writers that know exactly what changed (catalog/circulation.py):
+    cheaper than refresh(), which counts every copy of the book again. The
+    earliest due date is recomputed in the same statement.
+    """
+    if old_status not in STATUS_FIELDS or new_status not in STATUS_FIELDS:
+        refresh([book_id])
+        return
+    next_due_back = (BookInstance.objects.filter(book_id=OuterRef('book_id'), status='o')
+                     .order_by().values('book_id').annotate(earliest=Min('due_back')).values('earliest'))
+    changes = {'next_due_back': Subquery(next_due_back)}
+    if old_status != new_status:
+        old_field, new_field = STATUS_FIELDS[old_status], STATUS_FIELDS[new_status]
+        # Never below zero, even if the row has drifted; reconcile_counters recounts it.
+        changes[old_field] = Greatest(F(old_field) - 1, 0)
+        changes[new_field] = F(new_field) + 1
+    if not BookAvailability.objects.filter(book_id=book_id).update(**changes):
+        refresh([book_id])
+        return
+    reprcache.invalidate('book', [book_id])
+
+
+def rebuild_all(chunk_size=1000):
+    """Recompute the availability row of every book; returns the number of books."""
+    book_ids = Book.objects.order_by('id').values_list('id', flat=True)
+    total = 0
+    chunk = []
+    for book_id in book_ids.iterator(chunk_size=chunk_size):
+        chunk.append(book_id)
+        if len(chunk) == chunk_size:
+            refresh(chunk)
+            total += len(chunk)
+            chunk = []
+    refresh(chunk)
+    # The book API shows these rows.
+    versioning.bump(versioning.BOOKINSTANCE)
+    return total + len(chunk)
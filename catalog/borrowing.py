@@ -0,0 +1,60 @@
+"""The books a user has not borrowed, for the "available to me" API.
+
+available_books() excludes the user's BorrowedBook rows with a NOT EXISTS
+anti-join, which the (borrower, book) index on BorrowedBook answers per book
+without reading the borrower's whole history. With CATALOG_BORROWED_CACHE_TIMEOUT
+set, the ids of the books a user has borrowed are also kept in Django's cache and
+excluded directly; the signal handlers in catalog/signals.py drop a user's entry
+when their BorrowedBook rows change. Across several worker processes the cache
+must be shared (memcached, Redis, database), or entries are only invalidated in
+the process that made the change.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from .models import Book, BorrowedBook
+
+CACHE_KEY = 'catalog:borrowed-book-ids:{}'
+
+# Users with more borrowed books than this are not cached: a long NOT IN list
+# costs more than the indexed anti-join it would replace.
+MAX_CACHED_IDS = 500
+
+
+def cache_timeout():
+    return getattr(settings, 'CATALOG_BORROWED_CACHE_TIMEOUT', 0)
+
+
+def borrowed_book_ids(user_id):
+    """Return the cached ids of the books user_id has borrowed, or None if not cached."""
+    timeout = cache_timeout()
+    if not timeout:
+        return None
+    key = CACHE_KEY.format(user_id)
+    ids = cache.get(key)
+    if ids is None:
+        ids = list(BorrowedBook.objects.filter(borrower_id=user_id)
+                   .order_by().values_list('book_id', flat=True).distinct()[:MAX_CACHED_IDS + 1])
+        if len(ids) > MAX_CACHED_IDS:
+            # Remember that this user is not cached, so the count is not re-read.
+            ids = False
+        cache.set(key, ids, timeout)
+    return None if ids is False else ids
+
+
+def invalidate(user_id):
+    """Forget the cached borrowed-book ids of user_id once the current transaction commits."""
+    if cache_timeout():
+        transaction.on_commit(lambda: cache.delete(CACHE_KEY.format(user_id)))
+
+
+def available_books(user, queryset=None):
+    """Return the books in queryset (default all books) that user has not borrowed."""
+    queryset = Book.objects.all() if queryset is None else queryset
+    ids = borrowed_book_ids(user.pk)
+    if ids is not None:
+        return queryset.exclude(pk__in=ids)
+    borrowed = BorrowedBook.objects.filter(borrower=user, book=OuterRef('pk'))
+    return queryset.filter(~Exists(borrowed))
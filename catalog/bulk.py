@@ -0,0 +1,217 @@
+"""Bulk creation of books, authors and book copies for the bulk API endpoints.
+
+A loader validates its input one chunk at a time: the fields of each row with
+a serializer, then the related primary keys of the whole chunk with one query
+per related model (and, for books, the ISBNs with one more). Valid rows are
+inserted with bulk_create() in one transaction per chunk; invalid rows are
+reported with their position in the input and never abort the other rows.
+
+bulk_create() sends no model signals, so each chunk also updates what the
+handlers in catalog/signals.py would have: the home page counters, the
+BookAvailability rows, the search journal, the version stamps and the page
+cache tags.
+"""
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from rest_framework import serializers
+from rest_framework.exceptions import ParseError
+
+from . import availability, counters, pagecache, versioning
+from .models import Author, Book, BookAvailability, BookInstance, Genre, Language, SearchJournal
+from .serializers import AuthorSerializer
+
+
+MAX_CHUNK_SIZE = 5000
+
+
+def chunk_size_setting():
+    return getattr(settings, 'CATALOG_BULK_CHUNK_SIZE', 500)
+
+
+def chunked(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+class BookBulkSerializer(serializers.ModelSerializer):
+    # Related ids and ISBN uniqueness are checked for a whole chunk by the loader.
+    author = serializers.IntegerField()
+    language = serializers.IntegerField()
+    genre = serializers.ListField(child=serializers.IntegerField(), required=False)
+    isbn = serializers.CharField(max_length=13)
+
+    class Meta:
+        model = Book
+        fields = ['title', 'author', 'summary', 'isbn', 'genre', 'language']
+
+
+class BookInstanceBulkSerializer(serializers.ModelSerializer):
+    book = serializers.IntegerField()
+    borrower = serializers.IntegerField(required=False, allow_null=True)
+
+    class Meta:
+        model = BookInstance
+        fields = ['book', 'imprint', 'due_back', 'borrower', 'status']
+
+
+class BulkLoader:
+    """Validate and insert rows of one model; see the module docstring."""
+    model = None
+    serializer_class = None
+    # {field: model} of the foreign keys whose ids are checked per chunk.
+    related = {}
+    # {field: model} of the many-to-many fields given as lists of ids.
+    many_related = {}
+
+    def __init__(self, chunk_size=None):
+        self.chunk_size = max(min(chunk_size or chunk_size_setting(), MAX_CHUNK_SIZE), 1)
+        self.created = []
+        self.errors = []
+
+    def load(self, rows):
+        """Insert every valid row; returns self with .created (pks) and .errors filled in."""
+        for number, chunk in enumerate(chunked(rows, self.chunk_size)):
+            start = number * self.chunk_size
+            valid = self.validate_chunk(chunk, start)
+            if valid:
+                self.insert(valid)
+        return self
+
+    def error(self, index, errors):
+        self.errors.append({'index': index, 'errors': errors})
+
+    def validate_chunk(self, chunk, start):
+        """Return [(index, data)] for the rows of chunk that passed validation."""
+        valid = []
+        for index, row in enumerate(chunk, start):
+            if isinstance(row, ParseError):
+                # An NDJSON line that is not valid JSON (see catalog/parsers.py).
+                self.error(index, {'non_field_errors': [row.detail]})
+                continue
+            serializer = self.serializer_class(data=row)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                self.error(index, serializer.errors)
+        return self.check_related(valid)
+
+    def related_ids(self, field, data):
+        value = data.get(field)
+        if field in self.many_related:
+            return value or []
+        return [] if value is None else [value]
+
+    def check_related(self, valid):
+        fields = {**self.related, **self.many_related}
+        existing = {}
+        for field, model in fields.items():
+            ids = {pk for _, data in valid for pk in self.related_ids(field, data)}
+            existing[field] = set(model.objects.filter(pk__in=ids).order_by().values_list('pk', flat=True)) if ids else set()
+        checked = []
+        for index, data in valid:
+            errors = {}
+            for field in fields:
+                missing = [pk for pk in self.related_ids(field, data) if pk not in existing[field]]
+                if missing:
+                    errors[field] = [f'Invalid pk "{pk}" - object does not exist.' for pk in missing]
+            if errors:
+                self.error(index, errors)
+            else:
+                checked.append((index, data))
+        return checked
+
+    def build(self, data):
+        values = {field: value for field, value in data.items() if field not in self.many_related}
+        for field in self.related:
+            if field in values:
+                values[f'{field}_id'] = values.pop(field)
+        return self.model(**values)
+
+    def insert(self, valid):
+        rows = [(index, data, self.build(data)) for index, data in valid]
+        try:
+            with transaction.atomic():
+                self.model.objects.bulk_create([obj for _, _, obj in rows])
+                self.after_insert(rows)
+        except IntegrityError:
+            # A row conflicts with a concurrent write or with another row;
+            # insert the chunk row by row to find out which.
+            rows = [(index, data, self.build(data)) for index, data in valid]
+            with transaction.atomic():
+                inserted = []
+                for index, data, obj in rows:
+                    try:
+                        with transaction.atomic():
+                            self.model.objects.bulk_create([obj])
+                    except IntegrityError as exc:
+                        self.error(index, {'non_field_errors': [str(exc)]})
+                    else:
+                        inserted.append((index, data, obj))
+                self.after_insert(inserted)
+            rows = inserted
+        self.created.extend(obj.pk for _, _, obj in rows)
+
+    def after_insert(self, rows):
+        """Do what the model's signal handlers would have done for the inserted rows."""
+
+
+class AuthorLoader(BulkLoader):
+    model = Author
+    serializer_class = AuthorSerializer
+
+    def after_insert(self, rows):
+        counters.increment(counters.AUTHORS, len(rows))
+        versioning.bump(versioning.AUTHOR)
+        pagecache.invalidate(pagecache.list_tag(Author))
+
+
+class BookLoader(BulkLoader):
+    model = Book
+    serializer_class = BookBulkSerializer
+    related = {'author': Author, 'language': Language}
+    many_related = {'genre': Genre}
+
+    def check_related(self, valid):
+        valid = super().check_related(valid)
+        isbns = [data['isbn'] for _, data in valid]
+        taken = set(Book.objects.filter(isbn__in=isbns).order_by().values_list('isbn', flat=True))
+        checked = []
+        for index, data in valid:
+            if data['isbn'] in taken:
+                self.error(index, {'isbn': ['book with this ISBN already exists.']})
+            else:
+                taken.add(data['isbn'])
+                checked.append((index, data))
+        return checked
+
+    def after_insert(self, rows):
+        Through = Book.genre.through
+        Through.objects.bulk_create(
+            Through(book_id=book.pk, genre_id=genre_id)
+            for _, data, book in rows for genre_id in set(data.get('genre', ())))
+        BookAvailability.objects.bulk_create(BookAvailability(book_id=book.pk) for _, _, book in rows)
+        SearchJournal.objects.bulk_create(SearchJournal(book_id=book.pk) for _, _, book in rows)
+        counters.increment(counters.BOOKS, len(rows))
+        versioning.bump(versioning.BOOK)
+        pagecache.invalidate(
+            pagecache.list_tag(Book),
+            *{f'author:{book.author_id}' for _, _, book in rows},
+            *{f'genre:{genre_id}' for _, data, _ in rows for genre_id in data.get('genre', ())})
+
+
+class BookInstanceLoader(BulkLoader):
+    model = BookInstance
+    serializer_class = BookInstanceBulkSerializer
+    related = {'book': Book, 'borrower': User}
+
+    def after_insert(self, rows):
+        copies = [copy for _, _, copy in rows]
+        counters.increment(counters.INSTANCES, len(copies))
+        counters.increment(counters.INSTANCES_AVAILABLE, sum(copy.status == 'a' for copy in copies))
+        availability.refresh(copy.book_id for copy in copies)
+        versioning.bump(versioning.BOOKINSTANCE)
+        pagecache.invalidate(*{f'book:{copy.book_id}' for copy in copies})
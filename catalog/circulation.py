@@ -0,0 +1,202 @@
+"""Borrowing, returning, renewing and reserving book copies safely under concurrency.
+
+Hold queues are kept in catalog/holds.py: a returned or released copy goes to
+the first waiting hold, and borrowing fulfils the patron's hold.
+
+Every operation claims one BookInstance row and changes it in a single
+transaction together with its BorrowedBook history. Nothing else is locked:
+patrons borrowing different copies never wait for each other, and a patron
+asking for any copy of a book gets a free one even while other copies of the
+same book are being checked out.
+
+- On databases with SELECT ... FOR UPDATE SKIP LOCKED (PostgreSQL, MySQL 8,
+  Oracle), the claim locks the first matching row no other transaction holds.
+- Elsewhere (SQLite), candidates are read first, in random order, and each
+  is claimed with an UPDATE conditioned on the copy's version column and
+  the operation's filter. Exactly one of several concurrent claims on a copy
+  changes it; the others move on to the next candidate. The UPDATE is the
+  first statement of its transaction, so SQLite takes the write lock once,
+  through its busy timeout, and never fails on a lock upgrade.
+
+The model signals do not fire on these updates, so each operation also
+shifts the copy between the counts of the book's availability row and
+invalidates its cached pages in the same transaction. The home page counter and the version stamps, rows every
+checkout would otherwise queue on, are adjusted once the transaction commits.
+"""
+import datetime
+import random
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+
+from . import availability, counters, holds, pagecache, versioning
+from .models import BookInstance, BorrowedBook
+
+# Candidate copies read per attempt, and attempts made, on databases without SKIP LOCKED.
+CANDIDATES = 10
+MAX_ATTEMPTS = 5
+
+ROW_FIELDS = ('pk', 'book_id', 'borrower_id', 'status', 'version')
+
+
+class CirculationError(Exception):
+    pass
+
+
+class NoCopyAvailable(CirculationError):
+    pass
+
+
+def loan_period():
+    return datetime.timedelta(days=getattr(settings, 'CATALOG_LOAN_PERIOD_DAYS', 21))
+
+
+def check_due_back(due_back):
+    """Raise CirculationError unless due_back is between today and one loan period ahead."""
+    today = datetime.date.today()
+    if due_back < today:
+        raise CirculationError('A loan cannot be due back in the past.')
+    if due_back > today + loan_period():
+        raise CirculationError(f'A loan cannot be due back more than {loan_period().days} days ahead.')
+
+
+def _claim(queryset, changes, history=None):
+    """Apply changes to one row of queryset, then history(row) in the same transaction.
+
+    history runs once the change is recorded, so it may claim the copy again
+    (as returning a copy does for the next hold).
+    Copies reserved ('r') are tried first. Returns the claimed row (ROW_FIELDS
+    as read before the change), or None if no row of queryset could be claimed.
+    """
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            row = (queryset.select_for_update(skip_locked=True)
+                   .order_by('-status').values(*ROW_FIELDS).first())
+            if row is not None:
+                _update(queryset, row, changes)
+                _record(row, changes, history)
+            return row
+    for _ in range(MAX_ATTEMPTS):
+        rows = list(queryset.order_by().values(*ROW_FIELDS)[:CANDIDATES])
+        if not rows:
+            return None
+        random.shuffle(rows)
+        rows.sort(key=lambda row: row['status'] != 'r')
+        for row in rows:
+            with transaction.atomic():
+                if _update(queryset, row, changes):
+                    _record(row, changes, history)
+                    return row
+    return None
+
+
+def _update(queryset, row, changes):
+    """Change row if it still matches queryset and is at the version read; returns whether it did."""
+    return queryset.filter(pk=row['pk'], version=row['version']).update(version=F('version') + 1, **changes) == 1
+
+
+def _record(row, changes, history):
+    old_status, new_status = row['status'], changes.get('status', row['status'])
+    availability.shift(row['book_id'], old_status, new_status)
+    pagecache.invalidate(f"book:{row['book_id']}")
+    if history is not None:
+        history(row)
+
+    def committed():
+        if old_status != new_status and 'a' in (old_status, new_status):
+            counters.increment(counters.INSTANCES_AVAILABLE, 1 if new_status == 'a' else -1)
+        versioning.bump(versioning.BOOKINSTANCE)
+
+    transaction.on_commit(committed)
+
+
+def borrow(user, book=None, copy=None, due_back=None):
+    """Lend user a copy, either the given one or any free copy of book; returns the copy's id.
+
+    A copy reserved for user counts as free; user's hold on the book, if
+    any, is fulfilled. due_back must be within one loan period from today.
+    Raises NoCopyAvailable, or CirculationError for a due_back out of range.
+    """
+    if (book is None) == (copy is None):
+        raise TypeError('Pass either book or copy.')
+    due_back = due_back or datetime.date.today() + loan_period()
+    check_due_back(due_back)
+    queryset = BookInstance.objects.filter(Q(status='a') | Q(status='r', borrower=user))
+    queryset = queryset.filter(pk=getattr(copy, 'pk', copy)) if copy is not None else queryset.filter(book=book)
+
+    def history(row):
+        BorrowedBook.objects.create(book_id=row['book_id'], borrower=user)
+        holds.fulfil(user, row['book_id'], row['pk'])
+
+    row = _claim(queryset, {'status': 'o', 'borrower': user, 'due_back': due_back}, history)
+    if row is None:
+        raise NoCopyAvailable('This copy is not available.' if copy is not None
+                              else 'No copy of this book is available.')
+    return row['pk']
+
+
+def return_copy(copy):
+    """Take back a copy on loan; returns the copy's id.
+
+    The borrower's oldest open BorrowedBook is closed, and the copy goes to the
+    first hold waiting for the book, if any.
+    """
+    def history(row):
+        loan = (BorrowedBook.objects.filter(borrower_id=row['borrower_id'], book_id=row['book_id'],
+                                            returned_date=None)
+                .order_by('borrowed_date', 'pk').values_list('pk', flat=True).first())
+        if loan is not None:
+            BorrowedBook.objects.filter(pk=loan).update(returned_date=datetime.date.today())
+        holds.allocate(row['book_id'], copy=row['pk'])
+
+    queryset = BookInstance.objects.filter(pk=getattr(copy, 'pk', copy), status='o')
+    row = _claim(queryset, {'status': 'a', 'borrower': None, 'due_back': None, 'overdue_since': None}, history)
+    if row is None:
+        raise CirculationError('This copy is not on loan.')
+    return row['pk']
+
+
+def renew(copy, due_back=None):
+    """Extend the loan of a copy to due_back (default: one loan period from today); returns the copy's id."""
+    due_back = due_back or datetime.date.today() + loan_period()
+    if due_back < datetime.date.today():
+        raise CirculationError('A loan cannot be renewed into the past.')
+    queryset = BookInstance.objects.filter(pk=getattr(copy, 'pk', copy), status='o')
+    row = _claim(queryset, {'due_back': due_back, 'overdue_since': None})
+    if row is None:
+        raise CirculationError('This copy is not on loan.')
+    return row['pk']
+
+
+def reserve(user, book=None, copy=None, history=None):
+    """Set a free copy aside for user, either the given one or any free copy of book; returns the copy's id.
+
+    user may be a User or its id. history(row), if given, runs in the same
+    transaction and may raise to undo the reservation (see holds.allocate()).
+    Raises NoCopyAvailable.
+    """
+    if (book is None) == (copy is None):
+        raise TypeError('Pass either book or copy.')
+    queryset = BookInstance.objects.filter(status='a')
+    queryset = queryset.filter(pk=getattr(copy, 'pk', copy)) if copy is not None else queryset.filter(book=book)
+    row = _claim(queryset, {'status': 'r', 'borrower_id': getattr(user, 'pk', user), 'due_back': None}, history)
+    if row is None:
+        raise NoCopyAvailable('No copy of this book is available.')
+    return row['pk']
+
+
+def release(copy, user):
+    """Take back a copy reserved for user (a User or its id); returns the copy's id.
+
+    Like a returned copy, it goes to the first hold waiting for the book.
+    """
+    def history(row):
+        holds.allocate(row['book_id'], copy=row['pk'])
+
+    queryset = BookInstance.objects.filter(pk=getattr(copy, 'pk', copy), status='r',
+                                           borrower_id=getattr(user, 'pk', user))
+    row = _claim(queryset, {'status': 'a', 'borrower': None}, history)
+    if row is None:
+        raise CirculationError('This copy is not reserved for this patron.')
+    return row['pk']
@@ -0,0 +1,148 @@
+"""Compiled read-only serializers: a ModelSerializer declaration turned into a function over values() rows.
+
+compile_serializer() inspects a serializer's readable fields once. The result
+lists the QuerySet.values() columns to fetch and converts a page of rows
+column by column: no model instances, no per-field get_attribute() /
+to_representation() calls, dates formatted in one pass and method fields
+answered by one bulk query per page. The output is the same as the
+serializer's, down to the rendered bytes.
+
+Supported fields:
+- model fields;
+- primary-key relations;
+- nested serializers over forward or one-to-one relations;
+- SerializerMethodFields that the serializer backs with a bulk_<method
+  name>(pks) method returning {pk: value}.
+
+Anything else raises NotCompilable, and CompiledListMixin falls back to the
+serializer.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import ISO_8601, serializers
+from rest_framework.fields import empty
+from rest_framework.settings import api_settings
+
+
+class NotCompilable(Exception):
+    pass
+
+
+# Field classes whose to_representation() is exactly one of these functions.
+PLAIN_CONVERTERS = {
+    serializers.CharField: str,
+    serializers.EmailField: str,
+    serializers.SlugField: str,
+    serializers.URLField: str,
+    serializers.IntegerField: int,
+    serializers.BooleanField: None,
+    serializers.FloatField: float,
+}
+
+
+def converter(field):
+    """Return a function mapping a list of non-null column values as field.to_representation() would."""
+    field_type = type(field)
+    if field_type in PLAIN_CONVERTERS:
+        convert = PLAIN_CONVERTERS[field_type]
+        if convert is None:
+            return lambda values: [field.to_representation(value) for value in values]
+        return lambda values: list(map(convert, values))
+    if field_type is serializers.DateField:
+        output_format = getattr(field, 'format', api_settings.DATE_FORMAT)
+        if output_format is None:
+            return lambda values: values
+        if output_format.lower() == ISO_8601:
+            return lambda values: [value.isoformat() if value else None for value in values]
+        return lambda values: [value.strftime(output_format) if value else None for value in values]
+    if field_type is serializers.UUIDField and field.uuid_format == 'hex_verbose':
+        return lambda values: list(map(str, values))
+    if field_type is serializers.PrimaryKeyRelatedField and field.pk_field is None:
+        return lambda values: values
+    if isinstance(field, (serializers.RelatedField, serializers.ManyRelatedField, serializers.BaseSerializer,
+                          serializers.SerializerMethodField)) or field.source == '*':
+        raise NotCompilable(f'{field.field_name}: {field_type.__name__}')
+    return lambda values: [field.to_representation(value) for value in values]
+
+
+def convert_column(convert, values):
+    """Apply convert to the non-null values; like the serializer, None stays None."""
+    present = [index for index, value in enumerate(values) if value is not None]
+    if len(present) == len(values):
+        return convert(values)
+    result = [None] * len(values)
+    for index, value in zip(present, convert([values[index] for index in present])):
+        result[index] = value
+    return result
+
+
+class CompiledSerializer:
+    """The compiled form of one serializer; see compile_serializer()."""
+
+    def __init__(self, serializer, prefix=''):
+        self.serializer = serializer
+        model = serializer.Meta.model
+        self.pk_column = prefix + model._meta.pk.name
+        self.columns = [self.pk_column]
+        # (field name, kind, detail) in field order.
+        self.fields = []
+        for field in serializer._readable_fields:
+            name = field.field_name
+            if isinstance(field, serializers.SerializerMethodField):
+                bulk = getattr(serializer, f'bulk_{field.method_name}', None)
+                if bulk is None:
+                    raise NotCompilable(f'{name}: no bulk_{field.method_name}()')
+                self.fields.append((name, 'method', bulk))
+                continue
+            if len(field.source_attrs) != 1 or field.default is not empty:
+                raise NotCompilable(name)
+            try:
+                model_field = model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                raise NotCompilable(name)
+            if isinstance(field, serializers.BaseSerializer):
+                if not model_field.one_to_one and not model_field.many_to_one:
+                    raise NotCompilable(name)
+                nested = CompiledSerializer(field, prefix + field.source + '__')
+                self.columns += nested.columns
+                self.fields.append((name, 'nested', nested))
+                continue
+            if not model_field.concrete or model_field.many_to_many:
+                raise NotCompilable(name)
+            column = prefix + field.source
+            if column != self.pk_column:
+                self.columns.append(column)
+            self.fields.append((name, 'column', (column, converter(field))))
+
+    def serialize(self, rows):
+        """Return the representations of rows (dicts of self.columns), as the serializer would."""
+        rows = list(rows)
+        pks = [row[self.pk_column] for row in rows]
+        names, columns = [], []
+        for name, kind, detail in self.fields:
+            names.append(name)
+            if kind == 'column':
+                column, convert = detail
+                columns.append(convert_column(convert, [row[column] for row in rows]))
+            elif kind == 'method':
+                values = detail([pk for pk in pks if pk is not None])
+                columns.append([values[pk] for pk in pks])
+            else:
+                # A missing related row is None, as select_related() leaves it.
+                present = [row[detail.pk_column] is not None for row in rows]
+                nested = iter(detail.serialize([row for row, found in zip(rows, present) if found]))
+                columns.append([next(nested) if found else None for found in present])
+        if not columns:
+            return [{} for _ in rows]
+        return [dict(zip(names, values)) for values in zip(*columns)]
+
+
+def compile_serializer(serializer):
+    """Compile a (non-list) ModelSerializer instance; raises NotCompilable."""
+    if isinstance(serializer, serializers.ListSerializer) or not hasattr(getattr(serializer, 'Meta', None), 'model'):
+        raise NotCompilable(type(serializer).__name__)
+    return CompiledSerializer(serializer)
+
+
+def rows(queryset, compiled):
+    """Return queryset as the values() rows compiled needs, without its eager-loading lookups."""
+    return queryset.select_related(None).prefetch_related(None).defer(None).values(*compiled.columns)
@@ -0,0 +1,127 @@
+"""gzip / deflate response compression with a cache of compressed bodies (see CompressionMiddleware).
+
+The coding is negotiated from Accept-Encoding (gzip preferred, q=0 honoured).
+Bodies under CATALOG_COMPRESSION_MIN_SIZE bytes, already encoded or of a type
+that does not compress (images, archives) are sent as they are.
+
+A response carrying an ETag (every view under versioning.conditional) is the
+same bytes until the ETag changes, so its compressed body is cached under the
+request path, the Accept header, the coding and the ETag: a hot payload, such
+as a page served from the page cache, is compressed once instead of on every
+request. Streaming responses (exports, long API lists) are compressed chunk by
+chunk and flushed after each one, so the client still gets them incrementally.
+"""
+import hashlib
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+
+PREFIX = 'catalog:compressed:'
+
+# zlib wbits of each content coding: a gzip member, or a zlib stream (HTTP "deflate").
+WBITS = {'gzip': 31, 'deflate': 15}
+
+COMPRESSIBLE_TYPES = (
+    'text/',
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'application/x-ndjson',
+)
+
+
+def min_size():
+    return getattr(settings, 'CATALOG_COMPRESSION_MIN_SIZE', 1024)
+
+
+def timeout():
+    return getattr(settings, 'CATALOG_COMPRESSION_CACHE_TIMEOUT', 0)
+
+
+def negotiate(accept_encoding):
+    """Return the coding to use for an Accept-Encoding header, or None."""
+    weights = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        weight = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        if coding:
+            weights[coding] = weight
+    # The highest weight wins; gzip on a tie.
+    weight, _, coding = max((weights.get(coding, weights.get('*', 0.0)), -index, coding)
+                            for index, coding in enumerate(WBITS))
+    return coding if weight > 0 else None
+
+
+def compressor(coding):
+    return zlib.compressobj(6, zlib.DEFLATED, WBITS[coding])
+
+
+def compress(coding, data):
+    engine = compressor(coding)
+    return engine.compress(data) + engine.flush()
+
+
+def compress_sequence(coding, chunks):
+    engine = compressor(coding)
+    for chunk in chunks:
+        data = engine.compress(chunk) + engine.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield engine.flush()
+
+
+def cache_key(request, coding, etag):
+    key = f"{request.get_full_path()}|{request.META.get('HTTP_ACCEPT', '')}|{coding}|{etag}"
+    return PREFIX + hashlib.sha1(key.encode()).hexdigest()
+
+
+def compressible(response):
+    content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+    return (not response.has_header('Content-Encoding')
+            and content_type.startswith(COMPRESSIBLE_TYPES)
+            and (response.streaming or len(response.content) >= min_size()))
+
+
+def compress_response(request, response):
+    """Compress response in place if the client accepts it; returns response."""
+    patch_vary_headers(response, ('Accept-Encoding',))
+    coding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    if coding is None or not compressible(response):
+        return response
+    if response.streaming:
+        response.streaming_content = compress_sequence(coding, response.streaming_content)
+        del response['Content-Length']
+    else:
+        etag = response.get('ETag')
+        cacheable = etag and response.status_code == 200 and timeout()
+        key = cache_key(request, coding, etag) if cacheable else None
+        content = response.content
+        # The cached body is only used for a response of the same length.
+        cached = cache.get(key) if key else None
+        if cached is not None and cached[0] == len(content):
+            compressed = cached[1]
+            response['X-Catalog-Compressed'] = 'hit'
+        else:
+            compressed = compress(coding, content)
+            if len(compressed) >= len(content):
+                return response
+            if key:
+                cache.set(key, (len(content), compressed), timeout())
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+    # The compressed body is another representation: only weakly equal (RFC 9110 8.8.1).
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response['ETag'] = 'W/' + etag
+    response['Content-Encoding'] = coding
+    return response
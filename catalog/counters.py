@@ -0,0 +1,59 @@
+"""Denormalized record counts for the catalog home page.
+
+The counts live in CatalogCounter rows, adjusted by the signal handlers in
+catalog/signals.py whenever a Book, Author or BookInstance is created, deleted
+or changes status. Anything that bypasses model signals (queryset.update(),
+bulk_create(), raw SQL) should be followed by reconcile(), which is what
+``manage.py reconcile_counters`` runs.
+"""
+from django.db import transaction
+from django.db.models import F
+
+from .models import Author, Book, BookInstance, CatalogCounter
+
+BOOKS = 'books'
+INSTANCES = 'instances'
+INSTANCES_AVAILABLE = 'instances_available'
+AUTHORS = 'authors'
+
+COUNTER_NAMES = (BOOKS, INSTANCES, INSTANCES_AVAILABLE, AUTHORS)
+
+
+def exact_counts(names=COUNTER_NAMES):
+    """Return freshly computed counts (one COUNT(*) per name) as a dict."""
+    querysets = {
+        BOOKS: Book.objects.all(),
+        INSTANCES: BookInstance.objects.all(),
+        INSTANCES_AVAILABLE: BookInstance.objects.filter(status__exact='a'),
+        AUTHORS: Author.objects.all(),
+    }
+    return {name: querysets[name].count() for name in names}
+
+
+def reconcile(names=COUNTER_NAMES):
+    """Overwrite the stored counters with exact values and return them."""
+    values = exact_counts(names)
+    with transaction.atomic():
+        for name, value in values.items():
+            CatalogCounter.objects.update_or_create(name=name, defaults={'value': value})
+    return values
+
+
+def increment(name, delta=1):
+    """Atomically add delta to a counter, creating it from an exact count if missing."""
+    if not delta:
+        return
+    updated = CatalogCounter.objects.filter(name=name).update(value=F('value') + delta)
+    if not updated:
+        # The change being recorded is already visible to COUNT(*).
+        reconcile([name])
+
+
+def get_counts():
+    """Return all home page counts with a single query."""
+    counts = dict(
+        CatalogCounter.objects.filter(name__in=COUNTER_NAMES).values_list('name', 'value'))
+    missing = [name for name in COUNTER_NAMES if name not in counts]
+    if missing:
+        counts.update(reconcile(missing))
+    return counts
@@ -0,0 +1,131 @@
+"""Streaming export of the catalog as CSV or NDJSON.
+
+Each dataset reads its table with QuerySet.iterator() and resolves the names of
+related authors, languages, books and genres with one query per related table
+for each chunk of rows, so memory use depends on the chunk size and not on
+the size of the catalog. stream() yields the encoded text one chunk at a time,
+for StreamingHttpResponse (the export API view) or a file (``manage.py
+export_catalog``).
+"""
+import csv
+import io
+import json
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Author, Book, BookInstance, Language
+
+FORMATS = ('csv', 'ndjson')
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def chunked(iterable, size):
+    iterable = iter(iterable)
+    while chunk := list(islice(iterable, size)):
+        yield chunk
+
+
+def author_names(author_ids):
+    """{pk: (first name, last name)} for the given author pks."""
+    authors = Author.objects.filter(pk__in=set(author_ids) - {None}).order_by()
+    return {pk: (first, last) for pk, first, last in authors.values_list('pk', 'first_name', 'last_name')}
+
+
+def book_chunks(chunk_size):
+    books = Book.objects.order_by('pk').values_list('pk', 'title', 'isbn', 'author_id', 'language_id', 'summary')
+    Through = Book.genre.through
+    for chunk in chunked(books.iterator(chunk_size=chunk_size), chunk_size):
+        authors = author_names(row[3] for row in chunk)
+        languages = dict(Language.objects.filter(pk__in={row[4] for row in chunk}).values_list('pk', 'name'))
+        genres = {}
+        links = Through.objects.filter(book_id__in=[row[0] for row in chunk]).order_by('genre__name')
+        for book_id, name in links.values_list('book_id', 'genre__name'):
+            genres.setdefault(book_id, []).append(name)
+        yield [{
+            'id': pk,
+            'title': title,
+            'isbn': isbn,
+            'author': ' '.join(authors[author_id]).strip() if author_id in authors else None,
+            # The name in two columns as well, so that importing the dump finds the same author again.
+            'author_first_name': authors.get(author_id, (None, None))[0],
+            'author_last_name': authors.get(author_id, (None, None))[1],
+            'language': languages.get(language_id),
+            'genres': genres.get(pk, []),
+            'summary': summary,
+        } for pk, title, isbn, author_id, language_id, summary in chunk]
+
+
+def author_chunks(chunk_size):
+    authors = Author.objects.order_by('pk').values(
+        'id', 'first_name', 'last_name', 'date_of_birth', 'date_of_death')
+    yield from chunked(authors.iterator(chunk_size=chunk_size), chunk_size)
+
+
+def bookinstance_chunks(chunk_size):
+    copies = BookInstance.objects.order_by('pk').values_list('pk', 'book_id', 'imprint', 'status', 'due_back')
+    for chunk in chunked(copies.iterator(chunk_size=chunk_size), chunk_size):
+        books = {pk: (title, isbn) for pk, title, isbn in Book.objects.filter(
+            pk__in={row[1] for row in chunk}).order_by().values_list('pk', 'title', 'isbn')}
+        yield [{
+            'id': pk,
+            'book_id': book_id,
+            'title': books.get(book_id, (None, None))[0],
+            'isbn': books.get(book_id, (None, None))[1],
+            'imprint': imprint,
+            'status': status,
+            'due_back': due_back,
+        } for pk, book_id, imprint, status, due_back in chunk]
+
+
+# {dataset: (columns, function yielding lists of row dicts)}
+DATASETS = {
+    'books': (('id', 'title', 'isbn', 'author', 'author_first_name', 'author_last_name', 'language', 'genres',
+               'summary'), book_chunks),
+    'authors': (('id', 'first_name', 'last_name', 'date_of_birth', 'date_of_death'), author_chunks),
+    'bookinstances': (('id', 'book_id', 'title', 'isbn', 'imprint', 'status', 'due_back'), bookinstance_chunks),
+}
+
+
+def csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        return '; '.join(value)
+    return value
+
+
+def encode_csv(columns, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for chunk in chunks:
+        writer.writerows([csv_value(row[column]) for column in columns] for row in chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Just the header when there are no rows.
+    yield buffer.getvalue()
+
+
+def encode_ndjson(columns, chunks):
+    for chunk in chunks:
+        yield ''.join(json.dumps(row, cls=DjangoJSONEncoder) + '\n' for row in chunk)
+
+
+def encode(fmt, columns, chunks):
+    """Yield chunks of row dicts encoded as fmt, one piece of text per chunk."""
+    encoder = encode_csv if fmt == 'csv' else encode_ndjson
+    return (text for text in encoder(columns, chunks) if text)
+
+
+def stream(dataset, fmt, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield the whole dataset encoded as fmt."""
+    columns, read = DATASETS[dataset]
+    return encode(fmt, columns, read(chunk_size))
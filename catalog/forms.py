@@ -4,6 +4,8 @@ import datetime  # for checking renewal date range.
 
 from django import forms
 
+from . import circulation
+
 
 class RenewBookForm(forms.Form):
     """Form for a librarian to renew books."""
@@ -32,7 +34,10 @@ class BorrowBookForm(forms.Form):
     def clean_return_date(self):
         data = self.cleaned_data['return_date']
 
-        # Add validation logic if needed
-        # For example, you may want to check if the return date is in the future
+        # Check date is between today and one loan period ahead.
+        try:
+            circulation.check_due_back(data)
+        except circulation.CirculationError as error:
+            raise ValidationError(str(error))
 
         return data
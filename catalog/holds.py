@@ -0,0 +1,182 @@
+"""Hold queues: patrons waiting for a copy of a book.
+
+A Hold is waiting until a copy is set aside for it ('r' Reserved, see
+circulation.reserve()); it is then ready for pickup until its expires date,
+and fulfilled when the patron borrows the book. A book's queue is served by
+priority, then in the order the holds were placed, which is exactly the order
+of the (book, status, -priority, id) index: the next hold is one index seek
+however long the queue, and a patron's position is one COUNT over the part of
+the index ahead of their hold. positions() numbers a whole page of holds with
+one ROW_NUMBER() query instead.
+
+circulation.return_copy() and circulation.release() call allocate() in their
+transaction, so a copy coming back goes straight to the next waiting hold.
+``manage.py expire_holds`` (run daily) expires overdue holds in bulk, passes
+their copies on, and serves waiting holds from copies that became free by
+other means (new copies, copies back from maintenance).
+"""
+import datetime
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, OuterRef, Q, Window
+from django.db.models.functions import RowNumber
+
+from . import circulation
+from .models import BookInstance, Hold
+
+
+class HoldTaken(Exception):
+    """The hold being served was changed by another transaction."""
+
+
+def pickup_period():
+    return datetime.timedelta(days=getattr(settings, 'CATALOG_HOLD_PICKUP_DAYS', 7))
+
+
+def queue(book_id):
+    """The waiting holds of book_id, in serving order."""
+    return Hold.objects.filter(book_id=book_id, status=Hold.WAITING).order_by('-priority', 'id')
+
+
+def place(patron, book, priority=0, expires=None):
+    """Queue patron for a copy of book; returns the Hold, already ready if a copy was free."""
+    book_id = getattr(book, 'pk', book)
+    try:
+        with transaction.atomic():
+            hold = Hold.objects.create(book_id=book_id, patron=patron, priority=priority, expires=expires)
+    except IntegrityError:
+        raise circulation.CirculationError('This patron already holds this book.')
+    if queue(book_id).values_list('pk', flat=True).first() == hold.pk:
+        allocate(book_id)
+        hold.refresh_from_db()
+    return hold
+
+
+def position(hold):
+    """The 1-based place of a waiting hold in its book's queue, or None if it is not waiting."""
+    if hold.status != Hold.WAITING:
+        return None
+    ahead = queue(hold.book_id).filter(
+        Q(priority__gt=hold.priority) | Q(priority=hold.priority, id__lt=hold.pk)).count()
+    return ahead + 1
+
+
+def positions(page):
+    """Set .position (as position() returns it) on each hold of page, with one query for all of them.
+
+    The waiting holds of the page's books are numbered in serving order by
+    ROW_NUMBER() over each book's queue. The window is computed after the
+    WHERE clause, so it runs over whole queues rather than over page itself.
+    """
+    book_ids = {hold.book_id for hold in page if hold.status == Hold.WAITING}
+    numbers = {}
+    if book_ids:
+        ranked = Hold.objects.filter(book_id__in=book_ids, status=Hold.WAITING).annotate(number=Window(
+            RowNumber(), partition_by=F('book_id'), order_by=(F('priority').desc(), F('id').asc())))
+        numbers = dict(ranked.order_by().values_list('pk', 'number'))
+    for hold in page:
+        hold.position = numbers.get(hold.pk) if hold.status == Hold.WAITING else None
+    return page
+
+
+def allocate(book_id, copy=None):
+    """Set a free copy of book_id (or the given one) aside for the first waiting hold.
+
+    Returns the hold served, or None if no hold is waiting or no copy is free.
+    """
+    for _ in range(circulation.MAX_ATTEMPTS):
+        hold = queue(book_id).values('pk', 'patron_id').first()
+        if hold is None:
+            return None
+
+        def ready(row, hold=hold):
+            # In the reservation's transaction: undone if the hold was served or withdrawn meanwhile.
+            if not Hold.objects.filter(pk=hold['pk'], status=Hold.WAITING).update(
+                    status=Hold.READY, copy_id=row['pk'], expires=datetime.date.today() + pickup_period()):
+                raise HoldTaken
+
+        try:
+            if copy is not None:
+                circulation.reserve(hold['patron_id'], copy=copy, history=ready)
+            else:
+                circulation.reserve(hold['patron_id'], book=book_id, history=ready)
+        except circulation.NoCopyAvailable:
+            return None
+        except HoldTaken:
+            continue
+        return Hold.objects.get(pk=hold['pk'])
+    return None
+
+
+def fulfil(patron, book_id, copy_id):
+    """Close patron's open hold on book_id, now that they have borrowed copy_id."""
+    hold = (Hold.objects.filter(book_id=book_id, patron=patron, status__in=Hold.OPEN_STATUSES)
+            .values('pk', 'status', 'copy_id').first())
+    if hold is None:
+        return
+    Hold.objects.filter(pk=hold['pk']).update(status=Hold.FULFILLED, copy_id=copy_id)
+    if hold['status'] == Hold.READY and hold['copy_id'] not in (None, copy_id):
+        # They took another copy: the one set aside for them goes to the next hold.
+        _release(hold['copy_id'], patron)
+
+
+def cancel(hold):
+    """Withdraw an open hold; a copy set aside for it goes to the next hold."""
+    with transaction.atomic():
+        if not Hold.objects.filter(pk=hold.pk, status__in=Hold.OPEN_STATUSES).update(status=Hold.CANCELLED):
+            raise circulation.CirculationError('This hold is no longer open.')
+        if hold.status == Hold.READY and hold.copy_id:
+            _release(hold.copy_id, hold.patron_id)
+    hold.status = Hold.CANCELLED
+
+
+def _release(copy_id, patron_id):
+    try:
+        circulation.release(copy_id, patron_id)
+    except circulation.CirculationError:
+        # The copy was taken off the hold by other means (e.g. in the admin).
+        pass
+
+
+def stranded_copies():
+    """Copies reserved for a patron whose hold on them is closed, and that no ready hold holds."""
+    hold = Hold.objects.filter(copy_id=OuterRef('pk'))
+    return BookInstance.objects.filter(
+        Exists(hold.filter(patron_id=OuterRef('borrower_id')).exclude(status__in=Hold.OPEN_STATUSES)),
+        ~Exists(hold.filter(status=Hold.READY)), status='r')
+
+
+def expire(today=None, chunk_size=500):
+    """Expire open holds past their expires date and serve waiting holds from free copies.
+
+    Waiting holds are expired with one UPDATE, ready holds with one UPDATE per
+    chunk, after which each of their copies is released to the next hold, in
+    the chunk's transaction. Copies still reserved for a patron whose hold on
+    them was closed without releasing them are released too.
+    Returns (holds expired, waiting holds served from free copies).
+    """
+    today = today or datetime.date.today()
+    expired = Hold.objects.filter(status=Hold.WAITING, expires__lt=today).update(status=Hold.EXPIRED)
+    served = 0
+    while True:
+        with transaction.atomic():
+            ready = list(Hold.objects.filter(status=Hold.READY, expires__lt=today)
+                         .order_by('pk').values('pk', 'copy_id', 'patron_id')[:chunk_size])
+            if not ready:
+                break
+            Hold.objects.filter(pk__in=[hold['pk'] for hold in ready]).update(status=Hold.EXPIRED)
+            expired += len(ready)
+            for hold in ready:
+                if hold['copy_id'] is not None:
+                    _release(hold['copy_id'], hold['patron_id'])
+    for copy_id, patron_id in stranded_copies().values_list('pk', 'borrower_id'):
+        _release(copy_id, patron_id)
+    # Waiting holds on books that have a free copy.
+    free_copy = BookInstance.objects.filter(book_id=OuterRef('book_id'), status='a')
+    book_ids = list(Hold.objects.filter(status=Hold.WAITING).filter(Exists(free_copy))
+                    .order_by().values_list('book_id', flat=True).distinct())
+    for book_id in book_ids:
+        while allocate(book_id) is not None:
+            served += 1
+    return expired, served
@@ -0,0 +1,205 @@
+"""Reading and cleaning catalog dumps for ``manage.py import_catalog``.
+
+The functions here take plain rows (dicts read from CSV, JSON or NDJSON, in
+the column layout written by ``manage.py export_catalog``) and return cleaned
+values or an error message, without touching the database. The import command
+can run clean_records() (parsing and cleaning) in a process pool, so this
+module must not import Django: worker processes load it on their own.
+"""
+import csv
+import datetime
+import io
+import json
+import uuid
+from functools import partial
+
+from . import isbn as isbns
+
+FORMATS = ('csv', 'json', 'ndjson')
+
+EXTENSIONS = {'.csv': 'csv', '.json': 'json', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+
+
+class RowError(ValueError):
+    pass
+
+
+def csv_records(lines):
+    """Join the lines of a CSV file into records, each ending where its quotes are balanced.
+
+    A quoted field may hold newlines; quotes inside it are doubled, so a
+    record ends at the first line ending after an even number of quotes.
+    """
+    record, quotes = [], 0
+    for line in lines:
+        record.append(line)
+        quotes += line.count('"')
+        if quotes % 2 == 0:
+            text = ''.join(record)
+            # Blank lines, which csv.DictReader skips.
+            if text.strip('\r\n'):
+                yield text
+            record, quotes = [], 0
+    if record:
+        yield ''.join(record)
+
+
+def read_header(path, fmt):
+    """The column names of a CSV dump (None for the other formats)."""
+    if fmt != 'csv':
+        return None
+    with open(path, encoding='utf-8', newline='') as dump:
+        return next(csv.reader(io.StringIO(next(csv_records(dump), ''))), [])
+
+
+def read_records(path, fmt):
+    """Yield the records of a dump, for parse_records().
+
+    The records of a CSV file (after its header) and the lines of an NDJSON
+    file are yielded unparsed, so that parsing them can go to the worker
+    processes with the cleaning; a JSON array can only be parsed whole, here.
+    """
+    if fmt == 'json':
+        with open(path, encoding='utf-8') as dump:
+            yield from json.load(dump)
+        return
+    with open(path, encoding='utf-8', newline='') as dump:
+        if fmt == 'ndjson':
+            yield from (line for line in dump if line.strip())
+        else:
+            records = csv_records(dump)
+            next(records, None)  # The header: see read_header().
+            yield from records
+
+
+def parse_records(fmt, header, records):
+    """The rows (dicts, or RowError for an NDJSON line that is not JSON) of records from read_records()."""
+    if fmt == 'csv':
+        return list(csv.DictReader(io.StringIO(''.join(records)), fieldnames=header))
+    if fmt == 'ndjson':
+        rows = []
+        for record in records:
+            try:
+                rows.append(json.loads(record))
+            except ValueError as exc:
+                rows.append(RowError(f'Not JSON: {exc}'))
+        return rows
+    return list(records)
+
+
+def text(row, field, max_length, required=True):
+    value = row.get(field)
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        raise RowError(f'{field} is required.')
+    if len(value) > max_length:
+        raise RowError(f'{field} is longer than {max_length} characters.')
+    return value
+
+
+def date(row, field):
+    value = row.get(field)
+    if value in (None, ''):
+        return None
+    try:
+        return datetime.date.fromisoformat(str(value))
+    except ValueError:
+        raise RowError(f'{field} "{value}" is not a YYYY-MM-DD date.')
+
+
+def isbn(row):
+    try:
+        return isbns.normalize(row.get('isbn'))
+    except isbns.InvalidISBN as exc:
+        raise RowError(str(exc))
+
+
+def split_name(name):
+    """'Ursula K. Le Guin' -> ('Ursula K. Le', 'Guin'); the last word is the last name.
+
+    Only for dumps with a single author column: export_catalog also writes
+    author_first_name and author_last_name, which clean_book() prefers.
+    """
+    first, _, last = name.strip().rpartition(' ')
+    return first, last
+
+
+def clean_author(row):
+    return {
+        'first_name': text(row, 'first_name', 100),
+        'last_name': text(row, 'last_name', 100),
+        'date_of_birth': date(row, 'date_of_birth'),
+        'date_of_death': date(row, 'date_of_death'),
+    }
+
+
+def clean_book(row):
+    if row.get('author_first_name') or row.get('author_last_name'):
+        author = (text(row, 'author_first_name', 100), text(row, 'author_last_name', 100))
+    else:
+        author = split_name(text(row, 'author', 201))
+        if not all(author) or any(len(part) > 100 for part in author):
+            raise RowError(f'author "{row.get("author")}" is not a "first last" name.')
+    genres = row.get('genres') or []
+    if isinstance(genres, str):
+        genres = genres.split(';')
+    return {
+        'title': text(row, 'title', 200),
+        'isbn': isbn(row),
+        'summary': text(row, 'summary', 1000, required=False),
+        'author': author,
+        'language': text(row, 'language', 200, required=False) or None,
+        'genres': sorted({genre.strip() for genre in genres if genre.strip()}),
+    }
+
+
+def clean_bookinstance(row, statuses):
+    status = text(row, 'status', 1, required=False) or 'a'
+    if status not in statuses:
+        raise RowError(f'status "{status}" is not one of {", ".join(statuses)}.')
+    copy_id = row.get('id')
+    try:
+        copy_id = uuid.UUID(str(copy_id)) if copy_id else None
+    except ValueError:
+        raise RowError(f'id "{copy_id}" is not a UUID.')
+    return {
+        'id': copy_id,
+        'isbn': isbn(row),
+        'imprint': text(row, 'imprint', 200),
+        'status': status,
+        'due_back': date(row, 'due_back'),
+    }
+
+
+CLEANERS = {
+    'authors': clean_author,
+    'books': clean_book,
+    'bookinstances': clean_bookinstance,
+}
+
+
+def clean_records(dataset, fmt, header, start, records, statuses=()):
+    """clean_chunk() the rows parsed from records: the work of one import worker task."""
+    return clean_chunk(dataset, start, parse_records(fmt, header, records), statuses)
+
+
+def clean_chunk(dataset, start, rows, statuses=()):
+    """Clean rows numbered from start; returns ([(number, values)], [(number, message)]).
+
+    statuses are the codes of BookInstance.STATUS_CHOICES, which the caller
+    reads from the model for the bookinstances dataset (this module cannot).
+    """
+    cleaner = CLEANERS[dataset]
+    if dataset == 'bookinstances':
+        cleaner = partial(cleaner, statuses=statuses)
+    cleaned, errors = [], []
+    for number, row in enumerate(rows, start):
+        try:
+            if isinstance(row, RowError):
+                raise row
+            if not isinstance(row, dict):
+                raise RowError('Expected an object.')
+            cleaned.append((number, cleaner(row)))
+        except RowError as exc:
+            errors.append((number, str(exc)))
+    return cleaned, errors
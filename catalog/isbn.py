@@ -0,0 +1,52 @@
+"""ISBN validation and normalization.
+
+normalize() turns any valid ISBN-10 or ISBN-13, with or without hyphens and
+spaces, into its ISBN-13 digits, so the two forms of the same book compare
+equal. This module has no Django imports; the catalog import workers use it.
+"""
+import re
+
+SEPARATORS_RE = re.compile(r'[\s\-]')
+
+
+class InvalidISBN(ValueError):
+    pass
+
+
+def isbn10_check_digit(digits):
+    total = sum((10 - position) * int(digit) for position, digit in enumerate(digits[:9]))
+    check = (11 - total % 11) % 11
+    return 'X' if check == 10 else str(check)
+
+
+def isbn13_check_digit(digits):
+    total = sum(int(digit) * (3 if position % 2 else 1) for position, digit in enumerate(digits[:12]))
+    return str((10 - total % 10) % 10)
+
+
+def normalize(value):
+    """Return the ISBN-13 form of value, or raise InvalidISBN."""
+    isbn = SEPARATORS_RE.sub('', str(value or '')).upper()
+    if isbn.startswith('ISBN'):
+        isbn = isbn[4:].lstrip(':')
+    if len(isbn) == 10 and isbn[:9].isdigit() and (isbn[9].isdigit() or isbn[9] == 'X'):
+        if isbn10_check_digit(isbn) != isbn[9]:
+            raise InvalidISBN(f'Invalid ISBN-10 check digit in "{value}".')
+        isbn = '978' + isbn[:9]
+        return isbn + isbn13_check_digit(isbn)
+    if len(isbn) == 13 and isbn.isdigit():
+        if isbn13_check_digit(isbn) != isbn[12]:
+            raise InvalidISBN(f'Invalid ISBN-13 check digit in "{value}".')
+        return isbn
+    raise InvalidISBN(f'"{value}" is not an ISBN-10 or ISBN-13.')
+
+
+def dedup_key(value):
+    """Key under which value is deduplicated: the ISBN-13 as an int if valid, else the raw string.
+
+    Ints keep the set of a few million existing ISBNs compact.
+    """
+    try:
+        return int(normalize(value))
+    except InvalidISBN:
+        return value
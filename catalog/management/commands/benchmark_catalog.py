@@ -0,0 +1,219 @@
+import datetime
+import json
+import logging
+import math
+import platform
+import re
+import time
+import tracemalloc
+from contextlib import ExitStack
+
+import django
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import URLPattern, reverse
+
+from catalog import seeding, urls as catalog_urls
+from catalog.metrics import QueryCounter
+from catalog.models import Book, BookInstance
+
+SCALES = (10_000, 100_000, 1_000_000)
+
+# Whatever a URL names beyond a primary key.
+EXTRA_KWARGS = {
+    'catalog-export': {'dataset': 'books', 'fmt': 'ndjson'},
+}
+
+# Caches that would turn the repeated requests into cache reads.
+UNCACHED = {
+    'CATALOG_PAGE_CACHE_TIMEOUT': 0,
+    'CATALOG_REPRESENTATION_CACHE_TIMEOUT': 0,
+    'CATALOG_COMPRESSION_CACHE_TIMEOUT': 0,
+    'CATALOG_BORROWED_CACHE_TIMEOUT': 0,
+}
+
+CONVERTER_RE = re.compile(r'<(?:(?P<converter>\w+):)?(?P<name>\w+)>')
+
+
+def percentile(values, share):
+    """The nearest-rank percentile of values."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(share * len(ordered)) - 1, 0)]
+
+
+def view_model(pattern):
+    view_class = getattr(pattern.callback, 'view_class', None)
+    model = getattr(view_class, 'model', None)
+    queryset = getattr(view_class, 'queryset', None)
+    return model or getattr(queryset, 'model', None)
+
+
+def sample_pk(model):
+    """The pk of the row in the middle of model's table."""
+    count = model.objects.count()
+    return model.objects.order_by('pk').values_list('pk', flat=True)[count // 2] if count else 0
+
+
+def catalog_paths():
+    """[(name, route, path)] for every URL of catalog/urls.py, with a sample object for its arguments."""
+    prefix = reverse('index')
+    samples = {}
+    paths = []
+    for pattern in catalog_urls.urlpatterns:
+        if not isinstance(pattern, URLPattern):
+            continue
+        route = str(pattern.pattern)
+
+        def argument(match, pattern=pattern):
+            extra = EXTRA_KWARGS.get(pattern.name, {})
+            if match['name'] in extra:
+                return extra[match['name']]
+            model = BookInstance if match['converter'] == 'uuid' else view_model(pattern) or Book
+            if model not in samples:
+                samples[model] = sample_pk(model)
+            return str(samples[model])
+
+        paths.append((pattern.name, route, prefix + CONVERTER_RE.sub(argument, route)))
+    return paths
+
+
+def fetch(client, path):
+    """GET path, reading a streamed body to its end; returns (status, body bytes)."""
+    response = client.get(path)
+    if response.streaming:
+        return response.status_code, sum(len(chunk) for chunk in response.streaming_content)
+    return response.status_code, len(response.content)
+
+
+def measure(client, path, requests):
+    """Latency percentiles, queries and peak Python memory of requests GETs of path."""
+    # Peak memory from a request of its own: tracing slows everything down.
+    tracemalloc.start()
+    try:
+        fetch(client, path)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    timings, queries = [], []
+    for _ in range(requests):
+        counter = QueryCounter()
+        with ExitStack() as stack:
+            for database in connections.all():
+                stack.enter_context(database.execute_wrapper(counter))
+            start = time.perf_counter()
+            status, size = fetch(client, path)
+            timings.append(time.perf_counter() - start)
+        queries.append(counter.count)
+    return {
+        'status': status,
+        'p50_ms': round(percentile(timings, 0.5) * 1000, 3),
+        'p95_ms': round(percentile(timings, 0.95) * 1000, 3),
+        'mean_ms': round(sum(timings) / len(timings) * 1000, 3),
+        'queries': max(queries),
+        'peak_memory_kb': round(peak / 1024, 1),
+        'bytes': size,
+    }
+
+
+class Command(BaseCommand):
+    help = ('Grow the catalog with seed_catalog to each scale in turn and measure p50/p95 latency, queries '
+            'per request and peak Python memory of a GET of every URL in catalog/urls.py, writing the '
+            'results as JSON. It adds rows for good: run it against a scratch database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', type=int, nargs='+', default=list(SCALES), metavar='BOOKS',
+                            help='Catalog sizes to measure, in books (default: %(default)s).')
+        parser.add_argument('--requests', type=int, default=20, help='Timed requests per URL and scale.')
+        parser.add_argument('--copies-per-book', type=int, default=3)
+        parser.add_argument('--url', action='append', dest='names', metavar='NAME',
+                            help='Only measure the URLs with this name (repeatable).')
+        parser.add_argument('--output', help='JSON results file (default: catalog-benchmark-<time>.json).')
+        parser.add_argument('--baseline', help='Results file of an earlier run to compare p95 latencies with.')
+        parser.add_argument('--keep-caches', action='store_true',
+                            help='Leave the page, representation and compression caches on.')
+        parser.add_argument('--force', action='store_true',
+                            help='Run even though the database holds books seed_catalog did not write.')
+
+    def handle(self, *args, **options):
+        if Book.objects.exclude(isbn__startswith=seeding.ISBN_PREFIX).exists() and not options['force']:
+            raise CommandError('The database holds real books; run against a scratch database or pass --force.')
+        baseline = self.load_baseline(options['baseline'])
+        started = datetime.datetime.now()
+        output = options['output'] or f"catalog-benchmark-{started:%Y%m%d-%H%M%S}.json"
+        results = {
+            'started': started.isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'requests_per_url': options['requests'],
+            'caches': options['keep_caches'],
+            'scales': [],
+        }
+        overrides = {} if options['keep_caches'] else dict(UNCACHED)
+        # The test client's host; metrics and SQL sampling would only add their own overhead.
+        overrides.update(ALLOWED_HOSTS=['testserver'], CATALOG_METRICS_DIR='', CATALOG_SQL_SAMPLE_RATE=0)
+        # GETs of the POST-only API URLs answer 405, each logged as a warning; errors still show.
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        try:
+            with override_settings(**overrides):
+                for scale in sorted(options['scales']):
+                    results['scales'].append(self.run_scale(scale, options, baseline))
+                    with open(output, 'w') as file:
+                        json.dump(results, file, indent=2)
+        finally:
+            request_logger.setLevel(level)
+        self.stdout.write(self.style.SUCCESS(f'Results written to {output}.'))
+
+    def load_baseline(self, path):
+        if not path:
+            return {}
+        with open(path) as file:
+            previous = json.load(file)
+        return {(scale['books'], url['name'], url['route']): url
+                for scale in previous['scales'] for url in scale['urls']}
+
+    def run_scale(self, scale, options, baseline):
+        seeded = Book.objects.filter(isbn__startswith=seeding.ISBN_PREFIX).count()
+        start = time.monotonic()
+        if seeded < scale:
+            missing = scale - seeded
+            self.stdout.write(f'Seeding {missing} books...')
+            seeding.seed(missing, options['copies_per_book'], users=max(missing // 20, 1),
+                         loans=missing * options['copies_per_book'] // 5, random_seed=scale)
+        seed_seconds = time.monotonic() - start
+
+        client = Client()
+        client.force_login(self.benchmark_user())
+        entries = []
+        self.stdout.write(f"\n{Book.objects.count()} books\n{'url':<28} {'status':>6} {'p50 ms':>9} "
+                          f"{'p95 ms':>9} {'queries':>7} {'peak KB':>9} {'p95 vs baseline':>16}")
+        for name, route, path in catalog_paths():
+            if options['names'] and name not in options['names']:
+                continue
+            entry = {'name': name, 'route': route, 'path': path, **measure(client, path, max(options['requests'], 1))}
+            entries.append(entry)
+            previous = baseline.get((scale, name, route))
+            change = f"{entry['p95_ms'] / previous['p95_ms']:>15.2f}x" if previous and previous['p95_ms'] else ''
+            self.stdout.write(f"{name:<28} {entry['status']:>6} {entry['p50_ms']:>9.2f} {entry['p95_ms']:>9.2f} "
+                              f"{entry['queries']:>7} {entry['peak_memory_kb']:>9.1f} {change}")
+        return {
+            'books': scale,
+            'copies': BookInstance.objects.count(),
+            'seed_seconds': round(seed_seconds, 1),
+            'urls': entries,
+        }
+
+    def benchmark_user(self):
+        """The seeded patron with the most loans, made a superuser so every page renders for them."""
+        top = (BookInstance.objects.filter(status='o', borrower__username__startswith=seeding.USERNAME_PREFIX)
+               .values('borrower').annotate(loans=Count('pk')).order_by('-loans').first())
+        if top is None:
+            raise CommandError('No seeded patron has a loan.')
+        User.objects.filter(pk=top['borrower']).update(is_staff=True, is_superuser=True)
+        return User.objects.get(pk=top['borrower'])
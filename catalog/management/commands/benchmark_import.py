@@ -0,0 +1,106 @@
+import csv
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from catalog import isbn as isbns
+from catalog.models import Book, BookInstance
+from catalog.seeding import ADJECTIVES, NOUNS, WORDS
+
+# Not the seeded catalog's prefix (catalog/seeding.py), so that no generated book is already present.
+ISBN_PREFIX = '9798'
+
+BOOK_COLUMNS = ('title', 'isbn', 'author_first_name', 'author_last_name', 'language', 'genres', 'summary')
+COPY_COLUMNS = ('isbn', 'imprint', 'status', 'due_back')
+
+
+class Rollback(Exception):
+    pass
+
+
+def isbn_for(serial):
+    digits = f'{ISBN_PREFIX}{serial:08d}'
+    return digits + isbns.isbn13_check_digit(digits)
+
+
+def book_rows(books, rng):
+    for serial in range(books):
+        yield {
+            'title': f'The {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}',
+            'isbn': isbn_for(serial),
+            'author_first_name': rng.choice(ADJECTIVES),
+            'author_last_name': f'{rng.choice(NOUNS)}son {serial // 8}',
+            'language': 'English',
+            'genres': f'Benchmark genre {serial % 20}',
+            'summary': ' '.join(rng.choices(WORDS, k=rng.randint(20, 60))).capitalize() + '.',
+        }
+
+
+def copy_rows(books, copies_per_book):
+    for serial in range(books):
+        for copy in range(copies_per_book):
+            on_loan = copy == 0 and serial % 3 == 0
+            yield {'isbn': isbn_for(serial), 'imprint': f'Benchmark imprint {copy}',
+                   'status': 'o' if on_loan else 'a', 'due_back': '2030-01-01' if on_loan else ''}
+
+
+def write_dump(path, fmt, columns, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as dump:
+        if fmt == 'csv':
+            writer = csv.DictWriter(dump, columns)
+            writer.writeheader()
+            writer.writerows(rows)
+        else:
+            dump.writelines(json.dumps(row) + '\n' for row in rows)
+
+
+class Command(BaseCommand):
+    help = ('Time import_catalog on generated books and copies dumps and report rows per second for each '
+            'dataset. Everything imported is rolled back afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=5000, help='Books in the books dump.')
+        parser.add_argument('--copies-per-book', type=int, default=3, help='Copies of each book in the copies dump.')
+        parser.add_argument('--format', choices=('csv', 'ndjson'), default='ndjson')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--workers', type=int, default=0, help='Passed on to import_catalog.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the generated rows.')
+
+    def handle(self, *args, **options):
+        books, fmt = options['books'], options['format']
+        directory = tempfile.mkdtemp()
+        dumps = [
+            ('books', os.path.join(directory, f'books.{fmt}'), books,
+             BOOK_COLUMNS, book_rows(books, random.Random(options['seed']))),
+            ('bookinstances', os.path.join(directory, f'copies.{fmt}'), books * options['copies_per_book'],
+             COPY_COLUMNS, copy_rows(books, options['copies_per_book'])),
+        ]
+        for _, path, _, columns, rows in dumps:
+            write_dump(path, fmt, columns, rows)
+
+        self.stdout.write(f"{'dataset':<14} {'rows':>8} {'created':>8} {'seconds':>8} {'rows/s':>8}")
+        try:
+            with transaction.atomic():
+                for dataset, path, count, _, _ in dumps:
+                    model = Book if dataset == 'books' else BookInstance
+                    before = model.objects.count()
+                    started = time.perf_counter()
+                    call_command('import_catalog', dataset, path, '--chunk-size', str(options['chunk_size']),
+                                 '--workers', str(options['workers']), stdout=io.StringIO(), stderr=io.StringIO())
+                    elapsed = time.perf_counter() - started
+                    created = model.objects.count() - before
+                    self.stdout.write(f'{dataset:<14} {count:>8} {created:>8} {elapsed:>8.2f} '
+                                      f'{count / elapsed if elapsed else 0:>8.0f}')
+                raise Rollback
+        except Rollback:
+            pass
+        finally:
+            shutil.rmtree(directory)
@@ -0,0 +1,142 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from catalog import availability, circulation
+from catalog.models import Author, Book, BookInstance
+
+from .benchmark_serializers import Rollback, best_of, seed
+
+# The indexes of migration 0038_index_pack, dropped for the "before" run.
+INDEXES = {
+    Author: ['catalog_author_name'],
+    Book: ['catalog_book_title'],
+    BookInstance: ['catalog_copy_borrower_due', 'catalog_copy_book_status'],
+}
+
+PAGE = 10
+
+
+def queries(user, book_ids):
+    """{name: (queryset before, queryset after)} for the access paths the index pack serves.
+
+    The "before" querysets spell out the orderings the models had until 0038.
+    """
+    loans = BookInstance.objects.filter(status__exact='o')
+    return {
+        'book list': (
+            Book.objects.order_by('title', 'author__last_name', 'author__first_name')[:PAGE],
+            Book.objects.all()[:PAGE],
+        ),
+        'author list': (
+            Author.objects.order_by('last_name', 'first_name')[:PAGE],
+            Author.objects.all()[:PAGE],
+        ),
+        'my loans': (
+            loans.filter(borrower=user).order_by('due_back')[:PAGE],
+            loans.filter(borrower=user).order_by('due_back', 'id')[:PAGE],
+        ),
+        'all loans': (
+            loans.order_by('due_back')[:PAGE],
+            loans.order_by('due_back', 'id')[:PAGE],
+        ),
+        'availability': (
+            availability.counts(book_ids),
+            availability.counts(book_ids),
+        ),
+        'claim copy': (
+            BookInstance.objects.filter(book_id=book_ids[0], status='a').order_by()
+            .values(*circulation.ROW_FIELDS)[:circulation.CANDIDATES],
+            BookInstance.objects.filter(book_id=book_ids[0], status='a').order_by()
+            .values(*circulation.ROW_FIELDS)[:circulation.CANDIDATES],
+        ),
+    }
+
+
+def seed_loans(rows):
+    """Add three copies per book, a third of them on loan to a few patrons (called inside a transaction)."""
+    User = get_user_model()
+    users = User.objects.bulk_create(User(username=f'benchmark-patron-{n}') for n in range(rows // 20 + 1))
+    today = datetime.date.today()
+    copies = []
+    for n, book_id in enumerate(Book.objects.order_by('pk').values_list('pk', flat=True)[:rows]):
+        for copy in range(3):
+            on_loan = (n + copy) % 3 == 0
+            copies.append(BookInstance(
+                book_id=book_id, imprint='Benchmark imprint', status='o' if on_loan else 'a',
+                borrower=users[n % len(users)] if on_loan else None,
+                due_back=today + datetime.timedelta(days=n % 60 - 20) if on_loan else None))
+    BookInstance.objects.bulk_create(copies)
+    return users[0]
+
+
+def plan(queryset, label):
+    """The query plan of queryset, one row per step.
+
+    The label comment keeps the statement out of the driver's statement cache:
+    SQLite does not notice a dropped index when re-running a cached EXPLAIN.
+    """
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'{connection.ops.explain_query_prefix()} {sql} /* {label} */', params)
+        return [' '.join(str(column) for column in row) for row in cursor.fetchall()]
+
+
+class Command(BaseCommand):
+    help = ('Compare the query plans and timings of the list, loan and availability queries '
+            'before and after the index pack (migration 0038_index_pack).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2000,
+                            help='Books (and authors, and three copies each) to add for the run; '
+                                 'they are rolled back afterwards.')
+        parser.add_argument('--repeat', type=int, default=20, help='Runs per measurement; the best is reported.')
+        parser.add_argument('--plans', action='store_true', help='Print the query plans as well.')
+
+    def handle(self, *args, **options):
+        if not connection.features.can_rollback_ddl:
+            raise CommandError('The "before" run drops indexes, which this database cannot roll back.')
+        try:
+            with transaction.atomic():
+                seed(options['rows'])
+                user = seed_loans(options['rows'])
+                book_ids = list(Book.objects.order_by('pk').values_list('pk', flat=True)[:50])
+                after = self.measure(queries(user, book_ids), 1, options['repeat'])
+                self.drop_indexes()
+                before = self.measure(queries(user, book_ids), 0, options['repeat'])
+                self.report(before, after, options['plans'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def drop_indexes(self):
+        editor = connection.schema_editor()
+        with connection.cursor() as cursor:
+            for model, names in INDEXES.items():
+                for index in model._meta.indexes:
+                    if index.name in names:
+                        cursor.execute(str(index.remove_sql(model, editor)))
+
+    def measure(self, named_queries, which, repeat):
+        results = {}
+        for name, pair in named_queries.items():
+            queryset = pair[which]
+            elapsed, _ = best_of(repeat, lambda: list(queryset.all()))
+            results[name] = (elapsed, plan(queryset, ('before', 'after')[which]))
+        return results
+
+    def report(self, before, after, plans):
+        self.stdout.write(f"{'query':<14} {'before ms':>10} {'after ms':>9} {'speedup':>8}  sorts before/after")
+        for name, (before_time, before_plan) in before.items():
+            after_time, after_plan = after[name]
+            sorts = [sum('TEMP B-TREE' in line for line in steps) for steps in (before_plan, after_plan)]
+            self.stdout.write(
+                f'{name:<14} {before_time * 1000:>10.2f} {after_time * 1000:>9.2f} '
+                f'{before_time / after_time if after_time else 0:>7.1f}x  {sorts[0]}/{sorts[1]}')
+            if plans:
+                for label, steps in (('before', before_plan), ('after', after_plan)):
+                    self.stdout.write(f'  {label}:')
+                    for step in steps:
+                        self.stdout.write(f'    {step}')
@@ -0,0 +1,104 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+from rest_framework.renderers import JSONRenderer
+
+from catalog import compiled
+from catalog.models import Author, Book, BookAvailability, Genre, Language
+from catalog.serializers import related_lookups
+from catalog.views import AuthorListCreateView, BookListView, GenreListView, LanguageListView
+
+ENDPOINTS = {
+    'genres': GenreListView,
+    'languages': LanguageListView,
+    'authors': AuthorListCreateView,
+    'books': BookListView,
+}
+
+
+class Rollback(Exception):
+    pass
+
+
+def seed(rows):
+    """Insert rows books with their authors, genres and languages (called inside a transaction)."""
+    genres = Genre.objects.bulk_create(Genre(name=f'Benchmark genre {n}') for n in range(rows // 10 + 3))
+    languages = Language.objects.bulk_create(Language(name=f'Benchmark language {n}') for n in range(rows // 10 + 1))
+    authors = Author.objects.bulk_create(
+        Author(first_name=f'First {n}', last_name=f'Last {n}',
+               date_of_birth=datetime.date(1900, 1, 1) + datetime.timedelta(days=n) if n % 3 else None)
+        for n in range(rows))
+    books = Book.objects.bulk_create(
+        Book(title=f'Benchmark book {n}', summary='Lorem ipsum dolor sit amet. ' * 30, isbn=f'B{n:012d}',
+             author=authors[n], language=languages[n % len(languages)] if n % 5 else None)
+        for n in range(rows))
+    Through = Book.genre.through
+    Through.objects.bulk_create(
+        Through(book_id=book.pk, genre_id=genres[(n + offset) % len(genres)].pk)
+        for n, book in enumerate(books) for offset in range(n % 3 + 1))
+    BookAvailability.objects.bulk_create(BookAvailability(book=book, total=n % 4) for n, book in enumerate(books))
+
+
+def best_of(repeat, function):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+class Command(BaseCommand):
+    help = ('Time the regular and the compiled serializer of each API list endpoint over the whole table, '
+            'checking that both render the same bytes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2000,
+                            help='Books (and authors) to add for the run; they are rolled back afterwards.')
+        parser.add_argument('--existing', action='store_true', help='Use the catalog as it is instead.')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement; the best is reported.')
+        parser.add_argument('endpoints', nargs='*', metavar='endpoint',
+                            help=f"Any of {', '.join(ENDPOINTS)} (default: all).")
+
+    def handle(self, *args, **options):
+        unknown = set(options['endpoints']) - set(ENDPOINTS)
+        if unknown:
+            raise CommandError(f"Unknown endpoint: {', '.join(sorted(unknown))}")
+        try:
+            # The representation cache would only time cache reads.
+            with override_settings(CATALOG_REPRESENTATION_CACHE_TIMEOUT=0), transaction.atomic():
+                if not options['existing']:
+                    seed(options['rows'])
+                self.run(options['endpoints'] or list(ENDPOINTS), options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, endpoints, repeat):
+        renderer = JSONRenderer()
+        self.stdout.write(f"{'endpoint':<10} {'rows':>7} {'regular ms':>11} {'compiled ms':>12} {'speedup':>8}")
+        for name in endpoints:
+            view = ENDPOINTS[name]
+            serializer_class = view.serializer_class
+            queryset = view.queryset.all()
+
+            def regular():
+                select, prefetch = related_lookups(serializer_class())
+                rows = queryset.select_related(*select).prefetch_related(*prefetch)
+                return serializer_class(rows, many=True).data
+
+            plan = compiled.compile_serializer(serializer_class())
+
+            def fast():
+                return plan.serialize(compiled.rows(queryset, plan))
+
+            regular_time, expected = best_of(repeat, regular)
+            compiled_time, actual = best_of(repeat, fast)
+            if renderer.render(expected) != renderer.render(actual):
+                raise CommandError(f'{name}: compiled output differs from the serializer.')
+            self.stdout.write(
+                f'{name:<10} {len(actual):>7} {regular_time * 1000:>11.1f} {compiled_time * 1000:>12.1f} '
+                f'{regular_time / compiled_time if compiled_time else 0:>7.1f}x')
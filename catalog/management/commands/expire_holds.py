@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from catalog import holds
+
+
+class Command(BaseCommand):
+    help = ('Expire holds past their pickup deadline or last useful day, pass their copies to the next '
+            'holds, and serve waiting holds from free copies. Meant to run daily.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Ready holds expired per UPDATE.')
+
+    def handle(self, *args, **options):
+        expired, served = holds.expire(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Expired {expired} holds; served {served} waiting holds from free copies.'))
@@ -0,0 +1,44 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from catalog import export
+
+
+class Command(BaseCommand):
+    help = 'Export a catalog dataset as CSV or NDJSON, streaming it chunk by chunk.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(export.DATASETS))
+        parser.add_argument('--format', choices=export.FORMATS, default='csv')
+        parser.add_argument('--output', '-o', metavar='PATH',
+                            help='File to write (default: standard output). Written atomically.')
+        parser.add_argument('--chunk-size', type=int, default=export.DEFAULT_CHUNK_SIZE,
+                            help='Rows read per query.')
+
+    def handle(self, *args, **options):
+        columns, read = export.DATASETS[options['dataset']]
+        rows = 0
+
+        def counted(chunks):
+            nonlocal rows
+            for chunk in chunks:
+                rows += len(chunk)
+                yield chunk
+
+        text = export.encode(options['format'], columns, counted(read(options['chunk_size'])))
+        output = options['output']
+        if not output or output == '-':
+            for piece in text:
+                self.stdout.write(piece, ending='')
+            return
+
+        temporary = f'{output}.{os.getpid()}.tmp'
+        try:
+            with open(temporary, 'w', encoding='utf-8', newline='') as file:
+                file.writelines(text)
+            os.replace(temporary, output)
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+        self.stdout.write(self.style.SUCCESS(f"Exported {rows} {options['dataset']} to {output}."))
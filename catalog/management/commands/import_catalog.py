@@ -0,0 +1,265 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from catalog import importer, isbn as isbns, pagecache, versioning
+from catalog.bulk import AuthorLoader, BookInstanceLoader, BookLoader
+from catalog.models import Author, Book, BookInstance, CatalogCounter, Genre, Language
+
+
+STATUSES = tuple(code for code, _ in BookInstance.STATUS_CHOICES)
+
+# Prefix of the CatalogCounter rows holding the rows imported so far from a dump.
+CHECKPOINT_PREFIX = 'import:'
+
+
+def name_key(first_name, last_name):
+    return (first_name.strip().lower(), last_name.strip().lower())
+
+
+def checkpoint_name(dataset, path):
+    """The CatalogCounter name of the checkpoint of importing dataset from path.
+
+    It identifies the dump by its absolute path and size, hashed to fit the
+    name column, so that a changed file starts over.
+    """
+    source = json.dumps([dataset, os.path.abspath(path), os.path.getsize(path)])
+    return CHECKPOINT_PREFIX + hashlib.sha1(source.encode()).hexdigest()[:40]
+
+
+class AuthorResolver:
+    """Inserts authors not already in the catalog (matched on first and last name)."""
+    loader_class = AuthorLoader
+
+    def __init__(self, chunk_size):
+        self.chunk_size = chunk_size
+        self.authors = {
+            name_key(first, last): pk for pk, first, last in Author.objects.values_list('pk', 'first_name', 'last_name')}
+        self.errors = []
+
+    def resolve(self, cleaned):
+        """Return ([(number, loader data)], skipped count) for a cleaned chunk."""
+        valid, skipped = [], 0
+        for number, values in cleaned:
+            key = name_key(values['first_name'], values['last_name'])
+            if key in self.authors:
+                skipped += 1
+                continue
+            self.authors[key] = None
+            valid.append((number, values))
+        return valid, skipped
+
+
+class BookResolver(AuthorResolver):
+    """Skips known ISBNs and resolves author, language and genre names, creating missing ones."""
+    loader_class = BookLoader
+
+    def __init__(self, chunk_size):
+        super().__init__(chunk_size)
+        self.languages = {name.lower(): pk for pk, name in Language.objects.values_list('pk', 'name')}
+        self.genres = {name.lower(): pk for pk, name in Genre.objects.values_list('pk', 'name')}
+        # The ISBNs already in the catalog, loaded once instead of a unique check per row.
+        self.isbns = {isbns.dedup_key(value) for value in Book.objects.values_list('isbn', flat=True).iterator()}
+
+    def create_missing(self, lookup, model, names):
+        missing = {}
+        for name in names:
+            if name and name.lower() not in lookup:
+                missing.setdefault(name.lower(), name)
+        if missing:
+            for obj in model.objects.bulk_create(model(name=name) for name in missing.values()):
+                lookup[obj.name.lower()] = obj.pk
+            versioning.bump(model._meta.model_name)
+            pagecache.invalidate(pagecache.list_tag(model))
+
+    def create_missing_authors(self, names):
+        missing = {}
+        for first_name, last_name in names:
+            key = name_key(first_name, last_name)
+            if self.authors.get(key) is None:
+                missing.setdefault(key, {'first_name': first_name, 'last_name': last_name})
+        if missing:
+            loader = AuthorLoader(self.chunk_size)
+            loader.insert(list(enumerate(missing.values())))
+            self.authors.update(zip(missing, loader.created))
+
+    def resolve(self, cleaned):
+        new, skipped = [], 0
+        for number, values in cleaned:
+            key = int(values['isbn'])
+            if key in self.isbns:
+                skipped += 1
+                continue
+            self.isbns.add(key)
+            new.append((number, values))
+        self.create_missing_authors(values['author'] for _, values in new)
+        self.create_missing(self.languages, Language, (values['language'] for _, values in new))
+        self.create_missing(self.genres, Genre, (genre for _, values in new for genre in values['genres']))
+        valid = [(number, {
+            'title': values['title'],
+            'isbn': values['isbn'],
+            'summary': values['summary'],
+            'author': self.authors[name_key(*values['author'])],
+            'language': self.languages[values['language'].lower()] if values['language'] else None,
+            'genre': [self.genres[genre.lower()] for genre in values['genres']],
+        }) for number, values in new]
+        return valid, skipped
+
+
+class BookInstanceResolver:
+    """Finds each copy's book by ISBN and skips copies whose id is already in the catalog."""
+    loader_class = BookInstanceLoader
+
+    def __init__(self, chunk_size):
+        self.chunk_size = chunk_size
+        self.books = {isbns.dedup_key(value): pk for value, pk in Book.objects.values_list('isbn', 'pk').iterator()}
+        self.errors = []
+
+    def resolve(self, cleaned):
+        ids = [values['id'] for _, values in cleaned if values['id']]
+        existing = set(BookInstance.objects.filter(pk__in=ids).values_list('pk', flat=True)) if ids else set()
+        valid, skipped = [], 0
+        for number, values in cleaned:
+            if values['id'] in existing:
+                skipped += 1
+                continue
+            book_id = self.books.get(int(values['isbn']))
+            if book_id is None:
+                self.errors.append((number, f"No book with ISBN {values['isbn']}."))
+                continue
+            data = {'book': book_id, 'imprint': values['imprint'], 'status': values['status'],
+                    'due_back': values['due_back']}
+            if values['id']:
+                data['id'] = values['id']
+            valid.append((number, data))
+        return valid, skipped
+
+
+RESOLVERS = {
+    'authors': AuthorResolver,
+    'books': BookResolver,
+    'bookinstances': BookInstanceResolver,
+}
+
+
+class Command(BaseCommand):
+    help = ('Import authors, books or book copies from a CSV, JSON or NDJSON dump (the layout written by '
+            'export_catalog). Rows are parsed and cleaned (optionally in a process pool) and inserted in chunks; '
+            'an interrupted import resumes after the last chunk it committed.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(RESOLVERS))
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=importer.FORMATS,
+                            help='Dump format (default: from the file extension).')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows per worker task and transaction.')
+        parser.add_argument('--workers', type=int, default=0,
+                            help='Processes that parse and clean the rows (default 0: this process). Inserting '
+                                 'is serial and takes about 90%% of an import, so a pool saves little: 20k books '
+                                 'as NDJSON took 6.0s in this process and 5.8s with 4 workers, and as CSV 5.8s '
+                                 'and 7.1s (benchmark_import, SQLite, one core).')
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint.')
+        parser.add_argument('--errors', metavar='PATH', help='Write every rejected row to this NDJSON file.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'No such file: {path}')
+        fmt = options['format'] or importer.EXTENSIONS.get(os.path.splitext(path)[1].lower())
+        if fmt is None:
+            raise CommandError('Cannot tell the dump format from the extension; pass --format.')
+        dataset, chunk_size = options['dataset'], max(options['chunk_size'], 1)
+        checkpoint = checkpoint_name(dataset, path)
+
+        done = 0 if options['restart'] else self.read_checkpoint(checkpoint)
+        if done:
+            self.stdout.write(f'Resuming after row {done} (checkpoint {checkpoint}).')
+
+        resolver = RESOLVERS[dataset](chunk_size)
+        loader = resolver.loader_class(chunk_size)
+        header = importer.read_header(path, fmt)
+        records = islice(importer.read_records(path, fmt), done, None)
+        self.started = self.reported = time.monotonic()
+        self.stats = {'rows': done, 'created': 0, 'skipped': 0, 'invalid': 0, 'start': done}
+        errors = []
+
+        chunks = self.clean(dataset, fmt, header, records, done + 1, chunk_size, options['workers'])
+        for count, cleaned, invalid in chunks:
+            # The checkpoint commits with the chunk: a resumed import neither skips nor repeats rows.
+            with transaction.atomic():
+                valid, skipped = resolver.resolve(cleaned)
+                if valid:
+                    loader.insert(valid)
+                self.write_checkpoint(checkpoint, done + count)
+            invalid += resolver.errors + [(error['index'], error['errors']) for error in loader.errors]
+            self.stats['created'] += len(loader.created)
+            resolver.errors, loader.errors, loader.created = [], [], []
+            errors += invalid
+
+            done += count
+            self.stats['rows'] = done
+            self.stats['skipped'] += skipped
+            self.stats['invalid'] += len(invalid)
+            self.report()
+
+        CatalogCounter.objects.filter(name=checkpoint).delete()
+        self.write_errors(errors, options['errors'])
+        self.report(final=True)
+
+    def clean(self, dataset, fmt, header, records, start, chunk_size, workers):
+        """Yield (rows in chunk, cleaned, invalid) per chunk, in input order."""
+        chunks = iter(lambda: list(islice(records, chunk_size)), [])
+        if workers < 1:
+            for chunk in chunks:
+                yield (len(chunk), *importer.clean_records(dataset, fmt, header, start, chunk, STATUSES))
+                start += len(chunk)
+            return
+        pending = deque()
+        # Spawned rather than forked: workers start without this process's database connections.
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            for chunk in chunks:
+                pending.append((len(chunk), pool.submit(
+                    importer.clean_records, dataset, fmt, header, start, chunk, STATUSES)))
+                start += len(chunk)
+                # Bound the chunks held in memory while the database side catches up.
+                if len(pending) >= workers * 2:
+                    count, future = pending.popleft()
+                    yield (count, *future.result())
+            while pending:
+                count, future = pending.popleft()
+                yield (count, *future.result())
+
+    def read_checkpoint(self, checkpoint):
+        return CatalogCounter.objects.filter(name=checkpoint).values_list('value', flat=True).first() or 0
+
+    def write_checkpoint(self, checkpoint, rows):
+        CatalogCounter.objects.update_or_create(name=checkpoint, defaults={'value': rows})
+
+    def write_errors(self, errors, path):
+        if path:
+            with open(path, 'w', encoding='utf-8') as file:
+                file.writelines(json.dumps({'row': row, 'error': error}) + '\n' for row, error in errors)
+        else:
+            for row, error in errors[:20]:
+                self.stderr.write(f'Row {row}: {error}')
+            if len(errors) > 20:
+                self.stderr.write(f'... and {len(errors) - 20} more; pass --errors to keep them all.')
+
+    def report(self, final=False):
+        now = time.monotonic()
+        if not final and now - self.reported < 5:
+            return
+        self.reported = now
+        elapsed = max(now - self.started, 1e-6)
+        rate = (self.stats['rows'] - self.stats['start']) / elapsed
+        message = ('{rows} rows read: {created} created, {skipped} already present, {invalid} rejected'
+                   .format(**self.stats) + f' ({rate:.0f} rows/s)')
+        self.stdout.write(self.style.SUCCESS(message) if final else message)
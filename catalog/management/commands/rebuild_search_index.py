@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.search import index as search_index
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the book search index and write it to CATALOG_SEARCH_SNAPSHOT, '
+            'from the database or from an existing snapshot file.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from-snapshot', metavar='PATH',
+                            help='Start from this snapshot and replay the journal instead of reading every book.')
+        parser.add_argument('--output', metavar='PATH',
+                            help='Where to write the snapshot (default: CATALOG_SEARCH_SNAPSHOT).')
+        parser.add_argument('--no-prune', action='store_true',
+                            help='Keep journal entries already covered by the new snapshot.')
+
+    def handle(self, *args, **options):
+        output = options['output'] or search_index.snapshot_path()
+        if not output:
+            raise CommandError('Set CATALOG_SEARCH_SNAPSHOT or pass --output.')
+
+        if options['from_snapshot']:
+            index = search_index.load_snapshot(options['from_snapshot'])
+            if index is None:
+                raise CommandError(f"No snapshot at {options['from_snapshot']}.")
+            if index.position < search_index.pruned_position():
+                raise CommandError('The journal has been pruned past this snapshot; rebuild from the database.')
+        else:
+            index = search_index.build_index()
+        index = search_index.sync(index)
+
+        search_index.save_snapshot(index, output)
+        if not options['no_prune']:
+            search_index.prune_journal(index.position)
+        search_index.reset_index()
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {len(index)} books ({len(index.postings)} terms) into {output}.'))
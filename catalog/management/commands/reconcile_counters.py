@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from catalog import availability, counters
+
+
+class Command(BaseCommand):
+    help = ('Recompute the denormalized catalog counters and per-book availability rows '
+            'from the underlying tables.')
+
+    def handle(self, *args, **options):
+        values = counters.reconcile()
+        for name, value in values.items():
+            self.stdout.write(f'{name}: {value}')
+        books = availability.rebuild_all()
+        self.stdout.write(f'availability rows: {books}')
+        self.stdout.write(self.style.SUCCESS('Catalog counters reconciled.'))
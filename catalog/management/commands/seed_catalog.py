@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog import seeding
+
+
+class Command(BaseCommand):
+    help = ('Add a synthetic catalog for load and scale testing: books with Zipf-distributed popularity, '
+            'one to three genres each, copies, patrons and loans, written with bulk inserts. '
+            'Run it again to grow the catalog.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, required=True, help='Books to add.')
+        parser.add_argument('--copies-per-book', type=int, default=3, help='Copies of each book.')
+        parser.add_argument('--users', type=int, default=0,
+                            help='Patrons to add; the loans go to them (default: to the existing users).')
+        parser.add_argument('--loans', type=int, default=0, help='Copies to put on loan, popular books first.')
+        parser.add_argument('--genres', type=int, default=40, help='Size of the seeded genre list.')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Books per transaction.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, for reproducible catalogs.')
+
+    def handle(self, *args, **options):
+        if min(options['books'], options['copies_per_book'], options['users'], options['loans']) < 0:
+            raise CommandError('Counts cannot be negative.')
+        started = time.monotonic()
+
+        def progress(done):
+            self.stdout.write(f"{done}/{options['books']} books ({time.monotonic() - started:.0f}s)")
+
+        try:
+            added = seeding.seed(
+                options['books'], options['copies_per_book'], users=options['users'], loans=options['loans'],
+                genres=options['genres'], chunk_size=max(options['chunk_size'], 1), random_seed=options['seed'],
+                progress=progress if options['verbosity'] > 1 else None)
+        except ValueError as error:
+            raise CommandError(str(error))
+        self.stdout.write(self.style.SUCCESS(
+            'Added {books} books, {copies} copies, {authors} authors, {users} patrons and {loans} loans '
+            'in {seconds:.1f}s.'.format(seconds=time.monotonic() - started, **added)))
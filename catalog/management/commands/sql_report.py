@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from catalog import sqlstats
+
+
+class Command(BaseCommand):
+    help = ('Print the per-URL-name query counts and SQL time of the requests sampled by '
+            'SQLStatsMiddleware (CATALOG_SQL_SAMPLE_RATE), slowest first.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Forget the figures after printing them.')
+
+    def handle(self, *args, **options):
+        entries = sqlstats.report()
+        if not entries:
+            self.stdout.write('No sampled requests.')
+        else:
+            self.stdout.write(f"{'url name':<32} {'requests':>8} {'queries/req':>11} {'sql ms/req':>10} "
+                              f"{'repeated':>8} {'n+1 reqs':>8}")
+        for entry in entries:
+            self.stdout.write(
+                f"{entry['url_name']:<32} {entry['requests']:>8} {entry['avg_queries']:>11.1f} "
+                f"{entry['avg_sql_ms']:>10.2f} {entry['repeated']:>8} {entry['n_plus_one']:>8}")
+            if entry['worst']:
+                count, sql = entry['worst']
+                self.stdout.write(self.style.WARNING(f'  N+1: {count}x {sql[:200]}'))
+        if options['reset']:
+            sqlstats.reset()
+            self.stdout.write(self.style.SUCCESS('SQL figures reset.'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from catalog import overdue
+
+
+class Command(BaseCommand):
+    help = ('Stamp loans that have become overdue, clear the stamp of loans returned or renewed since, '
+            'and summarize the overdue loans per borrower. Meant to run daily.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Loans read and stamped per query.')
+        parser.add_argument('--digests', action='store_true', help='Print each borrower\'s overdue loans.')
+
+    def handle(self, *args, **options):
+        stamped, cleared, digests = overdue.sweep(chunk_size=options['chunk_size'])
+        if options['digests']:
+            for digest in digests.values():
+                self.stdout.write(f"{digest['username'] or '(no borrower)'}: {len(digest['loans'])} overdue")
+                for loan in digest['loans']:
+                    new = ' (new)' if loan['new'] else ''
+                    self.stdout.write(f"  {loan['title']}: due {loan['due_back']}, "
+                                      f"{loan['days_overdue']} days overdue{new}")
+        self.stdout.write(self.style.SUCCESS(
+            f'{sum(len(digest["loans"]) for digest in digests.values())} overdue loans for {len(digests)} '
+            f'borrowers; stamped {stamped} newly overdue, cleared {cleared}.'))
@@ -0,0 +1,292 @@
+"""Prometheus metrics shared by all worker processes.
+
+MetricsMiddleware times every request and counts its queries, and records,
+labelled by the resolved URL name (``view``) rather than the raw path:
+
+- catalog_http_requests_total{view, method, status}
+- catalog_http_request_duration_seconds{view}, a histogram
+- catalog_http_response_size_bytes{view}, a histogram (streamed responses,
+  whose size is only known once sent, are left out)
+- catalog_db_queries_per_request{view} and catalog_db_query_duration_seconds{view},
+  histograms of the number of queries and the SQL time of each request
+
+Each process adds to its own file in CATALOG_METRICS_DIR, metrics-<pid>.db,
+mapped into memory: a value is updated in place under a lock that only the
+threads of that process share, so workers never wait on each other. /metrics
+(views.metrics) reads and sums the files of all processes, those of exited
+workers included, as counters must not go back; clear() empties the directory
+(when the server is restarted, say). An empty CATALOG_METRICS_DIR, the
+default, turns metrics off.
+
+A file is a 4-byte length of the part in use, padding, then entries of a
+4-byte key length, the key (JSON [sample name, [[label, value], ...]]) padded
+to 8 bytes, and the 8-byte float value. A new entry is written before the
+length that makes it visible, so readers never see half an entry.
+"""
+import bisect
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connections
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+UNRESOLVED = '<unresolved>'
+# Methods recorded as sent; anything else a client makes up counts as OTHER_METHOD.
+METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS', 'TRACE', 'CONNECT'))
+OTHER_METHOD = 'other'
+
+REQUESTS = 'catalog_http_requests_total'
+DURATION = 'catalog_http_request_duration_seconds'
+SIZE = 'catalog_http_response_size_bytes'
+QUERIES = 'catalog_db_queries_per_request'
+QUERY_DURATION = 'catalog_db_query_duration_seconds'
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+HISTOGRAMS = {
+    DURATION: ('Time spent serving the request.', TIME_BUCKETS),
+    SIZE: ('Size of the response body (after compression).',
+           (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)),
+    QUERIES: ('Database queries run by the request.', (0, 1, 2, 5, 10, 20, 50, 100, 200)),
+    QUERY_DURATION: ('Time spent in database queries by the request.', TIME_BUCKETS),
+}
+COUNTERS = {
+    REQUESTS: 'Requests served.',
+}
+
+_HEADER = 8
+_INITIAL_SIZE = 64 * 1024
+
+
+def directory():
+    return getattr(settings, 'CATALOG_METRICS_DIR', '')
+
+
+class Store:
+    """The metric values of one process, in a memory-mapped file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self._file = open(path, 'a+b')
+        size = os.fstat(self._file.fileno()).st_size
+        if size < _INITIAL_SIZE:
+            self._file.truncate(_INITIAL_SIZE)
+            size = _INITIAL_SIZE
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._used = struct.unpack_from('i', self._map, 0)[0] or _HEADER
+        # A file left by an earlier process with the same pid is carried on.
+        self._positions = {key: position for key, _, position in _entries(self._map, self._used)}
+
+    def add(self, key, amount):
+        self.add_many(((key, amount),))
+
+    def add_many(self, items):
+        """Add each (key, amount) of items, taking the lock once."""
+        with self.lock:
+            for key, amount in items:
+                position = self._positions.get(key)
+                if position is None:
+                    position = self._append(key)
+                value = struct.unpack_from('d', self._map, position)[0]
+                struct.pack_into('d', self._map, position, value + amount)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def _append(self, key):
+        encoded = key.encode()
+        length = 4 + len(encoded)
+        length += -length % 8
+        end = self._used + length + 8
+        if end > len(self._map):
+            size = len(self._map)
+            while size < end:
+                size *= 2
+            self._file.truncate(size)
+            self._map.close()
+            self._map = mmap.mmap(self._file.fileno(), size)
+        struct.pack_into(f'i{len(encoded)}s', self._map, self._used, len(encoded), encoded)
+        position = self._used + length
+        struct.pack_into('d', self._map, position, 0.0)
+        self._used = end
+        struct.pack_into('i', self._map, 0, self._used)
+        self._positions[key] = position
+        return position
+
+
+def _entries(data, used=None):
+    """Yield (key, value, position of the value) for each entry of a store's bytes."""
+    used = used or struct.unpack_from('i', data, 0)[0]
+    offset = _HEADER
+    while offset < used:
+        length = struct.unpack_from('i', data, offset)[0]
+        key = bytes(data[offset + 4:offset + 4 + length]).decode()
+        offset += 4 + length
+        offset += -offset % 8
+        yield key, struct.unpack_from('d', data, offset)[0], offset
+        offset += 8
+
+
+_store = None
+_store_owner = None
+_store_lock = threading.Lock()
+
+
+def store():
+    """This process's Store (a forked worker opens its own)."""
+    global _store, _store_owner
+    owner = (os.getpid(), directory())
+    if _store_owner != owner:
+        with _store_lock:
+            if _store_owner != owner:
+                os.makedirs(owner[1], exist_ok=True)
+                _store = Store(os.path.join(owner[1], f'metrics-{owner[0]}.db'))
+                _store_owner = owner
+    return _store
+
+
+@lru_cache(maxsize=4096)
+def key(name, labels):
+    """The store key of the sample name with labels, a tuple of (label, value) pairs."""
+    return json.dumps([name, [list(pair) for pair in sorted(labels)]])
+
+
+@lru_cache(maxsize=1024)
+def _histogram_keys(name, labels):
+    """([key of each bucket, +Inf last], key of the sum, key of the count) of a histogram series."""
+    les = [*map(_format, HISTOGRAMS[name][1]), '+Inf']
+    return ([key(name + '_bucket', labels + (('le', le),)) for le in les],
+            key(name + '_sum', labels), key(name + '_count', labels))
+
+
+def observations(name, labels, value):
+    """The (key, amount) additions counting value into the histogram name."""
+    bucket_keys, sum_key, count_key = _histogram_keys(name, labels)
+    return (bucket_keys[bisect.bisect_left(HISTOGRAMS[name][1], value)], 1), (sum_key, value), (count_key, 1)
+
+
+def observe(name, labels, value):
+    """Count value into the histogram name."""
+    store().add_many(observations(name, labels, value))
+
+
+def inc(name, labels, amount=1):
+    store().add(key(name, labels), amount)
+
+
+def method_name(request):
+    return request.method if request.method in METHODS else OTHER_METHOD
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return (match.view_name if match else None) or UNRESOLVED
+
+
+class QueryCounter:
+    """Execute wrapper counting and timing the statements run through it."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+def record_request(request, get_response):
+    """Run get_response(request) and record its metrics."""
+    queries = QueryCounter()
+    start = time.perf_counter()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(queries))
+        response = get_response(request)
+    elapsed = time.perf_counter() - start
+    labels = (('view', view_name(request)),)
+    items = [
+        (key(REQUESTS, labels + (('method', method_name(request)), ('status', str(response.status_code)))), 1),
+        *observations(DURATION, labels, elapsed),
+        *observations(QUERIES, labels, queries.count),
+        *observations(QUERY_DURATION, labels, queries.duration),
+    ]
+    if not response.streaming:
+        items += observations(SIZE, labels, len(response.content))
+    store().add_many(items)
+    return response
+
+
+def collect():
+    """{(sample name, labels): value} summed over the files of all processes."""
+    totals = defaultdict(float)
+    if not directory():
+        return totals
+    for path in glob.glob(os.path.join(directory(), 'metrics-*.db')):
+        with open(path, 'rb') as file:
+            data = file.read()
+        if len(data) < _HEADER:
+            continue
+        for entry, value, _ in _entries(data):
+            name, labels = json.loads(entry)
+            totals[name, tuple(tuple(pair) for pair in labels)] += value
+    return totals
+
+
+def render():
+    """The metrics in the Prometheus text exposition format."""
+    totals = collect()
+    lines = []
+    for name, help_text in COUNTERS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        lines += [_sample(name, labels, value) for (sample, labels), value in sorted(totals.items())
+                  if sample == name]
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        series = sorted({labels for sample, labels in totals if sample == name + '_count'})
+        for labels in series:
+            cumulative = 0
+            for le in [*map(_format, buckets), '+Inf']:
+                cumulative += totals.get((name + '_bucket', tuple(sorted(labels + (('le', le),)))), 0)
+                lines.append(_sample(name + '_bucket', labels + (('le', le),), cumulative))
+            lines.append(_sample(name + '_sum', labels, totals[name + '_sum', labels]))
+            lines.append(_sample(name + '_count', labels, totals[name + '_count', labels]))
+    return '\n'.join(lines) + '\n'
+
+
+def clear():
+    """Remove the files of all processes, this one's included."""
+    global _store, _store_owner
+    with _store_lock:
+        if _store is not None:
+            _store.close()
+        _store = _store_owner = None
+        for path in glob.glob(os.path.join(directory(), 'metrics-*.db')):
+            os.remove(path)
+
+
+def _format(number):
+    return str(int(number)) if float(number).is_integer() else repr(float(number))
+
+
+def _sample(name, labels, value):
+    label_text = ','.join(f'{label}="{_escape(text)}"' for label, text in labels)
+    return f'{name}{{{label_text}}} {_format(value)}' if labels else f'{name} {_format(value)}'
+
+
+def _escape(text):
+    return str(text).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
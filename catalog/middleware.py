@@ -1,7 +1,48 @@
 # middleware.py
+import random
+
+from django.conf import settings
 from django.middleware.csrf import CsrfViewMiddleware
 
+from . import compression, metrics, sqlstats
+
+
 class DisableCSRFMiddleware(CsrfViewMiddleware):
     def _reject(self, request, reason):
         # Disable CSRF protection
         return None
+
+
+class CompressionMiddleware:
+    """Compress responses with gzip or deflate, reusing cached compressed bodies (see catalog/compression.py)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return compression.compress_response(request, self.get_response(request))
+
+
+class SQLStatsMiddleware:
+    """Count, time and fingerprint the queries of a sample of requests (see catalog/sqlstats.py)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = getattr(settings, 'CATALOG_SQL_SAMPLE_RATE', 0)
+        if not rate or random.random() >= rate:
+            return self.get_response(request)
+        return sqlstats.instrument(request, self.get_response)
+
+
+class MetricsMiddleware:
+    """Record request counts, latency, response size and query histograms per URL name (see catalog/metrics.py)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not metrics.directory():
+            return self.get_response(request)
+        return metrics.record_request(request, self.get_response)
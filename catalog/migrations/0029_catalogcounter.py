@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:29
+
+from django.db import migrations, models
+
+
+def seed_counters(apps, schema_editor):
+    Author = apps.get_model('catalog', 'Author')
+    Book = apps.get_model('catalog', 'Book')
+    BookInstance = apps.get_model('catalog', 'BookInstance')
+    CatalogCounter = apps.get_model('catalog', 'CatalogCounter')
+    CatalogCounter.objects.bulk_create([
+        CatalogCounter(name='books', value=Book.objects.count()),
+        CatalogCounter(name='instances', value=BookInstance.objects.count()),
+        CatalogCounter(name='instances_available', value=BookInstance.objects.filter(status='a').count()),
+        CatalogCounter(name='authors', value=Author.objects.count()),
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0028_borrower_alter_book_isbn_alter_bookinstance_id_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
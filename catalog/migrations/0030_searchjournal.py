@@ -0,0 +1,20 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0029_catalogcounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchJournal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('book_id', models.BigIntegerField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,84 @@
+from django.db import migrations
+
+# The SQL is written out here rather than taken from catalog/search/fts.py, so
+# that this migration keeps doing what it did when it was written.
+FTS_TABLE = 'catalog_book_fts'
+
+AUTHOR_NAMES_SQL = (
+    "(SELECT coalesce(a.first_name, '') || ' ' || coalesce(a.last_name, '') "
+    "FROM catalog_author a WHERE a.id = new.author_id)")
+
+TRIGGERS = {
+    'catalog_book_fts_insert': f"""
+        CREATE TRIGGER catalog_book_fts_insert AFTER INSERT ON catalog_book BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, title, summary, author_names)
+            VALUES (new.id, new.title, new.summary, {AUTHOR_NAMES_SQL});
+        END""",
+    'catalog_book_fts_update': f"""
+        CREATE TRIGGER catalog_book_fts_update AFTER UPDATE ON catalog_book BEGIN
+            DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+            INSERT INTO {FTS_TABLE}(rowid, title, summary, author_names)
+            VALUES (new.id, new.title, new.summary, {AUTHOR_NAMES_SQL});
+        END""",
+    'catalog_book_fts_delete': f"""
+        CREATE TRIGGER catalog_book_fts_delete AFTER DELETE ON catalog_book BEGIN
+            DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        END""",
+    'catalog_author_fts_update': f"""
+        CREATE TRIGGER catalog_author_fts_update AFTER UPDATE OF first_name, last_name ON catalog_author BEGIN
+            UPDATE {FTS_TABLE}
+            SET author_names = coalesce(new.first_name, '') || ' ' || coalesce(new.last_name, '')
+            WHERE rowid IN (SELECT id FROM catalog_book WHERE author_id = new.id);
+        END""",
+}
+
+# Columns matched with icontains by fts.search_queryset() on backends without FTS5.
+TRIGRAM_COLUMNS = (
+    ('catalog_book', 'title'),
+    ('catalog_author', 'first_name'),
+    ('catalog_author', 'last_name'),
+)
+
+
+def create_search_structures(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            f"title, summary, author_names, tokenize = 'unicode61 remove_diacritics 2')")
+        schema_editor.execute(
+            f"INSERT INTO {FTS_TABLE}(rowid, title, summary, author_names) "
+            f"SELECT b.id, b.title, b.summary, coalesce(a.first_name, '') || ' ' || coalesce(a.last_name, '') "
+            f"FROM catalog_book b LEFT JOIN catalog_author a ON a.id = b.author_id")
+        for name, sql in TRIGGERS.items():
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            schema_editor.execute(sql)
+    elif vendor == 'postgresql':
+        # Trigram indexes on the exact expression Django emits for icontains.
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for table, column in TRIGRAM_COLUMNS:
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS {table}_{column}_trgm '
+                f'ON {table} USING gin ((UPPER({column}::text)) gin_trgm_ops)')
+
+
+def drop_search_structures(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for name in TRIGGERS:
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    elif vendor == 'postgresql':
+        for table, column in TRIGRAM_COLUMNS:
+            schema_editor.execute(f'DROP INDEX IF EXISTS {table}_{column}_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0030_searchjournal'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_structures, drop_search_structures),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:40
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Q
+import django.db.models.deletion
+
+
+def backfill_availability(apps, schema_editor):
+    Book = apps.get_model('catalog', 'Book')
+    BookAvailability = apps.get_model('catalog', 'BookAvailability')
+    BookInstance = apps.get_model('catalog', 'BookInstance')
+    counts = {
+        row.pop('book_id'): row
+        for row in BookInstance.objects.order_by().values('book_id').annotate(
+            total=Count('id'),
+            available=Count('id', filter=Q(status='a')),
+            on_loan=Count('id', filter=Q(status='o')),
+            reserved=Count('id', filter=Q(status='r')),
+            maintenance=Count('id', filter=Q(status='m')),
+            next_due_back=Min('due_back', filter=Q(status='o')),
+        )
+    }
+    BookAvailability.objects.bulk_create(
+        (BookAvailability(book_id=book_id, **counts.get(book_id, {}))
+         for book_id in Book.objects.values_list('id', flat=True).iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0031_book_search_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookAvailability',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='availability', serialize=False, to='catalog.book')),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('available', models.PositiveIntegerField(default=0)),
+                ('on_loan', models.PositiveIntegerField(default=0)),
+                ('reserved', models.PositiveIntegerField(default=0)),
+                ('maintenance', models.PositiveIntegerField(default=0)),
+                ('next_due_back', models.DateField(blank=True, help_text='Earliest due date of a copy on loan', null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'book availability',
+            },
+        ),
+        migrations.RunPython(backfill_availability, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0032_bookavailability'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='borrowedbook',
+            index=models.Index(fields=['borrower', 'book'], name='catalog_borrowed_user_book'),
+        ),
+    ]
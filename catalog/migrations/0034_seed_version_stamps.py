@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:05
+
+import time
+
+from django.db import migrations
+
+VERSIONED = ('author', 'book', 'bookinstance', 'genre', 'language')
+
+
+def seed_version_stamps(apps, schema_editor):
+    CatalogCounter = apps.get_model('catalog', 'CatalogCounter')
+    stamp = int(time.time() * 1_000_000)
+    for name in VERSIONED:
+        CatalogCounter.objects.get_or_create(name=f'version:{name}', defaults={'value': stamp})
+
+
+def remove_version_stamps(apps, schema_editor):
+    CatalogCounter = apps.get_model('catalog', 'CatalogCounter')
+    CatalogCounter.objects.filter(name__in=[f'version:{name}' for name in VERSIONED]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0033_borrowedbook_borrower_book_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_version_stamps, remove_version_stamps),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0034_seed_version_stamps'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookinstance',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='borrowedbook',
+            name='returned_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
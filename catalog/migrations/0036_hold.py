@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:27
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('catalog', '0035_circulation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Hold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('w', 'Waiting'), ('r', 'Ready for pickup'), ('f', 'Fulfilled'), ('c', 'Cancelled'), ('x', 'Expired')], default='w', max_length=1)),
+                ('priority', models.SmallIntegerField(default=0, help_text='Holds with a higher priority are served first')),
+                ('placed', models.DateTimeField(default=django.utils.timezone.now)),
+                ('expires', models.DateField(blank=True, help_text='Pickup deadline of a ready hold; last useful day of a waiting one', null=True)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holds', to='catalog.book')),
+                ('copy', models.ForeignKey(blank=True, help_text='The copy set aside once the hold is ready', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='catalog.bookinstance')),
+                ('patron', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holds', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['book', 'status', '-priority', 'id'], name='catalog_hold_queue'), models.Index(fields=['status', 'expires'], name='catalog_hold_expiry')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='hold',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['w', 'r'])), fields=('book', 'patron'), name='catalog_hold_one_open_per_patron'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0036_hold'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookinstance',
+            name='overdue_since',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='bookinstance',
+            index=models.Index(fields=['status', 'due_back', 'id'], name='catalog_copy_status_due'),
+        ),
+        migrations.AddIndex(
+            model_name='bookinstance',
+            index=models.Index(condition=models.Q(('overdue_since__isnull', False)), fields=['overdue_since'], name='catalog_copy_overdue_since'),
+        ),
+    ]
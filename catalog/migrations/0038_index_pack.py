@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0037_bookinstance_overdue'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='author',
+            options={'ordering': ['last_name', 'first_name', 'id']},
+        ),
+        migrations.AlterModelOptions(
+            name='book',
+            options={'ordering': ['title', 'id']},
+        ),
+        migrations.AlterModelOptions(
+            name='bookinstance',
+            options={'ordering': ['due_back', 'id'], 'permissions': (('can_mark_returned', 'Set book as returned'),)},
+        ),
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(fields=['last_name', 'first_name', 'id'], name='catalog_author_name'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['title', 'id'], name='catalog_book_title'),
+        ),
+        migrations.AddIndex(
+            model_name='bookinstance',
+            index=models.Index(fields=['borrower', 'status', 'due_back', 'id'], name='catalog_copy_borrower_due'),
+        ),
+        migrations.AddIndex(
+            model_name='bookinstance',
+            index=models.Index(fields=['book', 'status', 'due_back', 'id'], name='catalog_copy_book_status'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0038_index_pack'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SQLStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url_name', models.CharField(max_length=200, unique=True)),
+                ('requests', models.BigIntegerField(default=0)),
+                ('queries', models.BigIntegerField(default=0)),
+                ('repeated', models.BigIntegerField(default=0)),
+                ('time_us', models.BigIntegerField(default=0)),
+                ('n_plus_one', models.BigIntegerField(default=0, help_text='Requests with a likely N+1 query')),
+                ('worst_count', models.PositiveIntegerField(default=0, help_text='Runs of the most repeated N+1 statement')),
+                ('worst_sql', models.TextField(blank=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,129 @@
+import time
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from . import compiled, pagecache
+from .renderers import FastJSONRenderer
+from .serializers import only_columns, related_lookups
+
+
+class EagerLoadingMixin:
+    """API view mixin applying the related-object lookups declared by the view's serializer.
+
+    See serializers.related_lookups(). With it every list endpoint runs a fixed
+    number of queries however many rows are on the page. Reads also load only
+    the columns the serializer's fields need (serializers.only_columns()), so
+    ?fields= and ?expand= narrow the query as well as the payload.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        serializer = self.get_serializer()
+        select, prefetch = related_lookups(serializer)
+        if select:
+            queryset = queryset.select_related(*dict.fromkeys(select))
+        if prefetch:
+            queryset = queryset.prefetch_related(*dict.fromkeys(prefetch))
+        if self.request.method in SAFE_METHODS:
+            columns = only_columns(serializer)
+            if columns:
+                queryset = queryset.only(*dict.fromkeys(columns))
+        return queryset
+
+
+class CompiledListMixin:
+    """List view mixin serializing pages with the compiled serializer (catalog/compiled.py).
+
+    The page is read as QuerySet.values() rows of just the columns the fields
+    need and converted in bulk, with the same output as the view's serializer.
+    Serializers the compiler does not support take the regular path, as does
+    every view when CATALOG_COMPILED_SERIALIZERS is off.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if not getattr(settings, 'CATALOG_COMPILED_SERIALIZERS', False):
+            return super().list(request, *args, **kwargs)
+        try:
+            plan = compiled.compile_serializer(self.get_serializer())
+        except compiled.NotCompilable:
+            return super().list(request, *args, **kwargs)
+        queryset = compiled.rows(self.filter_queryset(self.get_queryset()), plan)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(plan.serialize(page))
+        return Response(plan.serialize(queryset))
+
+
+class StreamingRenderMixin:
+    """API view mixin streaming long JSON responses in chunks (FastJSONRenderer.iter_render()).
+
+    A successful response holding a list longer than CATALOG_JSON_CHUNK_SIZE
+    items is sent as a StreamingHttpResponse with the same headers, instead of
+    being rendered into one bytes object first.
+    """
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        renderer = getattr(response, 'accepted_renderer', None)
+        if (not isinstance(response, Response) or not isinstance(renderer, FastJSONRenderer)
+                or response.status_code != 200 or not renderer.has_long_list({'data': response.data},
+                                                                             renderer.chunk_size)
+                and not (isinstance(response.data, dict)
+                         and renderer.has_long_list(response.data, renderer.chunk_size))):
+            return response
+        streaming = StreamingHttpResponse(
+            renderer.iter_render(response.data, response.accepted_media_type, response.renderer_context),
+            status=response.status_code, content_type=renderer.media_type)
+        for header, value in response.items():
+            if header.lower() != 'content-type':
+                streaming[header] = value
+        return streaming
+
+
+class PageCacheMixin:
+    """View mixin serving anonymous GETs from the tag-based page cache (see catalog/pagecache.py).
+
+    A detail page is tagged with its object, a list page with the list and the
+    objects on the page; views extend get_cache_tags() with anything else the
+    page shows.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if not pagecache.cacheable(request):
+            return super().dispatch(request, *args, **kwargs)
+        cached = pagecache.get(request)
+        if cached is not None:
+            return cached
+        rendered_at = time.time()
+        response = super().dispatch(request, *args, **kwargs)
+
+        def store(response):
+            pagecache.store(request, response, self.get_cache_tags(response), rendered_at)
+
+        if hasattr(response, 'add_post_render_callback') and not response.is_rendered:
+            response.add_post_render_callback(store)
+        else:
+            store(response)
+        return response
+
+    def get_cache_tags(self, response):
+        context = getattr(response, 'context_data', None) or {}
+        model = getattr(self, 'model', None) or self.queryset.model
+        if context.get('object') is not None:
+            objects, tags = [context['object']], set()
+        else:
+            objects, tags = self.get_list_objects(context), {pagecache.list_tag(model)}
+        for obj in objects:
+            # CompiledListMixin pages are values() rows.
+            tags |= pagecache.row_tags(model, obj) if isinstance(obj, dict) else pagecache.object_tags(obj)
+        return tags
+
+    def get_list_objects(self, context):
+        if context.get('object_list') is not None:
+            return list(context['object_list'])
+        # DRF list views: the objects of the current page.
+        paginator = getattr(self, '_paginator', None)
+        return list(getattr(paginator, 'page', None) or [])
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import DatabaseError, models, transaction
 
 # models.py
 import uuid  # Add this line
@@ -152,7 +152,11 @@ class Author(models.Model):
     date_of_death = models.DateField('died', null=True, blank=True)
 
     class Meta:
-        ordering = ['last_name', 'first_name']
+        ordering = ['last_name', 'first_name', 'id']
+        indexes = [
+            # The default ordering, so author lists are read in index order.
+            models.Index(fields=['last_name', 'first_name', 'id'], name='catalog_author_name'),
+        ]
 
     def get_absolute_url(self):
         """Returns the url to access a particular author instance."""
@@ -173,7 +177,11 @@ class Book(models.Model):
     language = models.ForeignKey(Language, on_delete=models.SET_NULL, null=True)
 
     class Meta:
-        ordering = ['title', 'author']
+        # Ordering by 'author' sorted through Author.Meta.ordering, a join on every book list.
+        ordering = ['title', 'id']
+        indexes = [
+            models.Index(fields=['title', 'id'], name='catalog_book_title'),
+        ]
 
     def display_genre(self):
         return ', '.join([genre.name for genre in self.genre.all()[:3]])
@@ -188,6 +196,10 @@ class Book(models.Model):
 
 
 
+class StaleCopy(DatabaseError):
+    """The BookInstance being saved was changed by another transaction since it was read."""
+
+
 class BookInstance(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, help_text="Unique ID for this particular book across the whole library")
     book = models.ForeignKey(Book, on_delete=models.CASCADE)
@@ -203,14 +215,83 @@ class BookInstance(models.Model):
     )
 
     status = models.CharField(max_length=1, choices=STATUS_CHOICES, blank=True, default='a', help_text='Book availability')
+    # Incremented by every write; save() and catalog/circulation.py change a copy only at the version they read.
+    version = models.PositiveIntegerField(default=0, editable=False)
+    # Set by the overdue sweep (catalog/overdue.py) to the day it first found the loan overdue.
+    overdue_since = models.DateField(null=True, blank=True, editable=False)
 
     @property
     def is_overdue(self):
         return bool(self.due_back and date.today() > self.due_back)
 
     class Meta:
-        ordering = ['due_back']
+        ordering = ['due_back', 'id']
         permissions = (("can_mark_returned", "Set book as returned"),)
+        indexes = [
+            # Loans by due date: overdue loans are one range of it (catalog/overdue.py).
+            models.Index(fields=['status', 'due_back', 'id'], name='catalog_copy_status_due'),
+            # A patron's loans by due date (LoanedBooksByUserListView).
+            models.Index(fields=['borrower', 'status', 'due_back', 'id'], name='catalog_copy_borrower_due'),
+            # Covers the per-book counts of catalog/availability.py and the copies circulation.py claims.
+            models.Index(fields=['book', 'status', 'due_back', 'id'], name='catalog_copy_book_status'),
+            models.Index(fields=['overdue_since'], name='catalog_copy_overdue_since',
+                         condition=models.Q(overdue_since__isnull=False)),
+        ]
+
+    # Fields whose stored values signal handlers compare against (see catalog/signals.py).
+    TRACKED_FIELDS = ('status', 'due_back', 'book_id')
+    # Fields a save writes only if the row is still at the version read (see _do_update()).
+    VERSIONED_FIELDS = ('book', 'status', 'due_back', 'borrower')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the stored values of TRACKED_FIELDS so signal handlers can tell what changed."""
+        instance = super().from_db(db, field_names, values)
+        loaded = dict(zip(field_names, values))
+        if all(field in loaded for field in cls.TRACKED_FIELDS):
+            instance._loaded_values = {field: loaded[field] for field in cls.TRACKED_FIELDS}
+        return instance
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        self._expected_version = None
+        if not self._state.adding:
+            names = None if update_fields is None else {self._meta.get_field(name).name for name in update_fields}
+            if names is None or names.intersection(self.VERSIONED_FIELDS):
+                self._expected_version = self.version
+            self.version += 1
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'version'}
+        try:
+            # Signal handlers maintain denormalized counts; run them in the same transaction.
+            with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+                super().save(*args, **kwargs)
+        except StaleCopy:
+            self.version -= 1
+            raise
+        self._loaded_values = {field: getattr(self, field) for field in self.TRACKED_FIELDS}
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        """UPDATE ... WHERE version = <version read>, raising StaleCopy if the row has moved on.
+
+        Otherwise a form or admin save of a copy read before circulation.borrow()
+        (or any other claim) would silently undo it.
+        """
+        if getattr(self, '_expected_version', None) is None:
+            # Only fields no claim changes: advance whatever version the row is at, never set it back.
+            values = [(field, model, models.F('version') + 1 if field.name == 'version' else value)
+                      for field, model, value in values]
+            updated = super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+            if updated:
+                self.refresh_from_db(using=using, fields=['version'])
+            return updated
+        if super()._do_update(base_qs.filter(version=self._expected_version), using, pk_val, values,
+                              update_fields, forced_update):
+            return True
+        if base_qs.filter(pk=pk_val).exists():
+            raise StaleCopy(f'Copy {pk_val} was changed since it was read (version {self._expected_version}).')
+        # Deleted meanwhile: Model.save() inserts it again, as it does for any model.
+        return False
 
     def get_absolute_url(self):
         return reverse('bookinstance-detail', args=[str(self.id)])
@@ -227,6 +308,54 @@ class BorrowedBook(models.Model):
     book = models.ForeignKey(Book, on_delete=models.CASCADE, default=1)
     borrower = models.ForeignKey(User, on_delete=models.CASCADE)
     borrowed_date = models.DateField(default=timezone.now)
+    returned_date = models.DateField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Serves the "not borrowed by this user" anti-join (catalog/borrowing.py).
+            models.Index(fields=['borrower', 'book'], name='catalog_borrowed_user_book'),
+        ]
+
+
+class Hold(models.Model):
+    """Model representing a patron waiting for a copy of a book (see catalog/holds.py)."""
+    WAITING = 'w'
+    READY = 'r'
+    FULFILLED = 'f'
+    CANCELLED = 'c'
+    EXPIRED = 'x'
+    STATUS_CHOICES = (
+        (WAITING, 'Waiting'),
+        (READY, 'Ready for pickup'),
+        (FULFILLED, 'Fulfilled'),
+        (CANCELLED, 'Cancelled'),
+        (EXPIRED, 'Expired'),
+    )
+    OPEN_STATUSES = (WAITING, READY)
+
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='holds')
+    patron = models.ForeignKey(User, on_delete=models.CASCADE, related_name='holds')
+    status = models.CharField(max_length=1, choices=STATUS_CHOICES, default=WAITING)
+    priority = models.SmallIntegerField(default=0, help_text='Holds with a higher priority are served first')
+    placed = models.DateTimeField(default=timezone.now)
+    copy = models.ForeignKey(BookInstance, on_delete=models.SET_NULL, null=True, blank=True, related_name='+',
+                             help_text='The copy set aside once the hold is ready')
+    expires = models.DateField(null=True, blank=True,
+                               help_text='Pickup deadline of a ready hold; last useful day of a waiting one')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'patron'], condition=models.Q(status__in=['w', 'r']),
+                                    name='catalog_hold_one_open_per_patron'),
+        ]
+        indexes = [
+            # The queue of a book in serving order: the next hold is one index seek.
+            models.Index(fields=['book', 'status', '-priority', 'id'], name='catalog_hold_queue'),
+            models.Index(fields=['status', 'expires'], name='catalog_hold_expiry'),
+        ]
+
+    def __str__(self):
+        return f'{self.patron} waiting for {self.book_id} ({self.get_status_display()})'
 
 
 # models.py
@@ -239,3 +368,52 @@ class Borrower(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class CatalogCounter(models.Model):
+    """Model holding a named denormalized count, e.g. the home page record counts (see catalog/counters.py)."""
+    name = models.CharField(max_length=50, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.name}: {self.value}'
+
+
+class SearchJournal(models.Model):
+    """Model recording books whose search index entries must be refreshed (see catalog/search/index.py)."""
+    book_id = models.BigIntegerField()
+
+    def __str__(self):
+        return f'{self.id}: book {self.book_id}'
+
+
+class BookAvailability(models.Model):
+    """Model holding copy counts for a book, maintained by catalog/availability.py."""
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, primary_key=True, related_name='availability')
+    total = models.PositiveIntegerField(default=0)
+    available = models.PositiveIntegerField(default=0)
+    on_loan = models.PositiveIntegerField(default=0)
+    reserved = models.PositiveIntegerField(default=0)
+    maintenance = models.PositiveIntegerField(default=0)
+    next_due_back = models.DateField(null=True, blank=True, help_text='Earliest due date of a copy on loan')
+
+    class Meta:
+        verbose_name_plural = 'book availability'
+
+    def __str__(self):
+        return f'{self.book_id}: {self.available} of {self.total} available'
+
+
+class SQLStat(models.Model):
+    """Model holding the SQL totals of the sampled requests to one URL name (see catalog/sqlstats.py)."""
+    url_name = models.CharField(max_length=200, unique=True)
+    requests = models.BigIntegerField(default=0)
+    queries = models.BigIntegerField(default=0)
+    repeated = models.BigIntegerField(default=0)
+    time_us = models.BigIntegerField(default=0)
+    n_plus_one = models.BigIntegerField(default=0, help_text='Requests with a likely N+1 query')
+    worst_count = models.PositiveIntegerField(default=0, help_text='Runs of the most repeated N+1 statement')
+    worst_sql = models.TextField(blank=True)
+
+    def __str__(self):
+        return f'{self.url_name}: {self.requests} requests'
@@ -0,0 +1,74 @@
+"""Finding overdue loans in bulk.
+
+A loan is overdue when its copy is on loan ('o') with a due_back before today:
+one range of the (status, due_back, id) index, so loans() and the librarian's
+overdue list are an index seek however many copies the library holds, instead
+of BookInstance.is_overdue evaluated on every row.
+
+sweep() (``manage.py sweep_overdue``, run daily) walks that range in keyset
+order, (due_back, id) after the last row seen, so each chunk is another seek
+rather than an ever larger OFFSET. It stamps overdue_since on the loans found
+for the first time with one UPDATE per chunk, clears the stamp of loans that
+have since been returned or renewed, and groups what it found into one digest
+per borrower.
+"""
+import datetime
+
+from django.db.models import Q
+
+from .models import BookInstance
+
+DIGEST_FIELDS = ('pk', 'due_back', 'overdue_since', 'borrower_id', 'borrower__username', 'book__title')
+
+
+def loans(today=None):
+    """The overdue loans as of today, in due date order."""
+    today = today or datetime.date.today()
+    return BookInstance.objects.filter(status='o', due_back__lt=today).order_by('due_back', 'id')
+
+
+def chunks(today=None, chunk_size=500, fields=DIGEST_FIELDS):
+    """Yield the overdue loans as lists of values() rows, chunk by chunk in keyset order."""
+    queryset = loans(today)
+    last = None
+    while True:
+        chunk_queryset = queryset
+        if last is not None:
+            # The >= bound lets the index range start at the last row.
+            chunk_queryset = queryset.filter(due_back__gte=last['due_back']).filter(
+                Q(due_back__gt=last['due_back']) | Q(id__gt=last['pk']))
+        chunk = list(chunk_queryset.values(*fields)[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last = chunk[-1]
+
+
+def sweep(today=None, chunk_size=500):
+    """Stamp newly overdue loans and clear stale stamps; returns (stamped, cleared, digests).
+
+    digests maps each borrower's id to {'username': ..., 'loans': [{'copy',
+    'title', 'due_back', 'days_overdue', 'new'}, ...]}, their loans in due
+    date order; 'new' marks the loans this sweep found overdue for the first time.
+    """
+    today = today or datetime.date.today()
+    stamped = 0
+    digests = {}
+    for chunk in chunks(today, chunk_size):
+        new = [row['pk'] for row in chunk if row['overdue_since'] is None]
+        if new:
+            # Still on loan and overdue: a copy returned meanwhile is left alone.
+            stamped += loans(today).filter(pk__in=new, overdue_since=None).update(overdue_since=today)
+        for row in chunk:
+            digest = digests.setdefault(row['borrower_id'], {'username': row['borrower__username'], 'loans': []})
+            digest['loans'].append({
+                'copy': row['pk'],
+                'title': row['book__title'],
+                'due_back': row['due_back'],
+                'days_overdue': (today - row['due_back']).days,
+                'new': row['overdue_since'] is None,
+            })
+    # Loans returned or renewed since they were stamped (without circulation.py, which clears the stamp).
+    cleared = (BookInstance.objects.filter(overdue_since__isnull=False)
+               .exclude(status='o', due_back__lt=today).update(overdue_since=None))
+    return stamped, cleared, digests
@@ -0,0 +1,123 @@
+"""Tag-based cache of the catalog pages served to anonymous visitors.
+
+Each cached page carries the tags of the objects it rendered (``book:12``,
+``author:3``, ``genre:5``, ``language:1``) and of the lists it shows
+(``book:list``...). Invalidating a tag records the time in the cache, and a
+cached page is only served if it was rendered after every one of its tags was
+last invalidated. Nothing has to enumerate the pages to drop them, and a page
+rendered while a change was being committed is never served afterwards.
+
+The signal handlers in catalog/signals.py invalidate the tags of each saved or
+deleted object, both at once and when the transaction commits. Pages are
+cached and served only for requests without credentials, so no user's sidebar
+or permission links are ever shown to someone else. Across several worker
+processes the cache must be shared (memcached, Redis, database).
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from .models import Book
+
+PAGE_PREFIX = 'catalog:page:'
+TAG_PREFIX = 'catalog:tag:'
+
+
+def timeout():
+    return getattr(settings, 'CATALOG_PAGE_CACHE_TIMEOUT', 0)
+
+
+def list_tag(model):
+    return f'{model._meta.model_name}:list'
+
+
+def object_tags(obj):
+    """Tags of obj and of the related objects rendered alongside it."""
+    tags = {f'{obj._meta.model_name}:{obj.pk}'}
+    if isinstance(obj, Book):
+        # Columns left out by ?fields= (deferred) were not rendered either.
+        deferred = obj.get_deferred_fields()
+        if 'author_id' not in deferred and obj.author_id:
+            tags.add(f'author:{obj.author_id}')
+        if 'language_id' not in deferred and obj.language_id:
+            tags.add(f'language:{obj.language_id}')
+        # Genres are only rendered where they were prefetched.
+        genres = getattr(obj, '_prefetched_objects_cache', {}).get('genre')
+        if genres is not None:
+            tags.update(f'genre:{genre.pk}' for genre in genres)
+    return tags
+
+
+def row_tags(model, row):
+    """object_tags() for a values() row of model (see mixins.CompiledListMixin)."""
+    tags = {f'{model._meta.model_name}:{row[model._meta.pk.name]}'}
+    if model is Book:
+        for name in ('author', 'language'):
+            if row.get(name):
+                tags.add(f'{name}:{row[name]}')
+    return tags
+
+
+def _invalidate_now(tags):
+    cache.set_many({TAG_PREFIX + tag: time.time() for tag in tags}, timeout=None)
+
+
+def invalidate(*tags):
+    """Drop every cached page carrying any of tags.
+
+    The tags are invalidated again on commit, so a page rendered from the old
+    data before the change became visible is not kept either.
+    """
+    tags = set(tags)
+    if not tags or not timeout():
+        return
+    _invalidate_now(tags)
+    transaction.on_commit(lambda: _invalidate_now(tags))
+
+
+def cacheable(request):
+    return (
+        timeout()
+        and request.method == 'GET'
+        and 'HTTP_AUTHORIZATION' not in request.META
+        and not request.user.is_authenticated
+    )
+
+
+def page_key(request):
+    # The DRF views render JSON or HTML from the same URL.
+    key = f"{request.get_full_path()}|{request.META.get('HTTP_ACCEPT', '')}"
+    return PAGE_PREFIX + hashlib.sha1(key.encode()).hexdigest()
+
+
+def get(request):
+    """Return the cached response for request if it is still valid, else None."""
+    entry = cache.get(page_key(request))
+    if entry is None:
+        return None
+    rendered_at, tags, response = entry
+    invalidated = cache.get_many([TAG_PREFIX + tag for tag in tags])
+    if len(invalidated) < len(tags) or any(value > rendered_at for value in invalidated.values()):
+        return None
+    response['X-Catalog-Cache'] = 'hit'
+    return get_conditional_response(
+        request, etag=response.get('ETag'),
+        last_modified=parse_http_date_safe(response.get('Last-Modified', '')), response=response)
+
+
+def store(request, response, tags, rendered_at):
+    """Cache response under its tags; rendered_at is when rendering started."""
+    if (response.status_code != 200 or response.streaming or response.cookies
+            or 'private' in response.get('Cache-Control', '')):
+        return
+    for tag in tags:
+        # A tag unknown to the cache (new, or evicted) is taken as invalidated
+        # just before this page was rendered.
+        cache.add(TAG_PREFIX + tag, rendered_at, timeout=None)
+    response['X-Catalog-Cache'] = 'miss'
+    cache.set(page_key(request), (rendered_at, sorted(tags), response), timeout())
@@ -0,0 +1,20 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class CatalogCursorPagination(CursorPagination):
+    """Keyset pagination for the catalog API.
+
+    Pages are selected with ``WHERE id > <cursor> ORDER BY id LIMIT n`` on the
+    primary key index, so the cost of a page does not depend on the size of the
+    table or on how deep the client has paged, and no COUNT(*) is issued.
+    The cursor is opaque (base64 encoded) to clients.
+    """
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'CATALOG_API_MAX_PAGE_SIZE', 100)
+
+
+class HoldCursorPagination(CatalogCursorPagination):
+    """A patron's holds in the order they were placed (the id breaks ties between equal times)."""
+    ordering = ('placed', 'id')
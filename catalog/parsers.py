@@ -0,0 +1,31 @@
+"""Request parsers for the catalog API."""
+import codecs
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """Newline-delimited JSON: one object per line, read lazily from the request.
+
+    The parsed data is an iterator, so the bulk endpoints validate and insert a
+    large upload chunk by chunk without holding it in memory. A line that is
+    not valid JSON is yielded as a ParseError for the caller to report.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        return self.rows(codecs.getreader(encoding)(stream))
+
+    def rows(self, lines):
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as exc:
+                yield ParseError(f'Line {number}: JSON parse error - {exc}')
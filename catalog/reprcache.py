@@ -0,0 +1,79 @@
+"""Cache of each object's serialized representation (see CachedRepresentationMixin).
+
+Every cached object has a version token in the cache, ``catalog:repr:version:
+<model>:<pk>``, and its representation is stored together with the token it
+was built under. An entry is only used while its token is still the current
+one, so invalidate() just replaces the tokens of the changed objects; list
+endpoints read the tokens and the entries of a whole page with one get_many().
+
+The signal handlers in catalog/signals.py invalidate a book when it is saved or
+deleted, when its genres change (m2m_changed on Book.genre) or are renamed, and
+availability.refresh() when its copy counts change. Like the page cache,
+invalidation happens at once and again when the transaction commits, and no
+entry is written inside a transaction, where it could outlive a rollback.
+Across several worker processes the cache must be shared.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+PREFIX = 'catalog:repr:'
+VERSION_PREFIX = PREFIX + 'version:'
+
+
+def timeout():
+    return getattr(settings, 'CATALOG_REPRESENTATION_CACHE_TIMEOUT', 0)
+
+
+def version_key(model_name, pk):
+    return f'{VERSION_PREFIX}{model_name}:{pk}'
+
+
+def entry_key(variant, model_name, pk):
+    return f'{PREFIX}{variant}:{model_name}:{pk}'
+
+
+def _invalidate_now(model_name, pks):
+    cache.set_many({version_key(model_name, pk): uuid.uuid4().hex for pk in pks}, timeout=None)
+
+
+def invalidate(model_name, pks):
+    """Drop the cached representations of the given objects of model_name."""
+    pks = set(pks)
+    if not pks or not timeout():
+        return
+    _invalidate_now(model_name, pks)
+    transaction.on_commit(lambda: _invalidate_now(model_name, pks))
+
+
+def get_many(variant, model_name, pks):
+    """Return ({pk: representation} of the cached objects, {pk: version token} of all of them).
+
+    Objects seen for the first time are given a token, which set_many() needs
+    to store them.
+    """
+    keys = {pk: (version_key(model_name, pk), entry_key(variant, model_name, pk)) for pk in pks}
+    found = cache.get_many([key for pair in keys.values() for key in pair])
+    representations, tokens = {}, {}
+    for pk, (version, entry) in keys.items():
+        token = found.get(version)
+        if token is None:
+            # add() rather than set(): an invalidation made meanwhile must win.
+            cache.add(version, uuid.uuid4().hex, timeout=None)
+            token = cache.get(version)
+        elif entry in found and found[entry][0] == token:
+            representations[pk] = found[entry][1]
+        tokens[pk] = token
+    return representations, tokens
+
+
+def set_many(variant, model_name, representations, tokens):
+    """Store representations ({pk: data}) under the tokens get_many() returned."""
+    if not representations or transaction.get_connection().in_atomic_block:
+        return
+    cache.set_many({
+        entry_key(variant, model_name, pk): (tokens[pk], data)
+        for pk, data in representations.items() if tokens.get(pk) is not None
+    }, timeout())
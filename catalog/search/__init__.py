@@ -0,0 +1,6 @@
+"""Full-text search over the catalog's books.
+
+engine.py holds a framework-independent BM25 inverted index; index.py keeps a
+per-process instance of it in step with the database.
+"""
+from .index import get_index, search_books  # noqa: F401
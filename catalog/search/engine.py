@@ -0,0 +1,348 @@
+"""Inverted index with BM25 ranking and prefix queries.
+
+This module knows nothing about Django; catalog/search/index.py feeds it books.
+"""
+import bisect
+import heapq
+import json
+import math
+import re
+import sys
+import unicodedata
+from array import array
+from collections import Counter
+
+TOKEN_RE = re.compile(r'\w+')
+QUERY_RE = re.compile(r'(\w+)(\*?)')
+STOPWORDS = frozenset(
+    'a an and are as at be by for from in into is it of on or that the this to with'.split())
+
+SNAPSHOT_VERSION = 3
+
+# A posting is one 64-bit integer: the document's length above its id.
+ID_BITS = 40
+ID_MASK = (1 << ID_BITS) - 1
+MAX_LENGTH = (1 << (64 - ID_BITS)) - 1
+
+
+def normalize(text):
+    """Lowercase text and strip accents so that 'Émile' matches 'emile'."""
+    text = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall(normalize(text)) if token not in STOPWORDS]
+
+
+def weighted_terms(fields):
+    """Return term frequencies for a document given (text, weight) pairs."""
+    terms = Counter()
+    for text, weight in fields:
+        for token in tokenize(text):
+            terms[token] += weight
+    return terms
+
+
+class SearchIndex:
+    """An in-memory inverted index ranked with Okapi BM25.
+
+    Postings are kept in impact order, so that a search reads only as many as
+    it needs for its top results. A term's postings are split by term
+    frequency into arrays of 64-bit integers, each packing a document's length
+    above its id, sorted ascending: along one array the BM25 weight of the
+    term only falls. search() merges the arrays from their heads and stops
+    once no document still unread could reach the results (the threshold
+    algorithm), and scores each document read from the forward map of its
+    terms and frequencies, which also lets a document be replaced or removed
+    in time proportional to its own length. A sorted vocabulary answers
+    prefix queries with a binary search.
+
+    Arrays written by add() are sorted lazily, with the vocabulary, by sort();
+    search() and copy() sort first.
+
+    An index is not locked: searches may run in any number of threads while
+    nothing changes it. To update an index being searched, change a copy()
+    and swap it in; the copy shares the postings of the original and copies a
+    term's table, and each array, only when it first changes them.
+    """
+    k1 = 1.2
+    b = 0.75
+    min_prefix_length = 2
+    max_prefix_expansions = 50
+    # search() tightens its stopping bound with _bound() every bound_interval reads, for
+    # queries of several groups spread over at most max_bound_arrays arrays.
+    bound_interval = 64
+    max_bound_arrays = 256
+
+    def __init__(self):
+        # {term: {frequency: array('Q') of postings}}
+        self.postings = {}
+        # {doc_id: (terms, their frequencies as bytes or an array('I'))}
+        self.documents = {}
+        self.total_length = 0
+        # Opaque marker of how far the index has been brought up to date.
+        self.position = 0
+        self._vocabulary = []
+        self._vocabulary_dirty = False
+        # (term, frequency) arrays appended to since the last sort().
+        self._unsorted = set()
+        # Terms and (term, frequency) arrays this index may change, or None for all of them.
+        self._owned = None
+
+    def __len__(self):
+        return len(self.documents)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.documents
+
+    def copy(self):
+        """Return an index with the same documents, whose changes leave this one untouched."""
+        self.sort()
+        index = type(self)()
+        index.postings = dict(self.postings)
+        index.documents = dict(self.documents)
+        index.total_length = self.total_length
+        index.position = self.position
+        index._vocabulary = self._vocabulary
+        index._owned = set()
+        return index
+
+    def document_frequency(self, term):
+        """The number of documents containing term."""
+        return sum(map(len, self.postings.get(term, {}).values()))
+
+    def _array(self, term, frequency):
+        """The writable array of term's postings with this frequency, created if missing."""
+        owned = self._owned
+        table = self.postings.get(term)
+        if table is None:
+            table = self.postings[term] = {}
+            self._vocabulary_dirty = True
+        elif owned is not None and term not in owned:
+            table = self.postings[term] = dict(table)
+        if owned is not None:
+            owned.add(term)
+        postings = table.get(frequency)
+        if postings is None:
+            postings = table[frequency] = array('Q')
+        elif owned is not None and (term, frequency) not in owned:
+            postings = table[frequency] = array('Q', postings)
+        if owned is not None:
+            owned.add((term, frequency))
+        return postings
+
+    def add(self, doc_id, terms):
+        """Index (or re-index) a document from a mapping of term to (integer) frequency."""
+        self.remove(doc_id)
+        if not terms:
+            return
+        if not 0 <= doc_id <= ID_MASK:
+            raise ValueError(f'Document ids must be between 0 and {ID_MASK}.')
+        try:
+            # One byte per frequency when they all fit, as they nearly always do.
+            frequencies = bytes(terms.values())
+        except ValueError:
+            frequencies = array('I', terms.values())
+        terms = tuple(map(sys.intern, terms))
+        length = sum(frequencies)
+        key = min(length, MAX_LENGTH) << ID_BITS | doc_id
+        for term, frequency in zip(terms, frequencies):
+            self._array(term, frequency).append(key)
+            self._unsorted.add((term, frequency))
+        self.documents[doc_id] = (terms, frequencies)
+        self.total_length += length
+
+    def remove(self, doc_id):
+        document = self.documents.pop(doc_id, None)
+        if document is None:
+            return
+        terms, frequencies = document
+        length = sum(frequencies)
+        self.total_length -= length
+        key = min(length, MAX_LENGTH) << ID_BITS | doc_id
+        for term, frequency in zip(terms, frequencies):
+            postings = self._array(term, frequency)
+            if (term, frequency) in self._unsorted:
+                del postings[postings.index(key)]
+            else:
+                del postings[bisect.bisect_left(postings, key)]
+            if not postings:
+                table = self.postings[term]
+                del table[frequency]
+                self._unsorted.discard((term, frequency))
+                if not table:
+                    del self.postings[term]
+                    self._vocabulary_dirty = True
+
+    def sort(self):
+        """Put the postings and vocabulary changed since the last sort in search order."""
+        for term, frequency in self._unsorted:
+            table = self.postings[term]
+            table[frequency] = array('Q', sorted(table[frequency]))
+        self._unsorted = set()
+        self.vocabulary()
+
+    def vocabulary(self):
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self.postings)
+            self._vocabulary_dirty = False
+        return self._vocabulary
+
+    def expand_prefix(self, prefix):
+        """Return the most frequent indexed terms starting with prefix."""
+        vocabulary = self.vocabulary()
+        start = bisect.bisect_left(vocabulary, prefix)
+        end = bisect.bisect_left(vocabulary, prefix + '\uffff', start)
+        matches = vocabulary[start:end]
+        if len(matches) > self.max_prefix_expansions:
+            matches = heapq.nlargest(self.max_prefix_expansions, matches, key=self.document_frequency)
+        return matches
+
+    def parse_query(self, query, prefix=False):
+        """Split a query into term groups; ``term*`` (or the last term when prefix=True) is a prefix."""
+        parsed = QUERY_RE.findall(normalize(query))
+        groups = []
+        for position, (token, star) in enumerate(parsed):
+            is_prefix = bool(star) or (prefix and position == len(parsed) - 1)
+            if is_prefix and len(token) >= self.min_prefix_length:
+                groups.append(self.expand_prefix(token))
+            elif token not in STOPWORDS:
+                groups.append([token])
+        return groups
+
+    def search(self, query, limit=20, prefix=False):
+        """Return up to limit (doc_id, score) pairs, best first.
+
+        A document's score sums, over the query's term groups, the BM25
+        weight of the best term it contains from each group (a prefix's
+        expansions count once).
+        """
+        self.sort()
+        if not self.documents or limit < 1:
+            return []
+        document_count = len(self.documents)
+        norm = self.k1 * (1 - self.b)
+        slope = self.k1 * self.b / (self.total_length / document_count)
+
+        # [(term, [(group, idf)])], and per group a heap of its arrays by the weight of their head.
+        term_groups = {}
+        heads = []
+        sequence = 0
+        for terms in self.parse_query(query, prefix=prefix):
+            heap = []
+            for term in terms:
+                table = self.postings.get(term)
+                if not table:
+                    continue
+                frequency = self.document_frequency(term)
+                idf = math.log(1 + (document_count - frequency + 0.5) / (frequency + 0.5))
+                term_groups.setdefault(term, []).append((len(heads), idf))
+                for tf, postings in table.items():
+                    heap.append((-self._weight(idf, tf, norm + slope * (postings[0] >> ID_BITS)),
+                                 sequence, idf, tf, postings, 0))
+                    sequence += 1
+            if heap:
+                heapq.heapify(heap)
+                heads.append(heap)
+        query_terms = list(term_groups.items())
+        bounds = [-heap[0][0] for heap in heads]
+        # The sum of the bounds is loose when several groups' heads are far apart in length (see _bound()).
+        tighten = len(heads) > 1 and sequence <= self.max_bound_arrays
+
+        results = []
+        seen = set()
+        reads = 0
+        while heads:
+            threshold = sum(bounds)
+            if len(results) >= limit and tighten and reads >= self.bound_interval:
+                threshold = min(threshold, self._bound(heads, norm, slope))
+                reads = 0
+            if threshold <= 0 or (len(results) >= limit and results[0][0] >= threshold):
+                break
+            group = bounds.index(max(bounds)) if len(bounds) > 1 else 0
+            heap = heads[group]
+            _, order, idf, tf, postings, position = heap[0]
+            key = postings[position]
+            position += 1
+            if position < len(postings):
+                weight = self._weight(idf, tf, norm + slope * (postings[position] >> ID_BITS))
+                heapq.heapreplace(heap, (-weight, order, idf, tf, postings, position))
+            else:
+                heapq.heappop(heap)
+            bounds[group] = -heap[0][0] if heap else 0.0
+            reads += 1
+            doc_id = key & ID_MASK
+            if doc_id in seen:
+                continue
+            seen.add(doc_id)
+            score = self._score(doc_id, norm + slope * (key >> ID_BITS), query_terms, len(heads))
+            if len(results) < limit:
+                heapq.heappush(results, (score, -doc_id))
+            elif (score, -doc_id) > results[0]:
+                heapq.heapreplace(results, (score, -doc_id))
+        return [(-doc_id, score) for score, doc_id in sorted(results, reverse=True)]
+
+    def _weight(self, idf, tf, length_norm):
+        return idf * tf * (self.k1 + 1) / (tf + length_norm)
+
+    def _score(self, doc_id, length_norm, query_terms, group_count):
+        best = [0.0] * group_count
+        terms, frequencies = self.documents[doc_id]
+        for term, groups in query_terms:
+            if term in terms:
+                tf = frequencies[terms.index(term)]
+                for group, idf in groups:
+                    weight = self._weight(idf, tf, length_norm)
+                    if weight > best[group]:
+                        best[group] = weight
+        return sum(best)
+
+    def _bound(self, heads, norm, slope):
+        """The highest score a document not yet read from heads could have.
+
+        Such a document is no shorter than the head of each array it is in, so
+        its weight in every group falls with the longest of those heads: this
+        takes the best combination of arrays at each head length.
+        """
+        arrays = sorted((postings[position] >> ID_BITS, group, idf, tf)
+                        for group, heap in enumerate(heads) for _, _, idf, tf, postings, position in heap)
+        # Per group, the highest frequency of each of its terms (by idf) among arrays no longer than length.
+        best = [{} for _ in heads]
+        bound = 0.0
+        for number, (length, group, idf, tf) in enumerate(arrays):
+            best[group][idf] = max(tf, best[group].get(idf, 0))
+            if number + 1 < len(arrays) and arrays[number + 1][0] == length:
+                continue
+            length_norm = norm + slope * length
+            bound = max(bound, sum(
+                max(self._weight(idf, tf, length_norm) for idf, tf in terms.items()) for terms in best if terms))
+        return bound
+
+    def dumps(self):
+        """The index as JSON bytes: plain data, which loads() reads without running any code."""
+        return json.dumps({
+            'version': SNAPSHOT_VERSION,
+            'position': self.position,
+            'postings': {
+                term: [[frequency, [key & ID_MASK for key in postings]] for frequency, postings in table.items()]
+                for term, table in self.postings.items()},
+        }, separators=(',', ':')).encode()
+
+    @classmethod
+    def loads(cls, data):
+        """Read an index written by dumps(); raises ValueError for anything else."""
+        state = json.loads(data)
+        if not isinstance(state, dict) or state.get('version') != SNAPSHOT_VERSION:
+            raise ValueError('Unsupported search index snapshot version.')
+        documents = {}
+        for term, table in state['postings'].items():
+            for frequency, doc_ids in table:
+                for doc_id in doc_ids:
+                    documents.setdefault(doc_id, {})[term] = frequency
+        index = cls()
+        for doc_id, terms in documents.items():
+            index.add(doc_id, terms)
+        index.position = state['position']
+        index.sort()
+        return index
@@ -0,0 +1,79 @@
+"""Database-backed book search.
+
+On SQLite, books are mirrored into the FTS5 table ``catalog_book_fts``
+(title, summary, author names, rowid = book id). Triggers on catalog_book and
+catalog_author, created by migration 0031, keep the mirror in sync, and
+search_queryset() ranks matches with FTS5's bm25(). Other backends fall back to
+icontains over the title and author names. Migration 0031 gives those columns
+trigram indexes on PostgreSQL. The hot path never scans Book.summary.
+
+SQLite drops a table's triggers when a migration rebuilds it. A migration that
+alters catalog_book or catalog_author must create them again, with the SQL
+copied from migration 0031 (migrations do not import this module, which would
+change what they do whenever it changes).
+"""
+from django.db import connections
+from django.db.models import Q
+
+from ..models import Book
+from .engine import QUERY_RE, STOPWORDS, normalize
+
+FTS_TABLE = 'catalog_book_fts'
+
+# bm25() weights for the title, summary and author_names columns.
+COLUMN_WEIGHTS = (10.0, 1.0, 5.0)
+
+_enabled = {}
+
+
+def fts_enabled(using='default'):
+    """Whether the FTS5 mirror exists on this database (checked once per process)."""
+    if using not in _enabled:
+        connection = connections[using]
+        _enabled[using] = (
+            connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names())
+    return _enabled[using]
+
+
+def query_terms(query, prefix=False):
+    """Return (term, is_prefix) pairs; ``term*`` or, with prefix=True, the last term is a prefix."""
+    parsed = QUERY_RE.findall(normalize(query))
+    terms = []
+    for position, (token, star) in enumerate(parsed):
+        is_prefix = bool(star) or (prefix and position == len(parsed) - 1)
+        if is_prefix or token not in STOPWORDS:
+            terms.append((token, is_prefix))
+    return terms
+
+
+def fts_match_expression(terms):
+    # Every term is quoted so user input can never be read as FTS5 query syntax.
+    return ' '.join(f'"{term}"*' if is_prefix else f'"{term}"' for term, is_prefix in terms)
+
+
+def search_queryset(query, queryset=None, prefix=False):
+    """Return books matching every term of query.
+
+    With the FTS5 mirror the result is ordered best match first and each book
+    carries a ``rank`` (bm25(), lower is better); otherwise matches are
+    filtered on title and author names and keep the queryset's ordering.
+    """
+    queryset = Book.objects.all() if queryset is None else queryset
+    terms = query_terms(query, prefix=prefix)
+    if not terms:
+        return queryset.none()
+    if fts_enabled(queryset.db):
+        weights = ', '.join(str(weight) for weight in COLUMN_WEIGHTS)
+        # extra() is needed to join the virtual table and use its MATCH operator.
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = catalog_book.id', f'{FTS_TABLE} MATCH %s'],
+            params=[fts_match_expression(terms)],
+            select={'rank': f'bm25({FTS_TABLE}, {weights})'},
+        ).order_by('rank')
+    for term, is_prefix in terms:
+        queryset = queryset.filter(
+            Q(title__icontains=term)
+            | Q(author__first_name__icontains=term)
+            | Q(author__last_name__icontains=term))
+    return queryset
@@ -0,0 +1,200 @@
+"""The catalog's in-process book search index.
+
+Each process holds one SearchIndex (engine.py) over Book.title, Book.summary
+and the author's first and last names. Signal handlers append the ids of
+changed books to the SearchJournal table, and every worker picks up every
+change incrementally by replaying the journal entries it has not seen.
+
+Searches read the published index without a lock and never wait for a
+replay. At most once every CATALOG_SEARCH_SYNC_INTERVAL seconds, one search
+replays the journal into a copy of the index and publishes the copy in its
+place, while concurrent searches go on reading the previous index (which is
+never changed once published). Only a process's first search waits, for the
+index to be loaded. ``manage.py rebuild_search_index`` writes the snapshot
+that processes load at startup instead of indexing the whole catalog, and
+prunes the journal up to the snapshot's position.
+"""
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Max
+
+from ..models import Book, CatalogCounter, SearchJournal
+from .engine import SearchIndex, weighted_terms
+
+TITLE_WEIGHT = 3
+AUTHOR_WEIGHT = 2
+SUMMARY_WEIGHT = 1
+
+BOOK_FIELDS = ('id', 'title', 'summary', 'author__first_name', 'author__last_name')
+
+# CatalogCounter row holding the highest journal id removed by prune_journal().
+PRUNED_COUNTER = 'search_journal_pruned'
+
+# Journal ids are allocated before commit, so on some backends a transaction can
+# commit an id lower than one already replayed. Entries this close behind the
+# position are re-read and applied if they were not seen before.
+JOURNAL_LOOKBACK = 50
+JOURNAL_BATCH = 2000
+
+_index = None
+_next_sync = 0.0
+# Held while the index is loaded or synced; searches never wait on it once loaded.
+_lock = threading.Lock()
+
+
+def sync_interval():
+    return getattr(settings, 'CATALOG_SEARCH_SYNC_INTERVAL', 1.0)
+
+
+def book_terms(row):
+    author = f"{row['author__first_name'] or ''} {row['author__last_name'] or ''}"
+    return weighted_terms((
+        (row['title'], TITLE_WEIGHT),
+        (author, AUTHOR_WEIGHT),
+        (row['summary'], SUMMARY_WEIGHT),
+    ))
+
+
+def journal_position():
+    return SearchJournal.objects.aggregate(position=Max('id'))['position'] or 0
+
+
+def _mark_window_applied(index):
+    index.applied_entries = set(
+        SearchJournal.objects.filter(id__gt=index.position - JOURNAL_LOOKBACK, id__lte=index.position)
+        .values_list('id', flat=True))
+
+
+def build_index(chunk_size=2000):
+    """Index every book in the database."""
+    index = SearchIndex()
+    # Books changed while we read are journalled past this position and replayed by sync().
+    index.position = journal_position()
+    _mark_window_applied(index)
+    books = Book.objects.order_by().values(*BOOK_FIELDS)
+    for row in books.iterator(chunk_size=chunk_size):
+        index.add(row['id'], book_terms(row))
+    return index
+
+
+def sync(index):
+    """Return index with the books journalled since it was last brought up to date re-indexed.
+
+    index itself is left unchanged, as it may be being searched: the changes go
+    to a copy, which is returned (index is returned when there is nothing to apply).
+    """
+    original = index
+    applied = getattr(index, 'applied_entries', set())
+    while True:
+        window = (
+            SearchJournal.objects.filter(id__gt=max(index.position - JOURNAL_LOOKBACK, 0))
+            .order_by('id').values_list('id', 'book_id')[:JOURNAL_BATCH])
+        entries = [(entry, book_id) for entry, book_id in window if entry not in applied]
+        if not entries:
+            break
+        book_ids = {book_id for _, book_id in entries}
+        rows = {row['id']: row for row in Book.objects.filter(id__in=book_ids).values(*BOOK_FIELDS)}
+        if index is original:
+            index = index.copy()
+        for book_id in book_ids:
+            if book_id in rows:
+                index.add(book_id, book_terms(rows[book_id]))
+            else:
+                index.remove(book_id)
+        applied = applied | {entry for entry, _ in entries}
+        index.position = max(index.position, entries[-1][0])
+        applied = {entry for entry in applied if entry > index.position - JOURNAL_LOOKBACK}
+        index.applied_entries = applied
+    return index
+
+
+def snapshot_path():
+    return getattr(settings, 'CATALOG_SEARCH_SNAPSHOT', None)
+
+
+def load_snapshot(path=None):
+    """Return the index stored at path (default CATALOG_SEARCH_SNAPSHOT), or None.
+
+    A snapshot in an older format is ignored (None) like a missing one.
+    """
+    path = path or snapshot_path()
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, 'rb') as snapshot:
+        try:
+            index = SearchIndex.loads(snapshot.read())
+        except ValueError:
+            return None
+    _mark_window_applied(index)
+    return index
+
+
+def save_snapshot(index, path=None):
+    """Atomically write the index to path (default CATALOG_SEARCH_SNAPSHOT)."""
+    path = str(path or snapshot_path())
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as snapshot:
+        snapshot.write(index.dumps())
+    os.replace(temporary, path)
+
+
+def pruned_position():
+    return CatalogCounter.objects.filter(name=PRUNED_COUNTER).values_list('value', flat=True).first() or 0
+
+
+def prune_journal(position):
+    """Delete journal entries up to position; processes behind it reload the snapshot."""
+    position = max(position, pruned_position())
+    SearchJournal.objects.filter(id__lte=position).delete()
+    CatalogCounter.objects.update_or_create(name=PRUNED_COUNTER, defaults={'value': position})
+
+
+def get_index():
+    """Return this process's index, loading or building it on first use; see the module docstring."""
+    index = _index
+    if index is not None and time.monotonic() < _next_sync:
+        return index
+    if index is None:
+        with _lock:
+            if _index is None:
+                _refresh()
+    elif _lock.acquire(blocking=False):
+        # Another thread already syncing is left to it: this search reads the published index.
+        try:
+            if time.monotonic() >= _next_sync:
+                _refresh()
+        finally:
+            _lock.release()
+    return _index
+
+
+def _refresh():
+    """Publish the index brought up to date; called with _lock held."""
+    global _index, _next_sync
+    pruned = pruned_position()
+    index = _index
+    if index is None or index.position < pruned:
+        index = load_snapshot()
+        if index is None or index.position < pruned:
+            index = build_index()
+    index = sync(index)
+    # Sorted now, so that searches of the published index never change it.
+    index.sort()
+    _index = index
+    _next_sync = time.monotonic() + sync_interval()
+
+
+def reset_index():
+    """Forget this process's index (it is reloaded by the next get_index())."""
+    global _index, _next_sync
+    with _lock:
+        _index = None
+        _next_sync = 0.0
+
+
+def search_books(query, limit=20, prefix=False):
+    """Return up to limit (book id, score) pairs ranked by BM25."""
+    return get_index().search(query, limit=limit, prefix=prefix)
@@ -0,0 +1,205 @@
+"""Synthetic catalogs for load and scale testing (``manage.py seed_catalog``).
+
+seed() adds books with their authors, genres, copies, patrons and loans,
+with the skew of a real library rather than uniform data: book, author and
+genre popularity follow a Zipf distribution (a few bestsellers, prolific
+authors and big genres, and a long tail), books have one to three genres,
+loans go to copies of popular books and to the heaviest readers, and about a
+third of the loans are overdue.
+
+Rows are written with one multi-row INSERT per table and chunk of books, in
+one transaction per chunk: values go through the model fields' database
+preparation, but without the model instances bulk_create() would build, which
+take most of the time at a million books. No model signals are sent, so
+seed() also writes what the handlers in
+catalog/signals.py would have: each book's BookAvailability row (computed
+from the copies it generated), its search journal entry, the home page
+counters, the version stamps and the page cache tags. Generated ISBNs are
+valid ISBN-13s with the 9799 prefix, numbered on from the books seeded
+before, so seeding again grows the catalog.
+"""
+import datetime
+import random
+import uuid
+from collections import Counter
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from . import counters, isbn as isbns, pagecache, versioning
+from .models import Author, Book, BookAvailability, BookInstance, BorrowedBook, Genre, Language, SearchJournal
+
+ISBN_PREFIX = '9799'
+USERNAME_PREFIX = 'seed-reader-'
+ZIPF_EXPONENT = 1.1
+MAINTENANCE_SHARE = 0.03
+BOOKS_PER_AUTHOR = 8
+LANGUAGES = ('English', 'French', 'German', 'Spanish', 'Italian', 'Japanese', 'Portuguese', 'Dutch')
+ADJECTIVES = ('Silent', 'Crimson', 'Hidden', 'Last', 'Broken', 'Golden', 'Northern', 'Burning', 'Lost',
+              'Secret', 'Quiet', 'Endless', 'Distant', 'Iron', 'Winter', 'Wild', 'Glass', 'Hollow')
+NOUNS = ('River', 'Garden', 'Empire', 'Letter', 'House', 'Mountain', 'Machine', 'Kingdom', 'Orchard',
+         'Harbour', 'Witness', 'Archive', 'Lantern', 'Voyage', 'Promise', 'Forest', 'Mirror', 'Island')
+WORDS = ('the', 'a', 'of', 'and', 'story', 'family', 'war', 'love', 'city', 'years', 'secret', 'journey',
+         'history', 'world', 'life', 'death', 'memory', 'truth', 'power', 'night', 'sea', 'young', 'old')
+
+
+def zipf_cumulative(count, exponent=ZIPF_EXPONENT):
+    """Cumulative weights of ranks 1..count under a Zipf distribution, for random.choices()."""
+    return list(accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+class Popularity:
+    """Zipf-distributed draws over items, whose popularity ranks are shuffled."""
+
+    def __init__(self, items, rng, exponent=ZIPF_EXPONENT):
+        self.items = list(items)
+        rng.shuffle(self.items)
+        self.cumulative = zipf_cumulative(len(self.items), exponent)
+        self.rng = rng
+
+    def draw(self, k=1):
+        return self.rng.choices(self.items, cum_weights=self.cumulative, k=k)
+
+
+def isbn_for(serial):
+    digits = f'{ISBN_PREFIX}{serial:08d}'
+    return digits + isbns.isbn13_check_digit(digits)
+
+
+def copy_id(rng):
+    """A version 4 UUID drawn from rng, so that a seed reproduces the copy ids too."""
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+def named_rows(model, names):
+    """The pks of the rows of model with these names, creating the missing ones."""
+    model.objects.bulk_create((model(name=name) for name in names), ignore_conflicts=True)
+    return list(model.objects.filter(name__in=names).values_list('pk', flat=True))
+
+
+def insert(model, fields, rows):
+    """INSERT rows, tuples of the values of fields, into model's table with one executemany()."""
+    database = connections[DEFAULT_DB_ALIAS]  # Not the proxy: it is looked up for every value prepared.
+    columns = [model._meta.get_field(name) for name in fields]
+    quote = database.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(model._meta.db_table), ', '.join(quote(column.column) for column in columns),
+        ', '.join(['%s'] * len(columns)))
+    prepared = [tuple(column.get_db_prep_save(value, database) for column, value in zip(columns, row))
+                for row in rows]
+    if prepared:
+        with database.cursor() as cursor:
+            cursor.executemany(sql, prepared)
+
+
+def allocate_loans(books, copies_per_book, loans, rng):
+    """{book index: copies on loan}, books drawn by popularity, at most copies_per_book each."""
+    popularity = Popularity(range(books), rng)
+    on_loan = Counter()
+    remaining = min(loans, books * copies_per_book)
+    for _ in range(20):
+        if not remaining:
+            break
+        for book in popularity.draw(remaining):
+            if on_loan[book] < copies_per_book:
+                on_loan[book] += 1
+                remaining -= 1
+    return on_loan
+
+
+def seed(books, copies_per_book=3, users=0, loans=0, genres=40, chunk_size=2000, random_seed=0, progress=None):
+    """Add books (with copies_per_book copies each), users patrons and loans loans; returns the counts added.
+
+    Loans are spread over the new patrons, or over all existing users when
+    users is 0. progress, if given, is called with the number of books
+    written so far after each chunk.
+    """
+    today = datetime.date.today()
+    serial = Book.objects.filter(isbn__startswith=ISBN_PREFIX).count()
+    # The same seed on the same catalog gives the same rows; seeding again draws other ones (copy ids).
+    rng = random.Random(f'{random_seed}:{serial}')
+    if serial + books >= 10 ** 8:
+        raise ValueError('The seeded ISBN range is exhausted.')
+
+    genre_ids = named_rows(Genre, [f'Seed genre {n}' for n in range(1, genres + 1)])
+    language_ids = named_rows(Language, LANGUAGES)
+    start = User.objects.filter(username__startswith=USERNAME_PREFIX).count()
+    password = make_password(None)
+    new_users = User.objects.bulk_create(
+        User(username=f'{USERNAME_PREFIX}{start + n}', password=password) for n in range(users))
+    borrower_ids = [user.pk for user in new_users] or list(User.objects.values_list('pk', flat=True))
+    if loans and not borrower_ids:
+        raise ValueError('Loans need patrons: pass users or create some first.')
+    authors = Author.objects.bulk_create(
+        Author(first_name=rng.choice(ADJECTIVES), last_name=f'{rng.choice(NOUNS)}son {n}',
+               date_of_birth=datetime.date(1900, 1, 1) + datetime.timedelta(days=rng.randrange(36500)))
+        for n in range(max(books // BOOKS_PER_AUTHOR, 1)))
+
+    author_popularity = Popularity([author.pk for author in authors], rng)
+    genre_popularity = Popularity(genre_ids, rng)
+    language_popularity = Popularity(language_ids, rng, exponent=2)
+    borrower_popularity = Popularity(borrower_ids, rng) if borrower_ids else None
+    on_loan = allocate_loans(books, copies_per_book, loans, rng)
+
+    added = Counter(books=0, copies=0, loans=0, users=len(new_users), authors=len(authors))
+    for offset in range(0, books, chunk_size):
+        count = min(chunk_size, books - offset)
+        with transaction.atomic():
+            added.update(_write_chunk(offset, count, serial, copies_per_book, on_loan, rng, today,
+                                      author_popularity, genre_popularity, language_popularity, borrower_popularity))
+        if progress:
+            progress(offset + count)
+
+    counters.reconcile()
+    versioning.bump(versioning.AUTHOR, versioning.BOOK, versioning.BOOKINSTANCE, versioning.GENRE,
+                    versioning.LANGUAGE)
+    pagecache.invalidate(*(pagecache.list_tag(model) for model in (Author, Book, BookInstance, Genre, Language)),
+                         *(f'genre:{pk}' for pk in genre_ids))
+    return dict(added)
+
+
+def _write_chunk(offset, count, serial, copies_per_book, on_loan, rng, today,
+                 authors, genres, languages, borrowers):
+    authors_drawn = authors.draw(count)
+    languages_drawn = languages.draw(count)
+    first = serial + offset
+    insert(Book, ('title', 'summary', 'isbn', 'author', 'language'), (
+        (f'The {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}',
+         ' '.join(rng.choices(WORDS, k=rng.randint(20, 60))).capitalize() + '.',
+         isbn_for(first + n), authors_drawn[n], languages_drawn[n])
+        for n in range(count)))
+    # The serial numbers keep the ISBNs in insertion order: one range of the unique index.
+    book_ids = list(Book.objects.filter(isbn__gte=isbn_for(first), isbn__lte=isbn_for(first + count - 1))
+                    .order_by('isbn').values_list('pk', flat=True))
+
+    insert(Book.genre.through, ('book', 'genre'), (
+        (book_id, genre_id) for book_id in book_ids for genre_id in set(genres.draw(rng.choice((1, 1, 2, 2, 3))))))
+
+    copies, loans, counts = [], [], []
+    for n, book_id in enumerate(book_ids):
+        lent = on_loan.get(offset + n, 0)
+        statuses = Counter()
+        next_due_back = None
+        for copy in range(copies_per_book):
+            if copy < lent:
+                borrower_id = borrowers.draw()[0]
+                borrowed = today - datetime.timedelta(days=rng.randrange(31))
+                due_back = borrowed + datetime.timedelta(days=21)
+                next_due_back = min(next_due_back or due_back, due_back)
+                copies.append((copy_id(rng), book_id, 'Seed imprint', 'o', borrower_id, due_back, 0))
+                loans.append((book_id, borrower_id, borrowed))
+                statuses['o'] += 1
+            else:
+                status = 'm' if rng.random() < MAINTENANCE_SHARE else 'a'
+                copies.append((copy_id(rng), book_id, 'Seed imprint', status, None, None, 0))
+                statuses[status] += 1
+        counts.append((book_id, copies_per_book, statuses['a'], statuses['o'], 0, statuses['m'], next_due_back))
+
+    insert(BookInstance, ('id', 'book', 'imprint', 'status', 'borrower', 'due_back', 'version'), copies)
+    insert(BorrowedBook, ('book', 'borrower', 'borrowed_date'), loans)
+    insert(BookAvailability, ('book', 'total', 'available', 'on_loan', 'reserved', 'maintenance', 'next_due_back'),
+           counts)
+    insert(SearchJournal, ('book_id',), ((book_id,) for book_id in book_ids))
+    return Counter(books=len(book_ids), copies=len(copies), loans=len(loans))
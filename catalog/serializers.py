@@ -1,7 +1,260 @@
+import hashlib
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Manager, prefetch_related_objects
+from django.utils.functional import cached_property
 from rest_framework import serializers
+from rest_framework.fields import SkipField
+
+from . import reprcache
 from .models import Book
 from .models import Book, BorrowedBook, Borrower, Language, Genre, Author
-from .models import Book, BookInstance
+from .models import Book, BookAvailability, BookInstance
+
+
+def related_lookups(serializer, prefix='', prefetch_only=False, defer_cached=True):
+    """Return the (select_related, prefetch_related) lookups needed to serialize with `serializer`.
+
+    Serializers declare the relations their own fields touch with
+    ``Meta.select_related`` and ``Meta.prefetch_related``; nested serializers
+    are followed automatically, with everything below a to-many relation
+    prefetched rather than joined. With defer_cached the prefetches of a
+    CachedRepresentationMixin serializer are left out: it applies them itself,
+    to the objects missing from the cache.
+    """
+    meta = getattr(serializer, 'Meta', None)
+    fields = serializer.fields
+    # A declared lookup is only needed while the field it is named after is serialized.
+    select = [prefix + lookup for lookup in getattr(meta, 'select_related', ()) if lookup.split('__')[0] in fields]
+    prefetch = [prefix + lookup for lookup in getattr(meta, 'prefetch_related', ()) if lookup.split('__')[0] in fields]
+    for field in fields.values():
+        if field.write_only or field.source == '*':
+            continue
+        path = prefix + field.source.replace('.', '__')
+        if isinstance(field, serializers.ManyRelatedField):
+            prefetch.append(path)
+            continue
+        many = isinstance(field, serializers.ListSerializer)
+        nested = field.child if many else field
+        if not isinstance(nested, serializers.BaseSerializer):
+            continue
+        (prefetch if many or prefetch_only else select).append(path)
+        nested_select, nested_prefetch = related_lookups(
+            nested, path + '__', prefetch_only=many or prefetch_only, defer_cached=defer_cached)
+        select += nested_select
+        prefetch += nested_prefetch
+    if defer_cached and isinstance(serializer, CachedRepresentationMixin):
+        return ([] if prefetch_only else select), []
+    if prefetch_only:
+        return [], select + prefetch
+    return select, prefetch
+
+
+def only_columns(serializer, prefix=''):
+    """Return the .only() lookups for the columns `serializer` reads, or None if they cannot be told.
+
+    Covers model fields, foreign keys rendered as primary keys and nested
+    serializers of joined relations. A SerializerMethodField is taken to read
+    only the relation its name declares in Meta.select_related or
+    Meta.prefetch_related; any other source gives up.
+    """
+    meta = serializer.Meta
+    model = meta.model
+    declared = {lookup.split('__')[0]
+                for lookup in (*getattr(meta, 'select_related', ()), *getattr(meta, 'prefetch_related', ()))}
+    columns = [prefix + model._meta.pk.name]
+    for field in serializer._readable_fields:
+        if isinstance(field, serializers.SerializerMethodField):
+            if field.field_name in declared:
+                continue
+            return None
+        if len(field.source_attrs) != 1:
+            return None
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            return None
+        if model_field.many_to_many or model_field.one_to_many:
+            # Prefetched with a query of its own.
+            continue
+        if isinstance(field, serializers.BaseSerializer):
+            if model_field.concrete:
+                columns.append(prefix + field.source)
+            nested = only_columns(field, prefix + field.source + '__')
+            if nested is None:
+                return None
+            columns += nested
+        elif model_field.concrete:
+            columns.append(prefix + field.source)
+        else:
+            return None
+    return columns
+
+
+def split_paths(value):
+    """Split a comma-separated ?fields= / ?expand= value (or a list of paths) into paths."""
+    if isinstance(value, str):
+        value = value.split(',')
+    return [path.strip() for path in value or () if path.strip()]
+
+
+def collapsed_paths(expand):
+    """Return the relations expand collapses to primary keys, named with a leading minus (-book)."""
+    return {path[1:] for path in split_paths(expand) if path.startswith('-')}
+
+
+def expanded_paths(fields, expand, default=()):
+    """Return the relations expanded by fields and expand, as dotted paths with all their parents.
+
+    A relation is expanded when expand names it or a dotted field reaches into
+    it: fields=book.title expands book. The relations of default are expanded
+    too, unless expand collapses them (expand=-book).
+    """
+    collapsed = collapsed_paths(expand)
+    paths = set()
+    for path, nested in [(path, True) for path in default] + \
+            [(path, True) for path in split_paths(expand) if not path.startswith('-')] + \
+            [(path, False) for path in split_paths(fields)]:
+        parts = path.split('.')
+        if not nested:
+            parts = parts[:-1]
+        paths.update('.'.join(parts[:depth]) for depth in range(1, len(parts) + 1))
+    return {path for path in paths
+            if not any(path == collapse or path.startswith(collapse + '.') for collapse in collapsed)}
+
+
+class DynamicFieldsMixin:
+    """Serializer mixin for sparse fieldsets (?fields=) and expandable relations (?expand=).
+
+    ?fields=id,title keeps only the listed fields. ?expand=author embeds the
+    serializer Meta.expandable_fields gives for a relation, which is otherwise
+    rendered as its primary key. The relations of Meta.default_expand are
+    embedded unless collapsed with a minus: ?expand=-book renders the book as
+    its primary key. Dotted paths reach into expanded relations, e.g.
+    ?fields=status,book.title&expand=book.author. The root serializer reads
+    both parameters from the request; nested ones are given fields= and expand=.
+    EagerLoadingMixin narrows the queryset to match (related_lookups() and
+    only_columns()).
+    """
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is None and expand is None:
+            request = self.context.get('request')
+            params = getattr(request, 'query_params', None) or {}
+            fields, expand = params.get('fields', ''), params.get('expand', '')
+        self.requested_fields = split_paths(fields)
+        self.collapsed_paths = collapsed_paths(expand)
+        self.expanded_paths = expanded_paths(fields, expand, getattr(self.Meta, 'default_expand', ()))
+        self.expanded_fields = {path for path in self.expanded_paths if '.' not in path}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+        for name in sorted(self.expanded_fields):
+            if name not in expandable:
+                raise serializers.ValidationError({'expand': [f'{name} cannot be expanded.']})
+            fields[name] = expandable[name](
+                read_only=True,
+                fields=[path.split('.', 1)[1] for path in self.requested_fields if path.startswith(name + '.')],
+                expand=[path.split('.', 1)[1] for path in self.expanded_paths if path.startswith(name + '.')] +
+                       ['-' + path.split('.', 1)[1] for path in self.collapsed_paths if path.startswith(name + '.')])
+        if self.requested_fields:
+            requested = {path.split('.')[0] for path in self.requested_fields}
+            unknown = requested - set(fields)
+            if unknown:
+                raise serializers.ValidationError({'fields': [f'Unknown field: {name}' for name in sorted(unknown)]})
+            fields = {name: field for name, field in fields.items() if name in requested or field.write_only}
+        return fields
+
+
+class CachedListSerializer(serializers.ListSerializer):
+    """List serializer reading the representations of a whole page from the cache at once.
+
+    Covers a CachedRepresentationMixin child as well as the cached serializers
+    nested in the child, such as the book of each BookInstance.
+    """
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, Manager) else data)
+        batches = []
+        if isinstance(self.child, CachedRepresentationMixin):
+            batches.append((self.child, items))
+        for field in self.child._readable_fields:
+            if isinstance(field, CachedRepresentationMixin):
+                related = []
+                for item in items:
+                    try:
+                        related.append(field.get_attribute(item))
+                    except SkipField:
+                        pass
+                batches.append((field, related))
+        for serializer, instances in batches:
+            serializer.load_representations(instances)
+        try:
+            return [self.child.to_representation(item) for item in items]
+        finally:
+            for serializer, _ in batches:
+                serializer.save_representations()
+
+
+class CachedRepresentationMixin:
+    """ModelSerializer mixin keeping each object's representation in the cache (catalog/reprcache.py).
+
+    Entries are per serializer class and field set. Misses are serialized as
+    usual, after the serializer's prefetch lookups are applied to them alone;
+    set Meta.list_serializer_class to CachedListSerializer so that lists read
+    all their entries with one get_many().
+    """
+    _batch = None
+
+    @cached_property
+    def cache_variant(self):
+        fields = ','.join(field.field_name for field in self._readable_fields)
+        key = f'{type(self).__module__}.{type(self).__qualname__}:{fields}'
+        return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+    @property
+    def cache_model_name(self):
+        return self.Meta.model._meta.model_name
+
+    def caches_representations(self):
+        # Expanded relations (DynamicFieldsMixin) embed objects whose changes keep this object's token.
+        return bool(reprcache.timeout()) and not getattr(self, 'expanded_fields', None)
+
+    def load_representations(self, instances):
+        """Fetch the cached representations of instances; prefetch for the rest."""
+        instances = [instance for instance in instances if instance is not None and instance.pk is not None]
+        found, tokens = {}, {}
+        if instances and self.caches_representations():
+            found, tokens = reprcache.get_many(
+                self.cache_variant, self.cache_model_name, {instance.pk for instance in instances})
+        self._batch = {'found': found, 'tokens': tokens, 'misses': {}}
+        misses = [instance for instance in instances if instance.pk not in found]
+        select, prefetch = related_lookups(self, defer_cached=False)
+        if misses and (select or prefetch):
+            # Joined lookups the view already selected are skipped as fetched.
+            prefetch_related_objects(misses, *dict.fromkeys(select + prefetch))
+
+    def save_representations(self):
+        """Store the representations serialized since load_representations()."""
+        batch, self._batch = self._batch, None
+        if batch and batch['misses']:
+            reprcache.set_many(self.cache_variant, self.cache_model_name, batch['misses'], batch['tokens'])
+
+    def to_representation(self, instance):
+        if self._batch is None:
+            self.load_representations([instance])
+            try:
+                return self.to_representation(instance)
+            finally:
+                self.save_representations()
+        if instance.pk in self._batch['found']:
+            return self._batch['found'][instance.pk]
+        data = super().to_representation(instance)
+        if instance.pk in self._batch['tokens']:
+            self._batch['misses'][instance.pk] = data
+        return data
 
 
 class CustomUserSerializer(serializers.Serializer):
@@ -12,7 +265,7 @@ class CustomUserSerializer(serializers.Serializer):
 
 from .models import Language
 
-class LanguageSerializer(serializers.ModelSerializer):
+class LanguageSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Language
         fields = ['id', 'name']
@@ -21,7 +274,7 @@ class LanguageSerializer(serializers.ModelSerializer):
 # serializers.py
 from .models import Genre
 
-class GenreSerializer(serializers.ModelSerializer):
+class GenreSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Genre
         fields = ['id', 'name']
@@ -31,19 +284,26 @@ class GenreSerializer(serializers.ModelSerializer):
 from rest_framework import serializers
 from .models import Author
 
-class AuthorSerializer(serializers.ModelSerializer):
+class AuthorSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Author
         fields = ['id', 'first_name', 'last_name', 'date_of_birth', 'date_of_death']
 
 
 
-class BookSerializer(serializers.ModelSerializer):
+class BookAvailabilitySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BookAvailability
+        fields = ['total', 'available', 'on_loan', 'reserved', 'maintenance', 'next_due_back']
+
+
+class BookSerializer(CachedRepresentationMixin, DynamicFieldsMixin, serializers.ModelSerializer):
     author = serializers.PrimaryKeyRelatedField(queryset=Author.objects.all())
     # genre = serializers.PrimaryKeyRelatedField(queryset=Genre.objects.all())
     language = serializers.PrimaryKeyRelatedField(queryset=Language.objects.all())
 
     genre = serializers.SerializerMethodField()
+    availability = BookAvailabilitySerializer(read_only=True)
 
     class Meta:
         model = Book
@@ -52,38 +312,53 @@ class BookSerializer(serializers.ModelSerializer):
     def get_genre(self, obj):
         return [genre.name for genre in obj.genre.all()]
 
+    def bulk_get_genre(self, book_ids):
+        """get_genre() for many books with one query (compiled mode, catalog/compiled.py)."""
+        # The same join, and so the same order, as prefetching obj.genre.
+        names = {book_id: [] for book_id in book_ids}
+        for book_id, name in Genre.objects.filter(book__in=book_ids).values_list('book', 'name'):
+            names[book_id].append(name)
+        return names
+
     
     class Meta:
         model = Book
-        fields = ['id', 'title', 'author', 'summary', 'isbn', 'genre', 'language']
-
-class BookInstanceSerializer(serializers.ModelSerializer):
-    book = BookSerializer()
+        fields = ['id', 'title', 'author', 'summary', 'isbn', 'genre', 'language', 'availability']
+        # get_genre() reads obj.genre.all()
+        prefetch_related = ['genre']
+        expandable_fields = {'author': AuthorSerializer, 'language': LanguageSerializer}
+        list_serializer_class = CachedListSerializer
 
+class BookInstanceSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = BookInstance
         fields = ['id', 'book', 'imprint', 'due_back', 'borrower', 'status']
+        expandable_fields = {'book': BookSerializer}
+        default_expand = ['book']
+        list_serializer_class = CachedListSerializer
 
 
 # serializers.py
 from rest_framework import serializers
 from .models import Borrower
 
-class BorrowerSerializer(serializers.ModelSerializer):
+class BorrowerSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Borrower
         fields = '__all__'
         
-class BorrowedBookSerializer(serializers.ModelSerializer):
-    book = BookSerializer(read_only=True)
-
+class BorrowedBookSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = BorrowedBook
         fields = ['id', 'book', 'borrower', 'borrowed_date']
+        expandable_fields = {'book': BookSerializer}
+        default_expand = ['book']
+        list_serializer_class = CachedListSerializer
 
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from .models import BookInstance
+from . import circulation
 
 class BorrowBookSerializer(serializers.Serializer):
     book_id = serializers.UUIDField()
@@ -97,16 +372,22 @@ class BorrowBookSerializer(serializers.Serializer):
         
         return value
 
+    def validate_user_name(self, value):
+        # Patrons have accounts already; a request never creates one.
+        try:
+            return User.objects.get(username=value)
+        except User.DoesNotExist:
+            raise serializers.ValidationError("No patron has this user name.")
+
     def create(self, validated_data):
         book_id = validated_data['book_id']
-        user_name = validated_data['user_name']
-
-        # Check if the user already exists
-        user, created = User.objects.get_or_create(username=user_name)
+        user = validated_data['user_name']
 
-       
-        some_result = f"Book {book_id}"
-        return some_result
+        try:
+            circulation.borrow(user, copy=book_id)
+        except circulation.CirculationError as error:
+            raise serializers.ValidationError({'book_id': [str(error)]})
+        return validated_data
 
 
 
@@ -121,3 +402,28 @@ class UserSerializer(serializers.ModelSerializer):
 
 
 
+
+
+# serializers.py
+from .models import Hold
+from . import holds
+
+
+class HoldSerializer(serializers.ModelSerializer):
+    """A patron's hold, with its place in the book's queue while it is waiting."""
+    position = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Hold
+        fields = ['id', 'book', 'status', 'priority', 'placed', 'copy', 'expires', 'position']
+        read_only_fields = ['status', 'priority', 'placed', 'copy', 'expires']
+
+    def get_position(self, obj):
+        # HoldListCreateView sets it for the whole page (holds.positions()).
+        return obj.position if hasattr(obj, 'position') else holds.position(obj)
+
+    def create(self, validated_data):
+        try:
+            return holds.place(self.context['request'].user, validated_data['book'])
+        except circulation.CirculationError as error:
+            raise serializers.ValidationError({'book': [str(error)]})
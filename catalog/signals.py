@@ -0,0 +1,205 @@
+"""Signal handlers keeping denormalized catalog data in step with the models.
+
+Connected in CatalogConfig.ready().
+"""
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import availability, borrowing, counters, pagecache, reprcache, versioning
+from .models import (
+    Author, Book, BookAvailability, BookInstance, BorrowedBook, Genre, Language, SearchJournal)
+
+
+@receiver(post_save, sender=Book)
+def book_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.increment(counters.BOOKS)
+
+
+@receiver(post_delete, sender=Book)
+def book_deleted(sender, instance, **kwargs):
+    counters.increment(counters.BOOKS, -1)
+
+
+@receiver(post_save, sender=Author)
+def author_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.increment(counters.AUTHORS)
+
+
+@receiver(post_delete, sender=Author)
+def author_deleted(sender, instance, **kwargs):
+    counters.increment(counters.AUTHORS, -1)
+
+
+def loaded_values(instance):
+    """Stored values of BookInstance.TRACKED_FIELDS (empty for unsaved copies)."""
+    return getattr(instance, '_loaded_values', {})
+
+
+def deleted_with_book(origin):
+    """Whether a delete cascaded from deleting Book rows, whose availability goes with them."""
+    return isinstance(origin, Book) or getattr(origin, 'model', None) is Book
+
+
+@receiver(pre_save, sender=BookInstance)
+def bookinstance_loading_values(sender, instance, **kwargs):
+    """Look up the stored values for instances that were not loaded with them."""
+    if instance._state.adding or hasattr(instance, '_loaded_values'):
+        return
+    stored = BookInstance.objects.filter(pk=instance.pk).values(*BookInstance.TRACKED_FIELDS).first()
+    if stored is not None:
+        instance._loaded_values = stored
+
+
+@receiver(post_save, sender=BookInstance)
+def bookinstance_saved(sender, instance, created, **kwargs):
+    old_status = None if created else loaded_values(instance).get('status')
+    if created:
+        counters.increment(counters.INSTANCES)
+    if old_status != instance.status:
+        if old_status == 'a':
+            counters.increment(counters.INSTANCES_AVAILABLE, -1)
+        elif instance.status == 'a':
+            counters.increment(counters.INSTANCES_AVAILABLE)
+
+
+@receiver(post_delete, sender=BookInstance)
+def bookinstance_deleted(sender, instance, **kwargs):
+    counters.increment(counters.INSTANCES, -1)
+    if loaded_values(instance).get('status', instance.status) == 'a':
+        counters.increment(counters.INSTANCES_AVAILABLE, -1)
+
+
+@receiver(post_save, sender=Book)
+def book_availability_created(sender, instance, created, **kwargs):
+    if created:
+        BookAvailability.objects.get_or_create(book=instance)
+
+
+@receiver(post_save, sender=BookInstance)
+def bookinstance_availability_saved(sender, instance, created, **kwargs):
+    stored = {} if created else loaded_values(instance)
+    if created or any(stored.get(field) != getattr(instance, field) for field in BookInstance.TRACKED_FIELDS):
+        availability.refresh({instance.book_id, stored.get('book_id', instance.book_id)})
+
+
+@receiver(post_delete, sender=BookInstance)
+def bookinstance_availability_deleted(sender, instance, origin=None, **kwargs):
+    if not deleted_with_book(origin):
+        availability.refresh([loaded_values(instance).get('book_id', instance.book_id)])
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def book_search_journal(sender, instance, **kwargs):
+    SearchJournal.objects.create(book_id=instance.pk)
+
+
+@receiver(post_save, sender=Author)
+def author_search_journal(sender, instance, created, **kwargs):
+    # The author's names are indexed with each of their books.
+    if not created:
+        SearchJournal.objects.bulk_create(
+            SearchJournal(book_id=book_id) for book_id in instance.book_set.values_list('pk', flat=True))
+
+
+@receiver(pre_save, sender=BorrowedBook)
+def borrowedbook_previous_borrower(sender, instance, **kwargs):
+    # A loan handed to another user changes both users' borrowed books.
+    if borrowing.cache_timeout() and not instance._state.adding:
+        previous = BorrowedBook.objects.filter(pk=instance.pk).values_list('borrower_id', flat=True).first()
+        if previous is not None and previous != instance.borrower_id:
+            borrowing.invalidate(previous)
+
+
+@receiver(post_save, sender=BorrowedBook)
+@receiver(post_delete, sender=BorrowedBook)
+def borrowedbook_changed(sender, instance, **kwargs):
+    borrowing.invalidate(instance.borrower_id)
+
+
+VERSIONED_MODELS = {
+    Author: versioning.AUTHOR,
+    Book: versioning.BOOK,
+    BookInstance: versioning.BOOKINSTANCE,
+    Genre: versioning.GENRE,
+    Language: versioning.LANGUAGE,
+}
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def bump_version(sender, **kwargs):
+    if sender in VERSIONED_MODELS:
+        versioning.bump(VERSIONED_MODELS[sender])
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def book_genres_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        versioning.bump(versioning.BOOK)
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=Genre)
+@receiver(post_save, sender=Language)
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=Genre)
+@receiver(post_delete, sender=Language)
+def invalidate_pages(sender, instance, created=True, **kwargs):
+    # created is only passed by post_save; a deleted object also leaves its lists.
+    tags = {f'{sender._meta.model_name}:{instance.pk}'}
+    if created:
+        tags.add(pagecache.list_tag(sender))
+    if sender is Book and instance.author_id:
+        # The author's page lists the book.
+        tags.add(f'author:{instance.author_id}')
+    if sender is Genre:
+        # Compiled book lists (CompiledListMixin) show genre names without their tags.
+        tags.add(pagecache.list_tag(Book))
+    pagecache.invalidate(*tags)
+
+
+@receiver(post_save, sender=BookInstance)
+@receiver(post_delete, sender=BookInstance)
+def bookinstance_invalidate_pages(sender, instance, **kwargs):
+    book_ids = {instance.book_id, loaded_values(instance).get('book_id', instance.book_id)}
+    pagecache.invalidate(*(f'book:{book_id}' for book_id in book_ids))
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def book_genres_invalidate_pages(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    owner, other = ('genre', 'book') if reverse else ('book', 'genre')
+    pagecache.invalidate(f'{owner}:{instance.pk}', *(f'{other}:{pk}' for pk in pk_set or ()))
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def book_invalidate_representation(sender, instance, **kwargs):
+    reprcache.invalidate('book', [instance.pk])
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def book_genres_invalidate_representations(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            reprcache.invalidate('book', [instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        reprcache.invalidate('book', pk_set)
+    elif action == 'pre_clear' and reprcache.timeout():
+        # post_clear no longer knows which books were in the genre.
+        reprcache.invalidate('book', sender.objects.filter(genre_id=instance.pk).values_list('book_id', flat=True))
+
+
+@receiver(post_save, sender=Genre)
+@receiver(pre_delete, sender=Genre)
+def genre_invalidate_representations(sender, instance, created=False, **kwargs):
+    # Books list their genres by name; a new genre has no books yet.
+    if not created and reprcache.timeout():
+        reprcache.invalidate('book', Book.genre.through.objects.filter(genre_id=instance.pk)
+                             .values_list('book_id', flat=True))
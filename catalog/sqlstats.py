@@ -0,0 +1,154 @@
+"""Per-request SQL instrumentation.
+
+SQLStatsMiddleware instruments the share CATALOG_SQL_SAMPLE_RATE of requests
+(0, the default, instruments none and costs one settings lookup per request).
+An instrumented request runs with a Recorder installed as an execute wrapper on
+every database connection, which counts the statements, times them and groups
+them by fingerprint: the SQL with its literals and IN lists collapsed, so the
+same query for another row or another page of rows counts as a repeat.
+
+A SELECT repeated CATALOG_SQL_N_PLUS_ONE_THRESHOLD times in one request is
+flagged as a likely N+1 query, typically a related manager used per row
+(Book.display_genre(), BookSerializer.get_genre() without a prefetch). Each
+instrumented request gets:
+
+- a Server-Timing header: ``sql;dur=<ms>;desc="<n> queries, <n> repeated"``;
+- one log line on the 'catalog.sql' logger, a WARNING when N+1 queries were
+  flagged, with the figures as JSON and in the record's ``sql_stats``;
+- its figures added to the totals of its URL name, a SQLStat row updated
+  in place with F() expressions so that all worker processes add to the same
+  figures; report() returns them and ``manage.py sql_report`` prints them.
+
+Queries run while a streaming response body is sent, after the view has
+returned, are not counted.
+"""
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import F
+
+from .models import SQLStat
+
+logger = logging.getLogger('catalog.sql')
+
+FIELDS = ('requests', 'queries', 'repeated', 'time_us', 'n_plus_one')
+UNRESOLVED = '<unresolved>'
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r'\bIN \((?:\?, )*\?\)')
+
+
+def threshold():
+    return getattr(settings, 'CATALOG_SQL_N_PLUS_ONE_THRESHOLD', 5)
+
+
+def fingerprint(sql):
+    """sql with its literals, placeholders and IN lists collapsed to '?'."""
+    sql = _LITERALS.sub('?', sql.replace('%s', '?'))
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+class Recorder:
+    """Execute wrapper counting, timing and fingerprinting the statements run through it."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.statements[fingerprint(sql)] += 1
+
+    @property
+    def repeated(self):
+        """Statements run beyond the first of their fingerprint."""
+        return sum(count - 1 for count in self.statements.values())
+
+    def n_plus_one(self):
+        """[(fingerprint, count)] of the SELECTs repeated at least threshold() times, most repeated first."""
+        return sorted(((sql, count) for sql, count in self.statements.items()
+                       if count >= threshold() and sql.lstrip().upper().startswith('SELECT')),
+                      key=lambda item: -item[1])
+
+
+def instrument(request, get_response):
+    """Run get_response(request) with a Recorder on every connection and record its figures."""
+    recorder = Recorder()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        response = get_response(request)
+    match = getattr(request, 'resolver_match', None)
+    url_name = (match.view_name if match else None) or UNRESOLVED
+    suspects = recorder.n_plus_one()
+    stats = {
+        'url_name': url_name,
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        'queries': recorder.count,
+        'sql_ms': round(recorder.duration * 1000, 2),
+        'repeated': recorder.repeated,
+        'n_plus_one': [{'sql': sql[:300], 'count': count} for sql, count in suspects],
+    }
+    timing = f'sql;dur={stats["sql_ms"]};desc="{recorder.count} queries, {recorder.repeated} repeated"'
+    existing = response.headers.get('Server-Timing')
+    response.headers['Server-Timing'] = f'{existing}, {timing}' if existing else timing
+    logger.log(logging.WARNING if suspects else logging.INFO, 'sql %s', json.dumps(stats),
+               extra={'sql_stats': stats})
+    aggregate(url_name, recorder, suspects)
+    return response
+
+
+def aggregate(url_name, recorder, suspects=()):
+    """Add a request's figures to the totals of url_name, in one UPDATE so concurrent workers add up."""
+    values = {
+        'requests': 1,
+        'queries': recorder.count,
+        'repeated': recorder.repeated,
+        'time_us': int(recorder.duration * 1_000_000),
+        'n_plus_one': 1 if suspects else 0,
+    }
+    changes = {field: F(field) + value for field, value in values.items()}
+    if not SQLStat.objects.filter(url_name=url_name).update(**changes):
+        # The first request to url_name; a concurrent first one may create the row too.
+        SQLStat.objects.bulk_create([SQLStat(url_name=url_name)], ignore_conflicts=True)
+        SQLStat.objects.filter(url_name=url_name).update(**changes)
+    if suspects:
+        sql, count = suspects[0]
+        SQLStat.objects.filter(url_name=url_name, worst_count__lt=count).update(worst_count=count, worst_sql=sql)
+
+
+def report():
+    """Per URL name totals, slowest in total SQL time first.
+
+    Each entry has url_name, the FIELDS totals, per-request averages
+    (avg_queries, avg_sql_ms) and the most repeated N+1 statement seen, as
+    (count, sql), if any.
+    """
+    entries = []
+    for row in SQLStat.objects.filter(requests__gt=0).order_by('-time_us', 'url_name').values():
+        entry = {'url_name': row['url_name']}
+        entry.update({field: row[field] for field in FIELDS})
+        entry['avg_queries'] = entry['queries'] / entry['requests']
+        entry['avg_sql_ms'] = entry['time_us'] / entry['requests'] / 1000
+        entry['worst'] = (row['worst_count'], row['worst_sql']) if row['worst_count'] else None
+        entries.append(entry)
+    return entries
+
+
+def reset():
+    """Forget the aggregated figures."""
+    SQLStat.objects.all().delete()
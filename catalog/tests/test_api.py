@@ -0,0 +1,193 @@
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.models import Genre
+from catalog.pagination import CatalogCursorPagination
+
+
+class CursorPaginationTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Genre.objects.bulk_create([Genre(name=f'Genre {i:02}') for i in range(45)])
+
+    def test_first_page_uses_default_page_size(self):
+        response = self.client.get(reverse('genre-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertIsNone(response.data['previous'])
+        self.assertIsNotNone(response.data['next'])
+
+    def test_following_cursors_visits_every_row_once(self):
+        seen = []
+        url = reverse('genre-list')
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(seen, sorted(Genre.objects.values_list('id', flat=True)))
+
+    def test_page_size_query_param(self):
+        response = self.client.get(reverse('genre-list') + '?page_size=5')
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_page_size_is_capped(self):
+        with mock.patch.object(CatalogCursorPagination, 'max_page_size', 10):
+            response = self.client.get(reverse('genre-list') + '?page_size=1000')
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('genre-list') + '?cursor=bogus')
+        self.assertEqual(response.status_code, 404)
+
+    def test_deep_page_does_not_count_table(self):
+        response = self.client.get(reverse('genre-list'))
+        response = self.client.get(response.data['next'])
+        # The version stamps for the ETag, then the page.
+        with self.assertNumQueries(2):
+            response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 5)
+
+
+from django.contrib.auth import get_user_model
+
+from catalog.models import Author, Book, Borrower, Language
+from catalog.serializers import (
+    BookInstanceSerializer, BookSerializer, BorrowedBookSerializer, related_lookups)
+
+
+class ListQueryCountTest(TestCase):
+    """Each list endpoint runs the same number of queries however many rows it returns."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        genres = [Genre.objects.create(name=f'Genre {i}') for i in range(15)][:3]
+        language = Language.objects.create(name='English')
+        for i in range(15):
+            author = Author.objects.create(first_name=f'First {i}', last_name=f'Last {i}')
+            book = Book.objects.create(title=f'Title {i}', summary='Summary', isbn=f'ISBN{i:03}',
+                                       author=author, language=language)
+            book.genre.set(genres)
+            Borrower.objects.create(name=f'Borrower {i}')
+
+    def assertListQueries(self, url_name, num):
+        for page_size in (1, 15):
+            with self.assertNumQueries(num):
+                response = self.client.get(reverse(url_name) + f'?page_size={page_size}')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), page_size)
+
+    def test_book_list(self):
+        # Version stamps, books, then all of the page's genres in one prefetch.
+        self.assertListQueries('book-list', 3)
+
+    def test_book_list_genres(self):
+        response = self.client.get(reverse('book-list'))
+        self.assertEqual(response.data['results'][0]['genre'], ['Genre 0', 'Genre 1', 'Genre 2'])
+
+    def test_genre_list(self):
+        self.assertListQueries('genre-list', 2)
+
+    def test_borrower_list(self):
+        self.assertListQueries('borrower-list', 1)
+
+    def test_author_list(self):
+        self.client.force_login(self.user)
+        # Session and user lookups, version stamps, then the authors.
+        self.assertListQueries('author-view', 4)
+
+    def test_book_detail(self):
+        book = Book.objects.first()
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('book-view', args=[book.pk]))
+        self.assertEqual(response.data['id'], book.pk)
+
+
+class RelatedLookupsTest(TestCase):
+
+    def test_declared_lookups(self):
+        self.assertEqual(related_lookups(BookSerializer(), defer_cached=False), (['availability'], ['genre']))
+
+    def test_nested_serializer_lookups(self):
+        expected = (['book', 'book__availability'], ['book__genre'])
+        self.assertEqual(related_lookups(BookInstanceSerializer(), defer_cached=False), expected)
+        self.assertEqual(related_lookups(BorrowedBookSerializer(), defer_cached=False), expected)
+        # Collapsed, the book is only its primary key.
+        self.assertEqual(related_lookups(BookInstanceSerializer(expand=['-book'])), ([], []))
+
+    def test_cached_serializers_prefetch_their_misses(self):
+        self.assertEqual(related_lookups(BookSerializer()), (['availability'], []))
+        self.assertEqual(related_lookups(BookInstanceSerializer(expand=['book'])), (['book', 'book__availability'], []))
+
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from catalog import borrowing
+from catalog.models import BorrowedBook
+
+
+class AvailableBooksTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        cls.other = get_user_model().objects.create_user(username='other', password='1X<ISRUkw+tuK')
+        author = Author.objects.create(first_name='First', last_name='Last')
+        language = Language.objects.create(name='English')
+        cls.books = [Book.objects.create(title=f'Title {i}', summary='Summary', isbn=f'ISBN{i:03}',
+                                         author=author, language=language) for i in range(5)]
+        BorrowedBook.objects.create(book=cls.books[1], borrower=cls.user)
+        BorrowedBook.objects.create(book=cls.books[3], borrower=cls.user)
+        BorrowedBook.objects.create(book=cls.books[0], borrower=cls.other)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def available_ids(self, **params):
+        response = self.client.get(reverse('book-available'), params)
+        self.assertEqual(response.status_code, 200)
+        return [book['id'] for book in response.data['results']]
+
+    def test_excludes_own_loans_with_anti_join(self):
+        self.assertEqual(self.available_ids(), [self.books[i].pk for i in (0, 2, 4)])
+        with CaptureQueriesContext(connection) as queries:
+            self.available_ids()
+        sql = ' '.join(query['sql'] for query in queries)
+        self.assertIn('NOT EXISTS', sql)
+        self.assertNotIn(' IN (SELECT', sql)
+
+    def test_cursor_paginated(self):
+        response = self.client.get(reverse('book-available'), {'page_size': 2})
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_requires_login(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('book-available')).status_code, 403)
+
+    @override_settings(CATALOG_BORROWED_CACHE_TIMEOUT=60)
+    def test_cached_ids_invalidated_on_change(self):
+        self.assertEqual(self.available_ids(), [self.books[i].pk for i in (0, 2, 4)])
+        with self.assertNumQueries(0):
+            self.assertEqual(borrowing.borrowed_book_ids(self.user.pk), [self.books[1].pk, self.books[3].pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            loan = BorrowedBook.objects.create(book=self.books[4], borrower=self.user)
+        self.assertEqual(self.available_ids(), [self.books[i].pk for i in (0, 2)])
+        with self.captureOnCommitCallbacks(execute=True):
+            loan.borrower = self.other
+            loan.save()
+        self.assertEqual(self.available_ids(), [self.books[i].pk for i in (0, 2, 4)])
+
+    @override_settings(CATALOG_BORROWED_CACHE_TIMEOUT=60)
+    def test_heavy_borrowers_use_anti_join(self):
+        with mock.patch.object(borrowing, 'MAX_CACHED_IDS', 1):
+            self.assertIsNone(borrowing.borrowed_book_ids(self.user.pk))
+            self.assertEqual(self.available_ids(), [self.books[i].pk for i in (0, 2, 4)])
@@ -0,0 +1,105 @@
+import datetime
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog import availability
+from catalog.models import Author, Book, BookAvailability, BookInstance, Language
+
+
+class BookAvailabilityTest(TestCase):
+
+    def setUp(self):
+        self.author = Author.objects.create(first_name='John', last_name='Smith')
+        self.language = Language.objects.create(name='English')
+        self.book = Book.objects.create(title='Book Title', summary='My book summary', isbn='ABCDEFG',
+                                        author=self.author, language=self.language)
+        self.today = datetime.date.today()
+
+    def add_copy(self, status, due_back=None, book=None):
+        return BookInstance.objects.create(book=book or self.book, imprint='Imprint', status=status,
+                                           due_back=due_back)
+
+    def row(self, book=None):
+        return BookAvailability.objects.get(book=book or self.book)
+
+    def assertRow(self, book=None, **expected):
+        row = self.row(book)
+        self.assertEqual({field: getattr(row, field) for field in expected}, expected)
+
+    def test_new_book_has_empty_row(self):
+        self.assertRow(total=0, available=0, on_loan=0, next_due_back=None)
+
+    def test_counts_by_status(self):
+        self.add_copy('a')
+        self.add_copy('a')
+        self.add_copy('o', self.today + datetime.timedelta(days=9))
+        self.add_copy('o', self.today + datetime.timedelta(days=3))
+        self.add_copy('r')
+        self.add_copy('m')
+        self.assertRow(total=6, available=2, on_loan=2, reserved=1, maintenance=1,
+                       next_due_back=self.today + datetime.timedelta(days=3))
+
+    def test_status_and_due_date_changes(self):
+        copy = self.add_copy('a')
+        copy = BookInstance.objects.get(pk=copy.pk)
+        copy.status = 'o'
+        copy.due_back = self.today
+        copy.save()
+        self.assertRow(available=0, on_loan=1, next_due_back=self.today)
+        copy.due_back = self.today + datetime.timedelta(weeks=1)
+        copy.save()
+        self.assertRow(next_due_back=self.today + datetime.timedelta(weeks=1))
+
+    def test_copy_moved_to_another_book(self):
+        other = Book.objects.create(title='Other', summary='Summary', isbn='HIJKLMN',
+                                    author=self.author, language=self.language)
+        copy = self.add_copy('a')
+        copy = BookInstance.objects.get(pk=copy.pk)
+        copy.book = other
+        copy.save()
+        self.assertRow(total=0, available=0)
+        self.assertRow(other, total=1, available=1)
+
+    def test_deletes(self):
+        copy = self.add_copy('a')
+        self.add_copy('a')
+        copy.delete()
+        self.assertRow(total=1, available=1)
+        self.book.delete()
+        self.assertFalse(BookAvailability.objects.exists())
+        connection.check_constraints()
+
+    def test_rebuild_repairs_bulk_changes(self):
+        self.add_copy('a')
+        BookInstance.objects.update(status='m')
+        BookAvailability.objects.all().delete()
+        self.assertEqual(availability.rebuild_all(), 1)
+        self.assertRow(total=1, available=0, maintenance=1)
+
+    def test_refresh_recounts_books_in_one_update(self):
+        books = Book.objects.bulk_create(
+            Book(title=f'Book {n}', summary='Summary', isbn=f'BULK{n:03}', author=self.author) for n in range(30))
+        BookAvailability.objects.bulk_create(BookAvailability(book=book) for book in books[1:])
+        BookInstance.objects.bulk_create(
+            BookInstance(book=book, imprint='Imprint', status=status, due_back=self.today if status == 'o' else None)
+            for book in books[:20] for status in ('a', 'o'))
+        with CaptureQueriesContext(connection) as queries:
+            availability.refresh(book.pk for book in books)
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertNotIn('CASE', updates[0])
+        self.assertRow(books[0], total=2, available=1, on_loan=1, next_due_back=self.today)
+        self.assertRow(books[1], total=2, available=1, on_loan=1, next_due_back=self.today)
+        self.assertRow(books[25], total=0, available=0, on_loan=0, next_due_back=None)
+
+    def test_api_and_detail_page_read_the_row(self):
+        self.add_copy('a')
+        self.add_copy('o', self.today)
+        response = self.client.get(reverse('book-view', args=[self.book.pk]))
+        self.assertEqual(response.data['availability']['available'], 1)
+        self.assertEqual(response.data['availability']['next_due_back'], self.today.isoformat())
+        response = self.client.get(reverse('book-detail', args=[self.book.pk]))
+        self.assertContains(response, '<strong>Available:</strong> 1 of 2')
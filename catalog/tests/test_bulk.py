@@ -0,0 +1,116 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog import counters
+from catalog.bulk import BookLoader
+from catalog.models import Author, Book, BookAvailability, BookInstance, Genre, Language, SearchJournal
+
+
+class BulkCreateTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='librarian', password='1X<ISRUkw+tuK')
+        cls.user.user_permissions.add(*Permission.objects.filter(
+            codename__in=['add_book', 'add_author', 'add_bookinstance']))
+        cls.author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.language = Language.objects.create(name='English')
+        cls.genre = Genre.objects.create(name='Fantasy')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def book_row(self, i, **overrides):
+        row = {'title': f'Title {i}', 'summary': 'Summary', 'isbn': f'ISBN{i:04}',
+               'author': self.author.pk, 'language': self.language.pk, 'genre': [self.genre.pk]}
+        row.update(overrides)
+        return row
+
+    def post(self, url_name, rows, query=''):
+        return self.client.post(reverse(url_name) + query, json.dumps(rows), content_type='application/json')
+
+    def test_books_created_with_genres_and_denormalized_rows(self):
+        response = self.post('book-bulk', [self.book_row(i) for i in range(5)], '?chunk_size=2')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['created']), 5)
+        self.assertEqual(response.data['errors'], [])
+        book = Book.objects.get(pk=response.data['created'][0])
+        self.assertEqual(list(book.genre.all()), [self.genre])
+        self.assertEqual(BookAvailability.objects.count(), 5)
+        self.assertEqual(SearchJournal.objects.filter(book_id__in=response.data['created']).count(), 5)
+        self.assertEqual(counters.get_counts()[counters.BOOKS], 5)
+
+    def test_invalid_rows_reported_without_aborting(self):
+        Book.objects.create(title='Existing', summary='Summary', isbn='ISBN0001',
+                            author=self.author, language=self.language)
+        rows = [
+            self.book_row(0),
+            self.book_row(1),  # ISBN already taken
+            self.book_row(2, author=9999),
+            self.book_row(3, genre=[self.genre.pk, 8888]),
+            self.book_row(4, title=''),
+            self.book_row(5, isbn='ISBN0000'),  # duplicate of row 0
+            self.book_row(6),
+        ]
+        response = self.post('book-bulk', rows, '?chunk_size=3')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2, 3, 4, 5])
+        self.assertIn('author', response.data['errors'][1]['errors'])
+        self.assertIn('8888', response.data['errors'][2]['errors']['genre'][0])
+        self.assertEqual(Book.objects.filter(pk__in=response.data['created']).count(), 2)
+
+    def test_chunk_size_must_be_positive(self):
+        for query in ('?chunk_size=-1', '?chunk_size=0', '?chunk_size=many'):
+            response = self.post('book-bulk', [self.book_row(0)], query)
+            self.assertEqual(response.status_code, 400, query)
+        self.assertFalse(Book.objects.exists())
+        self.assertEqual(len(BookLoader(chunk_size=-1).load([self.book_row(i) for i in range(2)]).created), 2)
+
+    def test_related_ids_checked_per_chunk(self):
+        # Rows are validated without per-row queries: a chunk of 50 costs what a chunk of 5 does.
+        with self.assertNumQueries(12):
+            BookLoader(chunk_size=50).load([self.book_row(i) for i in range(5)])
+        with self.assertNumQueries(12):
+            BookLoader(chunk_size=50).load([self.book_row(i) for i in range(5, 55)])
+
+    def test_ndjson_book_instances(self):
+        book = Book.objects.create(title='Title', summary='Summary', isbn='ISBN9999',
+                                   author=self.author, language=self.language)
+        lines = [
+            json.dumps({'book': book.pk, 'imprint': 'First', 'status': 'a'}),
+            '',
+            '{"book": ',
+            json.dumps({'book': book.pk, 'imprint': 'Second', 'status': 'o', 'due_back': '2030-01-01'}),
+            json.dumps({'book': book.pk, 'imprint': 'Third', 'status': 'x'}),
+        ]
+        response = self.client.post(reverse('bookinstance-bulk'), '\n'.join(lines),
+                                     content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(len(response.data['created']), 2)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 3])
+        self.assertIn('Line 3', response.data['errors'][0]['errors']['non_field_errors'][0])
+        self.assertEqual(BookInstance.objects.count(), 2)
+        row = BookAvailability.objects.get(book=book)
+        self.assertEqual((row.total, row.available, row.on_loan), (2, 1, 1))
+        counts = counters.get_counts()
+        self.assertEqual((counts[counters.INSTANCES], counts[counters.INSTANCES_AVAILABLE]), (2, 1))
+
+    def test_authors(self):
+        rows = [{'first_name': 'Ann', 'last_name': 'Leckie'}, {'first_name': 'No last name'}]
+        response = self.post('author-bulk', rows)
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data['errors'][0]['index'], 1)
+        self.assertEqual(counters.get_counts()[counters.AUTHORS], 2)
+
+    def test_requires_add_permission(self):
+        self.client.force_login(get_user_model().objects.create_user(username='reader'))
+        response = self.post('book-bulk', [self.book_row(0)])
+        self.assertEqual(response.status_code, 403)
+
+    def test_rejects_object_body(self):
+        response = self.post('book-bulk', self.book_row(0))
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,151 @@
+import datetime
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog import circulation, counters
+from catalog.models import Author, Book, BookAvailability, BookInstance, BorrowedBook, StaleCopy
+
+
+class CirculationTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.user = User.objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        cls.other = User.objects.create_user(username='other', password='1X<ISRUkw+tuK')
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG', author=author)
+        cls.copies = [BookInstance.objects.create(book=cls.book, imprint=f'Imprint {n}', status='a')
+                      for n in range(2)]
+
+    def test_borrow_and_return(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            copy_id = circulation.borrow(self.user, book=self.book)
+        copy = BookInstance.objects.get(pk=copy_id)
+        self.assertEqual((copy.status, copy.borrower), ('o', self.user))
+        self.assertEqual(copy.due_back, datetime.date.today() + datetime.timedelta(days=21))
+        self.assertEqual(BookAvailability.objects.get(book=self.book).available, 1)
+        self.assertEqual(counters.get_counts()[counters.INSTANCES_AVAILABLE], 1)
+        loan = BorrowedBook.objects.get(borrower=self.user)
+        self.assertEqual((loan.book, loan.returned_date), (self.book, None))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            circulation.return_copy(copy_id)
+        copy.refresh_from_db()
+        self.assertEqual((copy.status, copy.borrower, copy.due_back), ('a', None, None))
+        loan.refresh_from_db()
+        self.assertEqual(loan.returned_date, datetime.date.today())
+        self.assertEqual(BookAvailability.objects.get(book=self.book).available, 2)
+        self.assertEqual(counters.get_counts()[counters.INSTANCES_AVAILABLE], 2)
+        with self.assertRaises(circulation.CirculationError):
+            circulation.return_copy(copy_id)
+
+    def test_no_copy_left(self):
+        circulation.borrow(self.user, book=self.book)
+        circulation.borrow(self.other, book=self.book)
+        with self.assertRaises(circulation.NoCopyAvailable):
+            circulation.borrow(self.user, book=self.book)
+        with self.assertRaises(circulation.NoCopyAvailable):
+            circulation.borrow(self.user, copy=self.copies[0])
+
+    def test_reservations(self):
+        reserved = circulation.reserve(self.user, self.book)
+        self.assertEqual(BookAvailability.objects.get(book=self.book).reserved, 1)
+        # The other patron only gets the free copy; the reserving patron gets theirs.
+        self.assertNotEqual(circulation.borrow(self.other, book=self.book), reserved)
+        self.assertEqual(circulation.borrow(self.user, book=self.book), reserved)
+
+    def test_renew(self):
+        copy_id = circulation.borrow(self.user, copy=self.copies[0].pk)
+        due_back = datetime.date.today() + datetime.timedelta(weeks=4)
+        circulation.renew(copy_id, due_back)
+        self.assertEqual(BookInstance.objects.get(pk=copy_id).due_back, due_back)
+        with self.assertRaises(circulation.CirculationError):
+            circulation.renew(copy_id, datetime.date.today() - datetime.timedelta(days=1))
+        with self.assertRaises(circulation.CirculationError):
+            circulation.renew(self.copies[1])
+
+    def test_lost_race_moves_to_next_copy(self):
+        update = circulation._update
+        taken = []
+
+        def racing_update(queryset, row, changes):
+            # Another patron borrows the copy between its read and this update.
+            if not taken:
+                taken.append(row['pk'])
+                BookInstance.objects.filter(pk=row['pk']).update(status='o', version=F('version') + 1)
+            return update(queryset, row, changes)
+
+        with mock.patch.object(circulation, '_update', racing_update):
+            copy_id = circulation.borrow(self.user, book=self.book)
+        self.assertNotEqual(copy_id, taken[0])
+        self.assertEqual(BookInstance.objects.get(pk=copy_id).borrower, self.user)
+        self.assertEqual(BorrowedBook.objects.filter(borrower=self.user).count(), 1)
+
+    def test_save_bumps_version(self):
+        copy = self.copies[0]
+        copy.imprint = 'New imprint'
+        copy.save(update_fields=['imprint'])
+        self.assertEqual(BookInstance.objects.get(pk=copy.pk).version, 1)
+
+    def test_stale_save_does_not_undo_a_loan(self):
+        copy = BookInstance.objects.get(pk=self.copies[0].pk)
+        circulation.borrow(self.user, copy=copy.pk)
+        copy.status = 'm'
+        with self.assertRaises(StaleCopy), transaction.atomic():
+            copy.save()
+        self.assertEqual(BookInstance.objects.get(pk=copy.pk).status, 'o')
+        self.assertEqual(BookAvailability.objects.get(book=self.book).on_loan, 1)
+        # Fields circulation does not change are saved regardless.
+        copy.imprint = 'Corrected imprint'
+        copy.save(update_fields=['imprint'])
+        copy.refresh_from_db()
+        self.assertEqual((copy.imprint, copy.status, copy.version), ('Corrected imprint', 'o', 2))
+        copy.status = 'm'
+        copy.save()
+        self.assertEqual(BookInstance.objects.get(pk=copy.pk).status, 'm')
+
+    def test_borrow_views(self):
+        self.client.force_login(self.user)
+        copy = self.copies[0]
+        due_back = datetime.date.today() + datetime.timedelta(days=7)
+        response = self.client.post(reverse('borrow-book', args=[copy.pk]), {'return_date': due_back})
+        self.assertRedirects(response, reverse('my-borrowed'))
+        copy.refresh_from_db()
+        self.assertEqual((copy.status, copy.due_back), ('o', due_back))
+        response = self.client.post(reverse('borrow-book', args=[copy.pk]), {'return_date': due_back})
+        self.assertContains(response, 'This copy is not available.')
+
+    def test_borrow_due_back_in_range(self):
+        self.client.force_login(self.user)
+        copy = self.copies[0]
+        for days in (-1, 22):
+            response = self.client.post(reverse('borrow-book', args=[copy.pk]),
+                                        {'return_date': datetime.date.today() + datetime.timedelta(days=days)})
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.context['form'].has_error('return_date'))
+        self.assertEqual(BookInstance.objects.get(pk=copy.pk).status, 'a')
+        with self.assertRaises(circulation.CirculationError):
+            circulation.borrow(self.user, copy=copy, due_back=datetime.date.today() - datetime.timedelta(days=1))
+
+    def test_borrow_api_is_for_staff(self):
+        data = {'book_id': self.copies[1].pk, 'user_name': 'reader'}
+        self.assertEqual(self.client.post(reverse('borrow-books'), data).status_code, 403)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.post(reverse('borrow-books'), data).status_code, 403)
+        self.assertEqual(BookInstance.objects.get(pk=self.copies[1].pk).status, 'a')
+
+        self.client.force_login(get_user_model().objects.create_user(username='librarian', is_staff=True))
+        response = self.client.post(reverse('borrow-books'), {'book_id': self.copies[1].pk, 'user_name': 'mallory'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(get_user_model().objects.filter(username='mallory').exists())
+        response = self.client.post(reverse('borrow-books'), data)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(BookInstance.objects.get(pk=self.copies[1].pk).borrower, self.user)
+        response = self.client.post(reverse('borrow-books'), data)
+        self.assertEqual(response.status_code, 400)
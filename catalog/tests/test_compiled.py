@@ -0,0 +1,74 @@
+import datetime
+import io
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog import compiled
+from catalog.models import Author, Book, BookAvailability, BookInstance, Genre, Language
+from catalog.serializers import BookInstanceSerializer, CustomUserSerializer
+
+
+@override_settings(CATALOG_PAGE_CACHE_TIMEOUT=0, CATALOG_REPRESENTATION_CACHE_TIMEOUT=0,
+                   CATALOG_COMPILED_SERIALIZERS=True)
+class CompiledSerializerTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        english = Language.objects.create(name='English')
+        fantasy, poetry = Genre.objects.create(name='Fantasy'), Genre.objects.create(name='Poetry')
+        Genre.objects.create(name='Unused')
+        tolkien = Author.objects.create(first_name='J. R. R.', last_name='Tolkien', date_of_birth=datetime.date(1892, 1, 3),
+                                        date_of_death=datetime.date(1973, 9, 2))
+        anonymous = Author.objects.create(first_name='Anon', last_name='Ymous')
+        hobbit = Book.objects.create(title='The Hobbit', summary='There and back again. ' * 40, isbn='9780547928227',
+                                     author=tolkien, language=english)
+        hobbit.genre.add(poetry, fantasy)
+        Book.objects.create(title='Untitled “draft”', summary='', isbn='0000000000000', author=anonymous)
+        orphan = Book.objects.create(title='No availability', summary='x', isbn='1111111111111', author=tolkien)
+        BookAvailability.objects.filter(book=orphan).delete()
+        BookInstance.objects.create(book=hobbit, imprint='Allen & Unwin', status='o', due_back=datetime.date(2030, 1, 1))
+
+    def assertSameOutput(self, url, **params):
+        with override_settings(CATALOG_COMPILED_SERIALIZERS=False):
+            expected = self.client.get(url, params)
+        actual = self.client.get(url, params)
+        self.assertEqual(actual.status_code, 200)
+        self.assertEqual(actual.content, expected.content)
+        return actual
+
+    def test_list_endpoints_render_identical_bytes(self):
+        self.client.force_login(self.user)
+        for name in ('book-list', 'author-view', 'genre-list', 'language-list'):
+            with self.subTest(name):
+                self.assertSameOutput(reverse(name))
+        response = self.assertSameOutput(reverse('book-list'))
+        self.assertIsNone(response.data['results'][2]['availability'])
+
+    def test_fields_and_expand(self):
+        url = reverse('book-list')
+        self.assertSameOutput(url, fields='id,genre,availability')
+        self.assertSameOutput(url, expand='author,language', fields='title,author.date_of_birth,language')
+        self.assertSameOutput(url, page_size=1)
+
+    def test_list_queries(self):
+        # Version stamps, the book rows, then the genres of the page in one query.
+        with self.assertNumQueries(3):
+            self.client.get(reverse('book-list'))
+
+    def test_nested_and_uncompilable(self):
+        plan = compiled.compile_serializer(BookInstanceSerializer(expand=['book']))
+        rows = compiled.rows(BookInstance.objects.all(), plan)
+        self.assertEqual(plan.serialize(rows), BookInstanceSerializer(BookInstance.objects.all(), many=True,
+                                                                      expand=['book']).data)
+        with self.assertRaises(compiled.NotCompilable):
+            compiled.compile_serializer(CustomUserSerializer())
+
+    def test_benchmark_command(self):
+        out = io.StringIO()
+        call_command('benchmark_serializers', '--rows', '20', '--repeat', '1', stdout=out)
+        self.assertIn('books', out.getvalue())
+        self.assertEqual(Book.objects.count(), 3)
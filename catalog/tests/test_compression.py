@@ -0,0 +1,92 @@
+import gzip
+import zlib
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from catalog import compression
+from catalog.models import Author, Book
+
+
+class NegotiateTest(SimpleTestCase):
+
+    def test_negotiate(self):
+        self.assertEqual(compression.negotiate('gzip, deflate, br'), 'gzip')
+        self.assertEqual(compression.negotiate('deflate, gzip;q=0.5'), 'deflate')
+        self.assertEqual(compression.negotiate('gzip;q=0, deflate'), 'deflate')
+        self.assertEqual(compression.negotiate('*'), 'gzip')
+        self.assertEqual(compression.negotiate('*;q=0.1, gzip;q=0'), 'deflate')
+        self.assertIsNone(compression.negotiate('br'))
+        self.assertIsNone(compression.negotiate(''))
+        self.assertIsNone(compression.negotiate('identity, *;q=0'))
+
+
+@override_settings(CATALOG_PAGE_CACHE_TIMEOUT=300, CATALOG_COMPRESSION_CACHE_TIMEOUT=300,
+                   CATALOG_COMPRESSION_MIN_SIZE=200)
+class CompressionMiddlewareTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        for n in range(10):
+            Book.objects.create(title=f'Book {n}', summary='A long summary. ' * 20, isbn=f'{n:013d}', author=author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_api_list_is_compressed_once(self):
+        url = reverse('book-list')
+        plain = self.client.get(url)
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertIn('Accept-Encoding', plain['Vary'])
+
+        first = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(first['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(first.content), plain.content)
+        self.assertEqual(first['ETag'], 'W/' + plain['ETag'])
+        self.assertEqual(int(first['Content-Length']), len(first.content))
+        self.assertNotIn('X-Catalog-Compressed', first)
+
+        second = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(second['X-Catalog-Cache'], 'hit')
+        self.assertEqual(second['X-Catalog-Compressed'], 'hit')
+        self.assertEqual(second.content, first.content)
+
+        deflated = self.client.get(url, HTTP_ACCEPT_ENCODING='deflate')
+        self.assertEqual(deflated['Content-Encoding'], 'deflate')
+        self.assertEqual(zlib.decompress(deflated.content), plain.content)
+
+        self.assertEqual(self.client.get(url, HTTP_ACCEPT_ENCODING='gzip',
+                                         HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+    def test_changed_data_is_compressed_again(self):
+        url = reverse('book-list')
+        self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        book = Book.objects.first()
+        book.title = 'Renamed'
+        book.save()
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('X-Catalog-Compressed', response)
+        self.assertIn(b'Renamed', gzip.decompress(response.content))
+
+    def test_small_and_html_responses(self):
+        response = self.client.get(reverse('genre-list'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', response)
+        response = self.client.get(reverse('books'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn(b'Book 0', gzip.decompress(response.content))
+
+    def test_streamed_export_is_compressed_incrementally(self):
+        self.client.force_login(self.user)
+        url = reverse('catalog-export', args=['books', 'ndjson'])
+        plain = b''.join(self.client.get(url).streaming_content)
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertNotIn('Content-Length', response)
+        chunks = list(response.streaming_content)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(gzip.decompress(b''.join(chunks)), plain)
@@ -0,0 +1,74 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog import versioning
+from catalog.bulk import AuthorLoader
+from catalog.models import Author, Book, BookInstance, Genre, Language
+
+
+@override_settings(CATALOG_PAGE_CACHE_TIMEOUT=0)
+class ConditionalGetTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.language = Language.objects.create(name='English')
+        cls.genre = Genre.objects.create(name='Fantasy')
+        cls.book = Book.objects.create(title='Book Title', summary='My book summary', isbn='ABCDEFG',
+                                       author=cls.author, language=cls.language)
+
+    def assertNotModified(self, url, etag):
+        # Only the version stamps are read.
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def assertModified(self, url, etag):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        return response['ETag']
+
+    def test_api_list(self):
+        url = reverse('book-list')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Last-Modified', response)
+        etag = response['ETag']
+        self.assertNotModified(url, etag)
+
+        self.book.genre.add(self.genre)
+        etag = self.assertModified(url, etag)
+        BookInstance.objects.create(book=self.book, imprint='Imprint')
+        etag = self.assertModified(url, etag)
+        # Authors are not part of the book list.
+        self.author.save()
+        self.assertNotModified(url, etag)
+
+    def test_if_modified_since(self):
+        url = reverse('genre-list')
+        response = self.client.get(url)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_html_detail_varies_by_user(self):
+        url = reverse('book-detail', args=[self.book.pk])
+        etag = self.client.get(url)['ETag']
+        self.assertNotModified(url, etag)
+        self.client.force_login(get_user_model().objects.create_user(username='reader'))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.language.save()
+        self.assertModified(url, response['ETag'])
+
+    def test_bulk_writes_bump_versions(self):
+        before = versioning.get_versions([versioning.AUTHOR])[versioning.AUTHOR]
+        AuthorLoader().load([{'first_name': 'Ann', 'last_name': 'Leckie'}])
+        self.assertGreater(versioning.get_versions([versioning.AUTHOR])[versioning.AUTHOR], before)
+
+    def test_bump_always_advances(self):
+        versioning.bump(versioning.GENRE)
+        first = versioning.get_versions([versioning.GENRE])[versioning.GENRE]
+        versioning.bump(versioning.GENRE)
+        self.assertGreater(versioning.get_versions([versioning.GENRE])[versioning.GENRE], first)
@@ -0,0 +1,72 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog import counters
+from catalog.models import Author, Book, BookInstance, CatalogCounter, Language
+
+
+class CatalogCounterTest(TestCase):
+
+    def setUp(self):
+        self.author = Author.objects.create(first_name='John', last_name='Smith')
+        self.language = Language.objects.create(name='English')
+        self.book = Book.objects.create(
+            title='Book Title', summary='My book summary', isbn='ABCDEFG',
+            author=self.author, language=self.language)
+
+    def assertCounts(self, **expected):
+        counts = counters.get_counts()
+        for name, value in expected.items():
+            self.assertEqual(counts[name], value)
+        self.assertEqual(counts, counters.exact_counts())
+
+    def test_counts_follow_creates(self):
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='o')
+        self.assertCounts(books=1, instances=2, instances_available=1, authors=1)
+
+    def test_counts_follow_status_changes(self):
+        copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        copy = BookInstance.objects.get(pk=copy.pk)
+        copy.status = 'o'
+        copy.save()
+        self.assertCounts(instances=1, instances_available=0)
+        copy.status = 'a'
+        copy.save()
+        copy.save()
+        self.assertCounts(instances=1, instances_available=1)
+
+    def test_counts_follow_cascading_deletes(self):
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='m')
+        self.book.delete()
+        self.assertCounts(books=0, instances=0, instances_available=0, authors=1)
+
+    def test_reconcile_repairs_drift(self):
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        # queryset.update() bypasses the signal handlers.
+        BookInstance.objects.update(status='o')
+        self.assertEqual(counters.get_counts()[counters.INSTANCES_AVAILABLE], 1)
+        call_command('reconcile_counters', stdout=StringIO())
+        self.assertEqual(counters.get_counts()[counters.INSTANCES_AVAILABLE], 0)
+
+    def test_missing_counter_is_recomputed(self):
+        CatalogCounter.objects.filter(name=counters.BOOKS).delete()
+        self.assertEqual(counters.get_counts()[counters.BOOKS], 1)
+        Book.objects.create(title='Other', summary='Summary', isbn='HIJKLMN',
+                            author=self.author, language=self.language)
+        self.assertEqual(counters.get_counts()[counters.BOOKS], 2)
+
+    def test_index_reads_counters_in_one_query(self):
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        with self.assertNumQueries(1):
+            counters.get_counts()
+        response = self.client.get(reverse('index'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['num_books'], 1)
+        self.assertEqual(response.context['num_instances'], 1)
+        self.assertEqual(response.context['num_instances_available'], 1)
+        self.assertEqual(response.context['num_authors'], 1)
@@ -0,0 +1,80 @@
+import csv
+import io
+import json
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog import export
+from catalog.models import Author, Book, BookInstance, Genre, Language
+
+
+class CatalogExportTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='partner', password='1X<ISRUkw+tuK')
+        language = Language.objects.create(name='English')
+        genres = [Genre.objects.create(name='Science Fiction'), Genre.objects.create(name='Classic')]
+        for i in range(7):
+            author = Author.objects.create(first_name=f'First{i}', last_name=f'Last{i}')
+            book = Book.objects.create(title=f'Title, {i}', summary='Line one\nline two', isbn=f'ISBN{i:03}',
+                                       author=author, language=language)
+            book.genre.set(genres)
+            BookInstance.objects.create(book=book, imprint=f'Imprint {i}', status='a')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_query_count_per_chunk(self):
+        # One streamed query for the books, then author, language and genre lookups per chunk.
+        with self.assertNumQueries(1 + 3 * 3):
+            chunks = list(export.book_chunks(chunk_size=3))
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 3, 1])
+        self.assertEqual(chunks[0][0]['author'], 'First0 Last0')
+        self.assertEqual(chunks[0][0]['genres'], ['Classic', 'Science Fiction'])
+
+    def test_csv_endpoint_streams(self):
+        response = self.client.get(reverse('catalog-export', args=['books', 'csv']))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment; filename="books.csv"', response['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(rows[0]['title'], 'Title, 0')
+        self.assertEqual(rows[0]['summary'], 'Line one\nline two')
+        self.assertEqual(rows[0]['genres'], 'Classic; Science Fiction')
+        self.assertEqual(rows[0]['language'], 'English')
+
+    def test_ndjson_endpoint(self):
+        response = self.client.get(reverse('catalog-export', args=['bookinstances', 'ndjson']))
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 7)
+        self.assertEqual({row['isbn'] for row in rows}, {f'ISBN{i:03}' for i in range(7)})
+
+    def test_unknown_export(self):
+        self.assertEqual(self.client.get(reverse('catalog-export', args=['users', 'csv'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('catalog-export', args=['books', 'xml'])).status_code, 404)
+
+    def test_requires_login(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('catalog-export', args=['books', 'csv'])).status_code, 403)
+
+    def test_empty_csv_has_header(self):
+        BookInstance.objects.all().delete()
+        text = ''.join(export.stream('bookinstances', 'csv'))
+        self.assertEqual(text.strip(), 'id,book_id,title,isbn,imprint,status,due_back')
+
+    def test_command_writes_file(self):
+        path = os.path.join(tempfile.mkdtemp(), 'authors.ndjson')
+        out = io.StringIO()
+        call_command('export_catalog', 'authors', '--format', 'ndjson', '--output', path, '--chunk-size', '2',
+                     stdout=out)
+        self.assertIn('Exported 7 authors', out.getvalue())
+        with open(path, encoding='utf-8') as file:
+            rows = [json.loads(line) for line in file]
+        self.assertEqual([row['last_name'] for row in rows], [f'Last{i}' for i in range(7)])
@@ -0,0 +1,94 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog.models import Author, Book, BookInstance, Genre, Language
+
+
+@override_settings(CATALOG_PAGE_CACHE_TIMEOUT=0)
+class FieldsetsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        cls.author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.language = Language.objects.create(name='English')
+        cls.book = Book.objects.create(title='Book Title', summary='A long summary', isbn='ABCDEFG',
+                                       author=cls.author, language=cls.language)
+        cls.book.genre.add(Genre.objects.create(name='Fantasy'))
+        cls.copy = BookInstance.objects.create(book=cls.book, imprint='Imprint', status='a')
+
+    def get(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data['results'], [query['sql'] for query in queries]
+
+    def test_sparse_fields_narrow_payload_and_query(self):
+        results, queries = self.get(reverse('book-list'), fields='id,title')
+        self.assertEqual(results, [{'id': self.book.pk, 'title': 'Book Title'}])
+        book_query = next(sql for sql in queries if 'FROM "catalog_book"' in sql)
+        self.assertNotIn('"summary"', book_query)
+        self.assertNotIn('JOIN', book_query)
+        # Neither the genres nor the availability row are read.
+        self.assertFalse([sql for sql in queries if 'catalog_genre' in sql or 'catalog_bookavailability' in sql])
+
+    def test_default_fields_unchanged(self):
+        results, _ = self.get(reverse('book-list'))
+        self.assertEqual(results[0]['author'], self.author.pk)
+        self.assertEqual(results[0]['genre'], ['Fantasy'])
+        self.assertEqual(results[0]['availability']['available'], 1)
+
+    def test_expand_joins_relation(self):
+        # Version stamps, then the books joined to their authors.
+        with self.assertNumQueries(2):
+            results, queries = self.get(reverse('book-list'), expand='author', fields='title,author.last_name')
+        self.assertEqual(results, [{'title': 'Book Title', 'author': {'last_name': 'Smith'}}])
+        self.assertIn('JOIN "catalog_author"', queries[1])
+        self.assertNotIn('"date_of_birth"', queries[1])
+
+    def test_book_instances(self):
+        url = reverse('bookinstance-api-list')
+        self.client.force_login(self.user)
+        results, _ = self.get(url)
+        self.assertEqual(results[0]['book']['title'], 'Book Title')
+        self.assertEqual(results[0]['book']['author'], self.author.pk)
+        results, _ = self.get(url, fields='status,book', expand='-book')
+        self.assertEqual(results, [{'book': self.book.pk, 'status': 'a'}])
+        results, queries = self.get(url, expand='-book')
+        self.assertEqual(results[0]['book'], self.book.pk)
+        self.assertFalse([sql for sql in queries if 'catalog_book"' in sql and 'catalog_bookinstance' not in sql])
+
+        results, queries = self.get(url, fields='status,book.title')
+        self.assertEqual(results, [{'book': {'title': 'Book Title'}, 'status': 'a'}])
+        self.assertNotIn('"summary"', queries[-1])
+
+        results, _ = self.get(url, expand='book.language')
+        self.assertEqual(results[0]['book']['language'], {'id': self.language.pk, 'name': 'English'})
+        self.assertEqual(results[0]['book']['genre'], ['Fantasy'])
+
+    def test_invalid_requests(self):
+        response = self.client.get(reverse('book-list'), {'fields': 'title,nope'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['fields'], ['Unknown field: nope'])
+        response = self.client.get(reverse('book-list'), {'expand': 'genre'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_etag_follows_expanded_models(self):
+        url = reverse('book-list')
+        plain = self.client.get(url)['ETag']
+        expanded = self.client.get(url, {'expand': 'author'})['ETag']
+        self.author.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=plain).status_code, 304)
+        self.assertEqual(self.client.get(url, {'expand': 'author'}, HTTP_IF_NONE_MATCH=expanded).status_code, 200)
+
+    def test_etag_follows_default_expanded_book(self):
+        url = reverse('bookinstance-api-list')
+        self.client.force_login(self.user)
+        nested = self.client.get(url)['ETag']
+        collapsed = self.client.get(url, {'expand': '-book'})['ETag']
+        self.book.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=nested).status_code, 200)
+        self.assertEqual(self.client.get(url, {'expand': '-book'}, HTTP_IF_NONE_MATCH=collapsed).status_code, 304)
@@ -0,0 +1,152 @@
+import datetime
+import io
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog import circulation, holds
+from catalog.models import Author, Book, BookAvailability, BookInstance, Hold
+
+
+class HoldQueueTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.patrons = [User.objects.create_user(username=f'patron{n}', password='1X<ISRUkw+tuK') for n in range(4)]
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.book = Book.objects.create(title='Bestseller', summary='Summary', isbn='ABCDEFG', author=author)
+        cls.copy = BookInstance.objects.create(book=cls.book, imprint='Imprint', status='a')
+
+    def copy_state(self):
+        copy = BookInstance.objects.get(pk=self.copy.pk)
+        return copy.status, copy.borrower
+
+    def test_queue_order_and_positions(self):
+        first = holds.place(self.patrons[0], self.book)
+        # A free copy is set aside at once.
+        self.assertEqual((first.status, first.copy_id), (Hold.READY, self.copy.pk))
+        self.assertEqual(self.copy_state(), ('r', self.patrons[0]))
+        self.assertIsNone(holds.position(first))
+
+        second = holds.place(self.patrons[1], self.book)
+        third = holds.place(self.patrons[2], self.book)
+        urgent = holds.place(self.patrons[3], self.book, priority=1)
+        self.assertEqual([holds.position(hold) for hold in (urgent, second, third)], [1, 2, 3])
+        with self.assertRaises(circulation.CirculationError):
+            holds.place(self.patrons[1], self.book)
+
+    def test_return_goes_to_next_hold(self):
+        circulation.borrow(self.patrons[0], book=self.book)
+        waiting = holds.place(self.patrons[1], self.book)
+        self.assertEqual(waiting.status, Hold.WAITING)
+
+        circulation.return_copy(self.copy)
+        waiting.refresh_from_db()
+        self.assertEqual((waiting.status, waiting.copy_id), (Hold.READY, self.copy.pk))
+        self.assertEqual(waiting.expires, datetime.date.today() + datetime.timedelta(days=7))
+        self.assertEqual(self.copy_state(), ('r', self.patrons[1]))
+        availability = BookAvailability.objects.get(book=self.book)
+        self.assertEqual((availability.available, availability.reserved, availability.on_loan), (0, 1, 0))
+
+        # Nobody else can borrow it; the patron it is held for can, which fulfils the hold.
+        with self.assertRaises(circulation.NoCopyAvailable):
+            circulation.borrow(self.patrons[2], book=self.book)
+        circulation.borrow(self.patrons[1], book=self.book)
+        waiting.refresh_from_db()
+        self.assertEqual(waiting.status, Hold.FULFILLED)
+
+    def test_cancel_passes_copy_on(self):
+        ready = holds.place(self.patrons[0], self.book)
+        waiting = holds.place(self.patrons[1], self.book)
+        holds.cancel(ready)
+        self.assertEqual(Hold.objects.get(pk=ready.pk).status, Hold.CANCELLED)
+        self.assertEqual(Hold.objects.get(pk=waiting.pk).status, Hold.READY)
+        self.assertEqual(self.copy_state(), ('r', self.patrons[1]))
+        with self.assertRaises(circulation.CirculationError):
+            holds.cancel(ready)
+
+    def test_expire(self):
+        yesterday = datetime.date.today() - datetime.timedelta(days=1)
+        ready = holds.place(self.patrons[0], self.book)
+        Hold.objects.filter(pk=ready.pk).update(expires=yesterday)
+        stale = holds.place(self.patrons[1], self.book, expires=yesterday)
+        waiting = holds.place(self.patrons[2], self.book)
+        # A new copy, added behind the queue's back.
+        extra = BookInstance.objects.create(book=self.book, imprint='Second printing', status='a')
+        late = holds.place(self.patrons[3], self.book)
+
+        out = io.StringIO()
+        call_command('expire_holds', stdout=out)
+        self.assertIn('Expired 2 holds; served 1 waiting holds', out.getvalue())
+        self.assertEqual(Hold.objects.get(pk=ready.pk).status, Hold.EXPIRED)
+        self.assertEqual(Hold.objects.get(pk=stale.pk).status, Hold.EXPIRED)
+        self.assertEqual({Hold.objects.get(pk=waiting.pk).copy_id, Hold.objects.get(pk=late.pk).copy_id},
+                         {self.copy.pk, extra.pk})
+        self.assertEqual(BookAvailability.objects.get(book=self.book).reserved, 2)
+
+    def test_cancel_is_undone_if_the_copy_is_not_released(self):
+        ready = holds.place(self.patrons[0], self.book)
+        with mock.patch.object(circulation, 'release', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                holds.cancel(ready)
+        self.assertEqual(Hold.objects.get(pk=ready.pk).status, Hold.READY)
+        self.assertEqual(self.copy_state(), ('r', self.patrons[0]))
+
+    def test_expire_releases_stranded_copies(self):
+        ready = holds.place(self.patrons[0], self.book)
+        waiting = holds.place(self.patrons[1], self.book)
+        # Closed by a process that died before releasing its copy.
+        Hold.objects.filter(pk=ready.pk).update(status=Hold.CANCELLED)
+        self.assertEqual(holds.expire(), (0, 0))
+        self.assertEqual(Hold.objects.get(pk=waiting.pk).status, Hold.READY)
+        self.assertEqual(self.copy_state(), ('r', self.patrons[1]))
+        self.assertFalse(holds.stranded_copies().exists())
+
+    def test_positions_of_a_page(self):
+        circulation.borrow(self.patrons[3], book=self.book)
+        others = [Book.objects.create(title=f'Book {n}', summary='Summary', isbn=f'ISBN{n}', author=self.book.author)
+                  for n in range(2)]
+        for book in (self.book, *others):
+            for patron in self.patrons[:3]:
+                holds.place(patron, book, priority=int(patron == self.patrons[2]))
+        page = list(Hold.objects.filter(patron__in=self.patrons[1:3]).order_by('id'))
+        with self.assertNumQueries(1):
+            holds.positions(page)
+        self.assertEqual([hold.position for hold in page], [holds.position(hold) for hold in page])
+        self.assertEqual(sorted(hold.position for hold in page), [1, 1, 1, 3, 3, 3])
+
+    def test_next_hold_is_an_index_seek(self):
+        sql, params = holds.queue(self.book.pk)[:1].query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            details = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn('catalog_hold_queue', details)
+        self.assertNotIn('TEMP B-TREE', details)
+
+    def test_api(self):
+        self.client.force_login(self.patrons[1])
+        circulation.borrow(self.patrons[0], book=self.book)
+        response = self.client.post(reverse('hold-list'), {'book': self.book.pk})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['status'], response.data['position']), ('w', 1))
+        self.assertEqual(self.client.post(reverse('hold-list'), {'book': self.book.pk}).status_code, 400)
+        self.assertEqual([hold['position'] for hold in self.client.get(reverse('hold-list')).data['results']], [1])
+
+        # Listed in the order they were placed, which need not be id order.
+        other = Book.objects.create(title='Other', summary='Summary', isbn='OTHER', author=self.book.author)
+        earlier = holds.place(self.patrons[1], other)
+        Hold.objects.filter(pk=earlier.pk).update(placed=earlier.placed - datetime.timedelta(days=1))
+        listed = self.client.get(reverse('hold-list'), {'page_size': 1})
+        self.assertEqual([hold['id'] for hold in listed.data['results']], [earlier.pk])
+        listed = self.client.get(listed.data['next'])
+        self.assertEqual([hold['id'] for hold in listed.data['results']], [response.data['id']])
+        holds.cancel(earlier)
+
+        response = self.client.delete(reverse('hold-cancel', args=[response.data['id']]))
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.get(reverse('hold-list')).data['results'], [])
@@ -0,0 +1,187 @@
+import csv
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from catalog import counters, importer, isbn
+from catalog.importer import clean_chunk
+from catalog.management.commands import import_catalog
+from catalog.models import Author, Book, BookAvailability, BookInstance, CatalogCounter, Genre, Language
+
+BOOK_COLUMNS = ['title', 'isbn', 'author', 'language', 'genres', 'summary']
+
+
+class ISBNTest(TestCase):
+
+    def test_normalize(self):
+        self.assertEqual(isbn.normalize('978-0-441-01359-3'), '9780441013593')
+        self.assertEqual(isbn.normalize('ISBN 0-441-01359-7'), '9780441013593')
+        self.assertEqual(isbn.normalize('0-8044-2957-X'), '9780804429573')
+
+    def test_invalid(self):
+        for value in ('9780441013594', '0441013598', '12345', '', None):
+            with self.assertRaises(isbn.InvalidISBN):
+                isbn.normalize(value)
+
+    def test_clean_chunk_numbers_rows(self):
+        cleaned, errors = clean_chunk('books', 10, [
+            {'title': 'Dune', 'isbn': '0441013597', 'author': 'Frank Herbert', 'genres': 'SF; Classic'},
+            {'title': 'Bad', 'isbn': '0441013598', 'author': 'Frank Herbert'},
+            {'title': 'Nameless', 'isbn': '9780306406157', 'author': 'Plato'},
+        ])
+        self.assertEqual(cleaned[0], (10, {'title': 'Dune', 'isbn': '9780441013593', 'summary': '',
+                                           'author': ('Frank', 'Herbert'), 'language': None,
+                                           'genres': ['Classic', 'SF']}))
+        self.assertEqual([number for number, message in errors], [11, 12])
+
+    def test_copy_statuses_follow_the_model(self):
+        rows = [{'isbn': '0441013597', 'imprint': 'Ace', 'status': status} for status in ('r', 'd')]
+        cleaned, errors = clean_chunk('bookinstances', 0, rows, import_catalog.STATUSES)
+        self.assertEqual([values['status'] for number, values in cleaned], ['r'])
+        self.assertEqual(errors, [(1, 'status "d" is not one of a, m, o, r.')])
+
+    def test_csv_records_keep_quoted_newlines(self):
+        path = os.path.join(tempfile.mkdtemp(), 'books.csv')
+        with open(path, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(['title', 'summary'])
+            writer.writerow(['Dune', 'Line one\nline "two"'])
+            file.write('\r\n')
+            writer.writerow(['Emma', ''])
+        header = importer.read_header(path, 'csv')
+        records = list(importer.read_records(path, 'csv'))
+        self.assertEqual(len(records), 2)
+        self.assertEqual(importer.parse_records('csv', header, records), [
+            {'title': 'Dune', 'summary': 'Line one\nline "two"'}, {'title': 'Emma', 'summary': ''}])
+
+
+class ImportCatalogTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        author = Author.objects.create(first_name='Frank', last_name='Herbert')
+        Language.objects.create(name='English')
+        Book.objects.create(title='Dune', summary='Spice.', isbn='0441013597', author=author)
+
+    def write_csv(self, name, columns, rows):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(columns)
+            writer.writerows(rows)
+        return path
+
+    def call(self, *args):
+        out, err = io.StringIO(), io.StringIO()
+        call_command('import_catalog', *args, '--workers', '0', stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_books(self):
+        path = self.write_csv('books.csv', BOOK_COLUMNS, [
+            ['Dune (reissue)', '978-0-441-01359-3', 'Frank Herbert', 'English', '', ''],  # already present
+            ['Wizard of Earthsea', '978-0-547-77374-2', 'Ursula K. Le Guin', 'english', 'Fantasy; Classic', 'Ged.'],
+            ['Same book again', '9780547773742', 'Ursula K. Le Guin', '', '', ''],  # duplicate in the file
+            ['Bad checksum', '9780547773743', 'Ursula K. Le Guin', '', '', ''],
+            ['Numbers', '0-306-40615-2', 'frank herbert', 'Latin', 'classic', ''],
+        ])
+        out, err = self.call('books', path, '--chunk-size', '2')
+        self.assertIn('5 rows read: 2 created, 2 already present, 1 rejected', out)
+        self.assertIn('Row 4: Invalid ISBN-13 check digit', err)
+        earthsea = Book.objects.get(isbn='9780547773742')
+        self.assertEqual((earthsea.author.first_name, earthsea.author.last_name), ('Ursula K. Le', 'Guin'))
+        self.assertEqual(earthsea.language.name, 'English')
+        self.assertEqual(sorted(genre.name for genre in earthsea.genre.all()), ['Classic', 'Fantasy'])
+        self.assertEqual(Book.objects.get(isbn='9780306406157').author.last_name, 'Herbert')
+        self.assertEqual(Author.objects.count(), 2)
+        self.assertEqual(Genre.objects.count(), 2)
+        self.assertEqual(counters.get_counts(), counters.exact_counts())
+        self.assertEqual(BookAvailability.objects.count(), 3)
+        self.assertFalse(CatalogCounter.objects.filter(name=import_catalog.checkpoint_name('books', path)).exists())
+
+    def test_resume_from_checkpoint(self):
+        path = self.write_csv('books.csv', BOOK_COLUMNS, [
+            ['First', '9780547773742', 'Ursula Le Guin', '', '', ''],
+            ['Second', '9780306406157', 'Ursula Le Guin', '', '', ''],
+        ])
+        CatalogCounter.objects.create(name=import_catalog.checkpoint_name('books', path), value=1)
+        out, err = self.call('books', path)
+        self.assertIn('Resuming after row 1', out)
+        self.assertIn('2 rows read: 1 created', out)
+        self.assertEqual(list(Book.objects.filter(title__in=['First', 'Second']).values_list('title', flat=True)),
+                         ['Second'])
+
+    def test_checkpoint_commits_with_its_chunk(self):
+        path = os.path.join(self.directory, 'copies.ndjson')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.writelines(json.dumps({'isbn': '0441013597', 'imprint': f'Printing {number}'}) + '\n'
+                            for number in range(4))
+        write_checkpoint = import_catalog.Command.write_checkpoint
+        calls = []
+
+        def crash_on_second_chunk(command, checkpoint, rows):
+            calls.append(rows)
+            if len(calls) == 2:
+                raise KeyboardInterrupt
+            write_checkpoint(command, checkpoint, rows)
+
+        # Interrupted after inserting the second chunk of id-less copies: the chunk goes with the checkpoint.
+        with mock.patch.object(import_catalog.Command, 'write_checkpoint', crash_on_second_chunk):
+            with self.assertRaises(KeyboardInterrupt):
+                self.call('bookinstances', path, '--chunk-size', '2')
+        self.assertEqual(BookInstance.objects.count(), 2)
+        out, err = self.call('bookinstances', path, '--chunk-size', '2')
+        self.assertIn('Resuming after row 2', out)
+        self.assertEqual(sorted(BookInstance.objects.values_list('imprint', flat=True)),
+                         [f'Printing {number}' for number in range(4)])
+
+    def test_copies_and_authors_ndjson(self):
+        path = os.path.join(self.directory, 'copies.ndjson')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(json.dumps({'isbn': '978-0-441-01359-3', 'imprint': 'Ace, 1990', 'status': 'o',
+                                   'due_back': '2030-01-01'}) + '\n')
+            file.write(json.dumps({'isbn': '9780306406157', 'imprint': 'Unknown book'}) + '\n')
+            file.write(json.dumps({'isbn': '0441013597', 'imprint': 'Ace, 2005'}) + '\n')
+        out, err = self.call('bookinstances', path)
+        self.assertIn('3 rows read: 2 created, 0 already present, 1 rejected', out)
+        self.assertIn('No book with ISBN 9780306406157', err)
+        availability = BookAvailability.objects.get()
+        self.assertEqual((availability.total, availability.on_loan), (2, 1))
+
+        path = self.write_csv('authors.csv', ['first_name', 'last_name', 'date_of_birth'], [
+            ['Frank', 'Herbert', ''], ['Ann', 'Leckie', '1966-03-02'], ['No', 'Date', 'March']])
+        out, err = self.call('authors', path, '--errors', os.path.join(self.directory, 'errors.ndjson'))
+        self.assertIn('3 rows read: 1 created, 1 already present, 1 rejected', out)
+        self.assertEqual(Author.objects.get(last_name='Leckie').date_of_birth.isoformat(), '1966-03-02')
+
+    def test_round_trip_with_export_in_worker_processes(self):
+        path = os.path.join(self.directory, 'export.ndjson')
+        call_command('export_catalog', 'books', '--format', 'ndjson', '--output', path, stdout=io.StringIO())
+        Book.objects.all().delete()
+        out = io.StringIO()
+        call_command('import_catalog', 'books', path, '--workers', '2', stdout=out)
+        self.assertIn('1 rows read: 1 created', out.getvalue())
+        self.assertEqual(Book.objects.get().isbn, '9780441013593')
+
+    def test_round_trip_keeps_multi_word_last_names(self):
+        author = Author.objects.create(first_name='Winter', last_name='Orchardson 204')
+        Book.objects.create(title='The Glass Mirror', isbn='9780306406157', author=author)
+        path = os.path.join(self.directory, 'export.csv')
+        call_command('export_catalog', 'books', '--format', 'csv', '--output', path, stdout=io.StringIO())
+        Book.objects.filter(author=author).delete()
+        self.call('books', path)
+        self.assertEqual(Book.objects.get(isbn='9780306406157').author, author)
+        self.assertEqual(Author.objects.count(), 2)
+
+    def test_benchmark_command(self):
+        out = io.StringIO()
+        call_command('benchmark_import', '--books', '12', '--copies-per-book', '2', '--format', 'csv', stdout=out)
+        self.assertRegex(out.getvalue(), r'books +12 +12 ')
+        self.assertRegex(out.getvalue(), r'bookinstances +24 +24 ')
+        # Everything it imported was rolled back.
+        self.assertEqual(Book.objects.count(), 1)
+        self.assertFalse(BookInstance.objects.exists())
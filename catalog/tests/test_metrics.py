@@ -0,0 +1,99 @@
+import multiprocessing
+import os
+import re
+import tempfile
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog import metrics
+from catalog.models import Author, Book
+
+
+def record_in_child():
+    metrics.inc(metrics.REQUESTS, (('view', 'book-list'), ('method', 'GET'), ('status', '200')), 2)
+
+
+class MetricsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG', author=author)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(CATALOG_METRICS_DIR=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(metrics.clear)
+
+    def sample(self, text, line):
+        found = re.search('^' + re.escape(line) + r' (\S+)$', text, re.MULTILINE)
+        self.assertIsNotNone(found, line)
+        return float(found.group(1))
+
+    def test_requests_labelled_by_url_name(self):
+        for _ in range(3):
+            self.client.get(reverse('book-list'))
+        self.client.get(reverse('books'))
+        self.client.get('/catalog/no-such-page/')
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        text = response.content.decode()
+        self.assertIn('# TYPE catalog_http_request_duration_seconds histogram', text)
+        self.assertEqual(self.sample(
+            text, 'catalog_http_requests_total{method="GET",status="200",view="book-list"}'), 3)
+        self.assertEqual(self.sample(
+            text, 'catalog_http_requests_total{method="GET",status="404",view="<unresolved>"}'), 1)
+        self.assertEqual(self.sample(text, 'catalog_http_request_duration_seconds_count{view="books"}'), 1)
+        self.assertEqual(self.sample(
+            text, 'catalog_http_request_duration_seconds_bucket{view="book-list",le="+Inf"}'), 3)
+        # Buckets are cumulative.
+        buckets = [float(value) for value in re.findall(
+            r'^catalog_db_queries_per_request_bucket\{view="book-list",le="[^"]+"\} (\S+)$', text, re.MULTILINE)]
+        self.assertEqual(buckets, sorted(buckets))
+        self.assertEqual(buckets[-1], 3)
+        self.assertGreater(self.sample(text, 'catalog_db_queries_per_request_sum{view="book-list"}'), 0)
+        self.assertGreater(self.sample(text, 'catalog_http_response_size_bytes_sum{view="books"}'), 0)
+
+    def test_unknown_methods_share_one_label(self):
+        for method in ('BREW', 'PROPFIND', 'X' * 200):
+            self.client.generic(method, reverse('book-list'))
+        self.client.generic('PUT', reverse('book-list'))
+        totals = metrics.collect()
+        methods = {dict(labels)['method'] for sample, labels in totals if sample == metrics.REQUESTS}
+        self.assertEqual(methods, {'other', 'PUT'})
+
+    def test_processes_add_up(self):
+        metrics.inc(metrics.REQUESTS, (('view', 'book-list'), ('method', 'GET'), ('status', '200')))
+        child = multiprocessing.get_context('fork').Process(target=record_in_child)
+        child.start()
+        child.join()
+        self.assertEqual(len(os.listdir(metrics.directory())), 2)
+        totals = metrics.collect()
+        self.assertEqual(totals['catalog_http_requests_total',
+                                (('method', 'GET'), ('status', '200'), ('view', 'book-list'))], 3)
+
+    def test_store_grows_and_reopens(self):
+        path = os.path.join(metrics.directory(), 'metrics-1.db')
+        store = metrics.Store(path)
+        keys = [metrics.key('sample', (('view', f'view-{n}' * 20),)) for n in range(500)]
+        for n, key in enumerate(keys):
+            store.add(key, n)
+            store.add(key, 0.5)
+        store.close()
+        reopened = metrics.Store(path)
+        reopened.add(keys[-1], 1)
+        reopened.close()
+        values = {key: value for key, value, _ in metrics._entries(open(path, 'rb').read())}
+        self.assertEqual(values[keys[0]], 0.5)
+        self.assertEqual(values[keys[-1]], 500.5)
+        self.assertEqual(len(values), 500)
+
+    @override_settings(CATALOG_METRICS_DIR='')
+    def test_disabled(self):
+        self.client.get(reverse('books'))
+        self.assertEqual(metrics.collect(), {})
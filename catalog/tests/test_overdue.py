@@ -0,0 +1,77 @@
+import datetime
+import io
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog import circulation, overdue
+from catalog.models import Author, Book, BookInstance
+
+
+class OverdueSweepTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.alice = User.objects.create_user(username='alice', password='1X<ISRUkw+tuK')
+        cls.bob = User.objects.create_user(username='bob', password='1X<ISRUkw+tuK')
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG', author=author)
+        cls.today = datetime.date.today()
+        cls.late = []
+        for days, borrower in ((9, cls.alice), (5, cls.bob), (5, cls.alice), (1, cls.alice)):
+            cls.late.append(BookInstance.objects.create(book=book, imprint='Imprint', status='o', borrower=borrower,
+                                                        due_back=cls.today - datetime.timedelta(days=days)))
+        BookInstance.objects.create(book=book, imprint='Imprint', status='o', borrower=cls.bob,
+                                    due_back=cls.today + datetime.timedelta(days=3))
+        BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+
+    def test_chunks_walk_keyset_order(self):
+        chunks = list(overdue.chunks(chunk_size=3))
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 1])
+        rows = [row for chunk in chunks for row in chunk]
+        self.assertEqual([row['due_back'] for row in rows], sorted(copy.due_back for copy in self.late))
+        self.assertEqual(len({row['pk'] for row in rows}), 4)
+
+    def test_sweep_stamps_and_digests(self):
+        stamped, cleared, digests = overdue.sweep(chunk_size=2)
+        self.assertEqual((stamped, cleared), (4, 0))
+        self.assertEqual(BookInstance.objects.filter(overdue_since=self.today).count(), 4)
+        self.assertEqual([loan['days_overdue'] for loan in digests[self.alice.pk]['loans']], [9, 5, 1])
+        self.assertEqual(digests[self.bob.pk]['username'], 'bob')
+        self.assertTrue(all(loan['new'] for loan in digests[self.bob.pk]['loans']))
+
+        # A second run stamps nothing new; returned and renewed loans lose their stamp.
+        circulation.return_copy(self.late[0])
+        BookInstance.objects.filter(pk=self.late[1].pk).update(due_back=self.today)
+        stamped, cleared, digests = overdue.sweep()
+        self.assertEqual((stamped, cleared), (0, 1))
+        self.assertEqual(list(digests), [self.alice.pk])
+        self.assertFalse(any(loan['new'] for loan in digests[self.alice.pk]['loans']))
+        self.assertIsNone(BookInstance.objects.get(pk=self.late[0].pk).overdue_since)
+
+    def test_loans_use_index(self):
+        sql, params = overdue.loans().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            details = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn('catalog_copy_status_due', details)
+        self.assertNotIn('TEMP B-TREE', details)
+
+    def test_command_and_librarian_view(self):
+        out = io.StringIO()
+        call_command('sweep_overdue', '--digests', stdout=out)
+        self.assertIn('alice: 3 overdue', out.getvalue())
+        self.assertIn('4 overdue loans for 2 borrowers; stamped 4 newly overdue, cleared 0.', out.getvalue())
+
+        self.alice.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+        self.client.force_login(self.alice)
+        response = self.client.get(reverse('all-overdue'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['bookinstance_list']),
+                         sorted(self.late, key=lambda copy: (copy.due_back, copy.pk)))
+        self.assertContains(response, 'Overdue Books')
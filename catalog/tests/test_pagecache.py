@@ -0,0 +1,122 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+
+from catalog import pagecache
+from catalog.models import Author, Book, BookInstance, Genre, Language
+
+
+class PageCacheTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.other_author = Author.objects.create(first_name='Jane', last_name='Doe')
+        cls.language = Language.objects.create(name='English')
+        cls.genre = Genre.objects.create(name='Fantasy')
+        cls.other_genre = Genre.objects.create(name='Poetry')
+        cls.book = Book.objects.create(title='Book Title', summary='My book summary', isbn='ABCDEFG',
+                                       author=cls.author, language=cls.language)
+        cls.book.genre.add(cls.genre)
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, url, **headers):
+        response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def assertHit(self, url):
+        with self.assertNumQueries(0):
+            response = self.get(url)
+        self.assertEqual(response['X-Catalog-Cache'], 'hit')
+        return response
+
+    def assertMiss(self, url):
+        response = self.get(url)
+        self.assertEqual(response['X-Catalog-Cache'], 'miss')
+        return response
+
+    def test_detail_page_invalidated_by_rendered_objects(self):
+        url = reverse('book-detail', args=[self.book.pk])
+        self.assertMiss(url)
+        self.assertHit(url)
+
+        self.other_author.save()
+        self.other_genre.save()
+        self.assertHit(url)
+
+        self.author.last_name = 'Smithson'
+        self.author.save()
+        self.assertContains(self.assertMiss(url), 'Smithson')
+
+        BookInstance.objects.create(book=self.book, imprint='New imprint')
+        self.assertContains(self.assertMiss(url), 'New imprint')
+
+        self.genre.name = 'High Fantasy'
+        self.genre.save()
+        self.assertContains(self.assertMiss(url), 'High Fantasy')
+
+    def test_list_pages(self):
+        url = reverse('books')
+        self.assertMiss(url)
+        self.assertHit(url)
+        Book.objects.create(title='Another', summary='Summary', isbn='HIJKLMN',
+                            author=self.other_author, language=self.language)
+        self.assertContains(self.assertMiss(url), 'Another')
+
+        url = reverse('authors')
+        self.assertMiss(url)
+        self.genre.save()
+        self.assertHit(url)
+        Author.objects.create(first_name='New', last_name='Author')
+        self.assertContains(self.assertMiss(url), 'Author, New')
+
+    def test_sparse_list_tags_without_deferred_loads(self):
+        url = reverse('books') + '?fields=id,title'
+        with self.assertNumQueries(2):
+            self.assertMiss(url)
+        self.assertHit(url)
+
+    def test_genre_page_follows_membership(self):
+        url = reverse('genre-detail', args=[self.other_genre.pk])
+        self.assertNotContains(self.assertMiss(url), 'Book Title')
+        self.book.genre.add(self.other_genre)
+        self.assertContains(self.assertMiss(url), 'Book Title')
+        self.book.title = 'Renamed'
+        self.book.save()
+        self.assertContains(self.assertMiss(url), 'Renamed')
+
+    def test_authenticated_requests_bypass_cache(self):
+        url = reverse('book-detail', args=[self.book.pk])
+        self.assertMiss(url)
+        self.client.force_login(get_user_model().objects.create_user(username='librarian'))
+        response = self.get(url)
+        self.assertNotIn('X-Catalog-Cache', response)
+        self.assertContains(response, 'User: librarian')
+        self.client.logout()
+        self.assertNotContains(self.assertHit(url), 'User: librarian')
+
+        response = self.get(url, HTTP_AUTHORIZATION='Basic Zm9vOmJhcg==')
+        self.assertNotIn('X-Catalog-Cache', response)
+
+    def test_conditional_hit(self):
+        url = reverse('book-detail', args=[self.book.pk])
+        etag = self.assertMiss(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_page_rendered_before_invalidation_is_not_served(self):
+        request = RequestFactory().get('/catalog/example/')
+        rendered_at = time.time()
+        pagecache._invalidate_now({'book:1'})
+        pagecache.store(request, HttpResponse('old'), {'book:1'}, rendered_at)
+        self.assertIsNone(pagecache.get(request))
+        pagecache.store(request, HttpResponse('new'), {'book:1'}, time.time())
+        self.assertEqual(pagecache.get(request).content, b'new')
@@ -0,0 +1,47 @@
+import io
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+from catalog import availability
+from catalog.models import Author, Book, BookInstance
+
+
+def plan(queryset):
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return ' '.join(str(row[-1]) for row in cursor.fetchall())
+
+
+class IndexPackTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+
+    def assertIndexOrder(self, queryset, index):
+        details = plan(queryset)
+        self.assertIn(index, details)
+        self.assertNotIn('TEMP B-TREE', details)
+
+    def test_default_orderings_read_in_index_order(self):
+        self.assertIndexOrder(Book.objects.all()[:10], 'catalog_book_title')
+        self.assertIndexOrder(Author.objects.all()[:10], 'catalog_author_name')
+        self.assertIndexOrder(BookInstance.objects.filter(borrower=self.user, status='o')[:10],
+                              'catalog_copy_borrower_due')
+        self.assertNotIn('catalog_author', plan(Book.objects.all()[:10]))
+
+    def test_availability_counts_use_covering_index(self):
+        self.assertIn('COVERING INDEX catalog_copy_book_status', plan(availability.counts([1, 2])))
+
+    def test_benchmark_command(self):
+        out = io.StringIO()
+        call_command('benchmark_query_plans', '--rows', '30', '--repeat', '1', '--plans', stdout=out)
+        self.assertIn('book list', out.getvalue())
+        self.assertIn('USE TEMP B-TREE FOR ORDER BY', out.getvalue())
+        # Everything it added or dropped was rolled back.
+        self.assertFalse(Book.objects.exists())
+        self.assertIn('catalog_book_title', plan(Book.objects.all()[:10]))
@@ -0,0 +1,83 @@
+import datetime
+import decimal
+import json
+import uuid
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+
+from catalog.models import Genre
+from catalog.renderers import FastJSONRenderer
+
+
+class FastJSONRendererTest(SimpleTestCase):
+
+    def setUp(self):
+        self.data = {
+            'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'due_back': datetime.date(2030, 1, 2),
+            'borrowed_at': datetime.datetime(2030, 1, 2, 3, 4, 5),
+            'fine': decimal.Decimal('1.50'),
+            'title': 'Line separator “quoted” é',
+            'results': [{'n': n, 'genre': ['Fantasy', None], 'ok': n % 2 == 0} for n in range(7)],
+            'empty': [],
+        }
+
+    def test_same_bytes_as_drf(self):
+        self.assertEqual(FastJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+        self.assertEqual(FastJSONRenderer().render([]), JSONRenderer().render([]))
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+    @override_settings(CATALOG_JSON_CHUNK_SIZE=3)
+    def test_long_lists_are_chunked(self):
+        renderer = FastJSONRenderer()
+        chunks = list(renderer.iter_render(self.data))
+        self.assertGreater(len(chunks), 3)
+        self.assertEqual(b''.join(chunks), JSONRenderer().render(self.data))
+        self.assertEqual(renderer.render(self.data['results']), JSONRenderer().render(self.data['results']))
+
+        renderer.compact = False
+        self.assertEqual(renderer.render(self.data['results']), json.dumps(self.data['results']).encode())
+
+    def test_indent_falls_back_to_drf(self):
+        context = {'indent': 2}
+        self.assertEqual(FastJSONRenderer().render(self.data, 'application/json', context),
+                         JSONRenderer().render(self.data, 'application/json', context))
+
+
+@override_settings(CATALOG_PAGE_CACHE_TIMEOUT=0, CATALOG_JSON_CHUNK_SIZE=2)
+class StreamingResponseTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Genre.objects.bulk_create(Genre(name=f'Genre {n}') for n in range(5))
+
+    def test_long_page_is_streamed(self):
+        response = self.client.get(reverse('genre-list'))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('ETag', response)
+        body = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([genre['name'] for genre in body['results']], [f'Genre {n}' for n in range(5)])
+
+    def test_short_page_is_not_streamed(self):
+        response = self.client.get(reverse('genre-list'), {'page_size': 2})
+        self.assertFalse(response.streaming)
+        self.assertEqual(len(response.json()['results']), 2)
+
+
+@override_settings(CATALOG_PAGE_CACHE_TIMEOUT=0)
+class DefaultStreamingTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Genre.objects.bulk_create(Genre(name=f'Genre {n:03}') for n in range(150))
+
+    def test_pages_larger_than_the_default_are_streamed(self):
+        # The shipped settings: default pages are rendered whole, the largest allowed ones streamed.
+        self.assertFalse(self.client.get(reverse('genre-list')).streaming)
+        response = self.client.get(reverse('genre-list'), {'page_size': 1000})
+        self.assertTrue(response.streaming)
+        body = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(body['results']), 100)
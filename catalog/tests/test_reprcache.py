@@ -0,0 +1,76 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+
+from catalog.models import Author, Book, BookInstance, Genre
+from catalog.serializers import BookInstanceSerializer, BookSerializer
+
+
+# Entries are not written inside transactions, so these tests commit. The book
+# list goes through the serializer rather than its compiled form.
+@override_settings(CATALOG_PAGE_CACHE_TIMEOUT=0, CATALOG_REPRESENTATION_CACHE_TIMEOUT=300,
+                   CATALOG_COMPILED_SERIALIZERS=False)
+class RepresentationCacheTest(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = Author.objects.create(first_name='John', last_name='Smith')
+        self.genre = Genre.objects.create(name='Fantasy')
+        self.books = [
+            Book.objects.create(title=f'Book {number}', summary='Summary', isbn=f'ISBN{number}', author=self.author)
+            for number in range(3)]
+        for book in self.books:
+            book.genre.add(self.genre)
+
+    def get_books(self, queries):
+        with self.assertNumQueries(queries):
+            response = self.client.get(reverse('book-list'))
+        return {data['id']: data for data in response.data['results']}
+
+    def test_list_serializes_only_misses(self):
+        # Version stamps, books, then the genres of the misses.
+        self.get_books(3)
+        self.assertEqual(self.get_books(2)[self.books[0].pk]['genre'], ['Fantasy'])
+
+        self.books[0].title = 'Renamed'
+        self.books[0].save()
+        books = self.get_books(3)
+        self.assertEqual(books[self.books[0].pk]['title'], 'Renamed')
+        self.assertEqual(books[self.books[1].pk]['title'], 'Book 1')
+
+    def test_invalidated_by_related_changes(self):
+        book = self.books[0]
+        self.get_books(3)
+        self.genre.name = 'High Fantasy'
+        self.genre.save()
+        self.assertEqual(self.get_books(3)[book.pk]['genre'], ['High Fantasy'])
+
+        poetry = Genre.objects.create(name='Poetry')
+        poetry.book_set.add(book)
+        self.assertEqual(self.get_books(3)[book.pk]['genre'], ['High Fantasy', 'Poetry'])
+        poetry.book_set.clear()
+        self.assertEqual(self.get_books(3)[book.pk]['genre'], ['High Fantasy'])
+
+        BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+        self.assertEqual(self.get_books(3)[book.pk]['availability']['available'], 1)
+        self.get_books(2)
+
+    def test_nested_books_read_in_one_batch(self):
+        BookInstance.objects.bulk_create(BookInstance(book=book, imprint='Imprint') for book in self.books)
+        copies = BookInstance.objects.select_related('book__availability')
+        BookInstanceSerializer(list(copies), many=True, expand=['book']).data
+        copies = list(copies)
+        with self.assertNumQueries(0):
+            data = BookInstanceSerializer(copies, many=True, expand=['book']).data
+        self.assertEqual(sorted(item['book']['title'] for item in data), ['Book 0', 'Book 1', 'Book 2'])
+
+    def test_nothing_stored_inside_transactions(self):
+        book = self.books[0]
+        with transaction.atomic():
+            book.title = 'Rolled back'
+            book.save()
+            self.assertEqual(BookSerializer(book).data['title'], 'Rolled back')
+            transaction.set_rollback(True)
+        book.refresh_from_db()
+        self.assertEqual(BookSerializer(book).data['title'], 'Book 0')
@@ -0,0 +1,253 @@
+import json
+import math
+import os
+import pickle
+import random
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog.models import Author, Book, Language, SearchJournal
+from catalog.search import fts, index as search_index
+from catalog.search.engine import SearchIndex, tokenize, weighted_terms
+
+
+class SearchEngineTest(TestCase):
+
+    def setUp(self):
+        self.index = SearchIndex()
+        self.index.add(1, weighted_terms([('The Dune Chronicles', 3), ('A desert planet', 1)]))
+        self.index.add(2, weighted_terms([('Desert Solitaire', 3), ('Essays on the desert', 1)]))
+        self.index.add(3, weighted_terms([('Dunes and Beaches', 3), ('Coastal walks', 1)]))
+
+    def test_tokenize_normalizes_case_and_accents(self):
+        self.assertEqual(tokenize('Émile and the CAFÉ'), ['emile', 'cafe'])
+
+    def test_bm25_ranks_title_matches_first(self):
+        self.assertEqual([doc for doc, score in self.index.search('desert')], [2, 1])
+
+    def test_prefix_query(self):
+        self.assertEqual(sorted(doc for doc, score in self.index.search('dun*')), [1, 3])
+        self.assertEqual(sorted(doc for doc, score in self.index.search('dun', prefix=True)), [1, 3])
+        self.assertEqual(self.index.search('dun'), [])
+
+    def test_incremental_update_and_remove(self):
+        self.index.add(1, weighted_terms([('Foundation', 3)]))
+        self.assertEqual([doc for doc, score in self.index.search('foundation')], [1])
+        self.assertEqual([doc for doc, score in self.index.search('chronicles')], [])
+        self.index.remove(1)
+        self.assertEqual(self.index.search('foundation'), [])
+        self.assertNotIn('foundation', self.index.vocabulary())
+
+    def test_snapshot_round_trip(self):
+        self.index.position = 7
+        restored = SearchIndex.loads(self.index.dumps())
+        self.assertEqual(restored.position, 7)
+        self.assertEqual(restored.search('desert'), self.index.search('desert'))
+        restored.remove(2)
+        self.assertEqual([doc for doc, score in restored.search('desert')], [1])
+        # Plain JSON: nothing in a snapshot file is run.
+        self.assertEqual(json.loads(self.index.dumps())['version'], 3)
+        with self.assertRaises(ValueError):
+            SearchIndex.loads(pickle.dumps({'version': 1}))
+
+    def test_top_results_match_exhaustive_scoring(self):
+        rng = random.Random(5)
+        words = ['river', 'garden', 'silent', 'golden', 'winter', 'story', 'war', 'sea', 'night']
+        index = SearchIndex()
+        for doc_id in range(1, 400):
+            index.add(doc_id, weighted_terms([
+                (' '.join(rng.choices(words, k=2)), 3), (' '.join(rng.choices(words, k=rng.randint(3, 30))), 1)]))
+        index.remove(7)
+        average_length = index.total_length / len(index)
+
+        def exhaustive(query, limit=10):
+            scores = []
+            for doc_id, (terms, frequencies) in index.documents.items():
+                score = 0.0
+                for group in index.parse_query(query):
+                    weights = [0.0]
+                    for term in set(group) & set(terms):
+                        tf = frequencies[terms.index(term)]
+                        df = index.document_frequency(term)
+                        idf = math.log(1 + (len(index) - df + 0.5) / (df + 0.5))
+                        weights.append(idf * tf * (index.k1 + 1) / (
+                            tf + index.k1 * (1 - index.b + index.b * sum(frequencies) / average_length)))
+                    score += max(weights)
+                if score:
+                    scores.append((score, -doc_id))
+            return [(-doc_id, score) for score, doc_id in sorted(scores, reverse=True)[:limit]]
+
+        for query in ('story', 'silent river', 'war sea night', 'gol* winter', 's* river'):
+            with self.subTest(query=query):
+                expected = exhaustive(query)
+                results = index.search(query, limit=10)
+                self.assertEqual([doc for doc, score in results], [doc for doc, score in expected])
+                for (_, score), (_, expected_score) in zip(results, expected):
+                    self.assertAlmostEqual(score, expected_score)
+
+    def test_search_reads_only_the_top_of_long_postings(self):
+        index = SearchIndex()
+        for doc_id in range(1, 2001):
+            index.add(doc_id, weighted_terms([('Common words', 3), ('word ' * (doc_id % 40), 1)]))
+        with mock.patch.object(index, '_score', wraps=index._score) as score:
+            results = index.search('common', limit=5)
+        self.assertEqual(len(results), 5)
+        self.assertLess(score.call_count, 50)
+
+    def test_copy_leaves_original_unchanged(self):
+        vocabulary = list(self.index.vocabulary())
+        copy = self.index.copy()
+        copy.add(1, weighted_terms([('Desert Foundation', 3)]))
+        copy.remove(2)
+        self.assertEqual([doc for doc, score in copy.search('desert')], [1])
+        self.assertEqual([doc for doc, score in self.index.search('desert')], [2, 1])
+        self.assertEqual(self.index.search('foundation'), [])
+        self.assertEqual(self.index.vocabulary(), vocabulary)
+        self.assertIn('foundation', copy.vocabulary())
+
+
+class CatalogSearchTest(TestCase):
+
+    def setUp(self):
+        self.snapshot = os.path.join(tempfile.mkdtemp(), 'search.snapshot')
+        self.settings_override = override_settings(CATALOG_SEARCH_SNAPSHOT=self.snapshot,
+                                                   CATALOG_SEARCH_SYNC_INTERVAL=0)
+        self.settings_override.enable()
+        search_index.reset_index()
+        self.author = Author.objects.create(first_name='Frank', last_name='Herbert')
+        self.language = Language.objects.create(name='English')
+        self.book = Book.objects.create(title='Dune', summary='Spice and sandworms on Arrakis.',
+                                        isbn='9780441013593', author=self.author, language=self.language)
+
+    def tearDown(self):
+        search_index.reset_index()
+        self.settings_override.disable()
+
+    def search_ids(self, query, **kwargs):
+        return [book_id for book_id, score in search_index.search_books(query, **kwargs)]
+
+    def test_signals_keep_index_current(self):
+        self.assertEqual(self.search_ids('arrakis'), [self.book.pk])
+        self.book.title = 'Children of Dune'
+        self.book.save()
+        self.assertEqual(self.search_ids('children'), [self.book.pk])
+        self.author.last_name = 'Herbertson'
+        self.author.save()
+        self.assertEqual(self.search_ids('herbertson'), [self.book.pk])
+        self.book.delete()
+        self.assertEqual(self.search_ids('children'), [])
+
+    def test_searches_do_not_wait_for_a_sync(self):
+        published = search_index.get_index()
+        Book.objects.create(title='Dune Messiah', summary='Sequel.', isbn='9780441172696',
+                            author=self.author, language=self.language)
+        # While another thread syncs, a search reads the published index without a query.
+        with search_index._lock, self.assertNumQueries(0):
+            self.assertIs(search_index.get_index(), published)
+        synced = search_index.get_index()
+        self.assertIsNot(synced, published)
+        self.assertEqual(len(synced.search('dune')), 2)
+        self.assertEqual(len(published.search('dune')), 1)
+
+        with override_settings(CATALOG_SEARCH_SYNC_INTERVAL=60):
+            search_index.reset_index()
+            search_index.get_index()
+            self.book.delete()
+            # Within the interval the journal is not read.
+            with self.assertNumQueries(0):
+                self.assertEqual(len(self.search_ids('dune')), 2)
+
+    def test_old_snapshot_format_is_rebuilt(self):
+        with open(self.snapshot, 'wb') as snapshot:
+            snapshot.write(pickle.dumps({'version': 1}))
+        self.assertIsNone(search_index.load_snapshot())
+        self.assertEqual(self.search_ids('arrakis'), [self.book.pk])
+
+    def test_rebuild_command_writes_snapshot_and_prunes_journal(self):
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertTrue(os.path.exists(self.snapshot))
+        self.assertFalse(SearchJournal.objects.exists())
+        self.assertEqual(search_index.load_snapshot().search('sandworms')[0][0], self.book.pk)
+
+        # A stale process notices the prune and reloads the snapshot.
+        Book.objects.create(title='Dune Messiah', summary='Sequel.', isbn='9780441172696',
+                            author=self.author, language=self.language)
+        self.assertEqual(len(self.search_ids('dune')), 2)
+
+    def test_rebuild_from_snapshot(self):
+        call_command('rebuild_search_index', '--no-prune', stdout=StringIO())
+        Book.objects.create(title='Dune Messiah', summary='Sequel.', isbn='9780441172696',
+                            author=self.author, language=self.language)
+        call_command('rebuild_search_index', '--from-snapshot', self.snapshot, stdout=StringIO())
+        self.assertEqual(len(search_index.load_snapshot().search('messiah')), 1)
+
+    def test_search_endpoint(self):
+        response = self.client.get(reverse('book-search'), {'q': 'herb', 'prefix': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([book['id'] for book in response.data['results']], [self.book.pk])
+        self.assertEqual(response.data['results'][0]['title'], 'Dune')
+        self.assertIn('score', response.data['results'][0])
+
+    def test_search_endpoint_empty_query(self):
+        response = self.client.get(reverse('book-search'))
+        self.assertEqual(response.data['results'], [])
+
+
+class DatabaseSearchTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='Ursula', last_name='Le Guin')
+        cls.language = Language.objects.create(name='English')
+        cls.earthsea = Book.objects.create(title='A Wizard of Earthsea', summary='A young mage.',
+                                           isbn='9780547773742', author=cls.author, language=cls.language)
+        cls.dispossessed = Book.objects.create(title='The Dispossessed', summary='Anarres and Urras; no wizard.',
+                                               isbn='9780061054884', author=cls.author, language=cls.language)
+        Book.objects.create(title='The Left Hand of Darkness', summary='Gethen in winter.',
+                            isbn='9780441478125', author=cls.author, language=cls.language)
+
+    def search_ids(self, query, **kwargs):
+        return [book.pk for book in fts.search_queryset(query, **kwargs)]
+
+    def test_fts_mirror_is_used_on_sqlite(self):
+        self.assertTrue(fts.fts_enabled())
+        self.assertIn('catalog_book_fts', str(fts.search_queryset('wizard').query))
+
+    def test_ranked_by_bm25(self):
+        self.assertEqual(self.search_ids('wizard'), [self.earthsea.pk, self.dispossessed.pk])
+
+    def test_prefix_and_author_names(self):
+        self.assertEqual(self.search_ids('earth*'), [self.earthsea.pk])
+        self.assertEqual(self.search_ids('ursula disposs', prefix=True), [self.dispossessed.pk])
+
+    def test_query_syntax_is_escaped(self):
+        self.assertEqual(self.search_ids('wizard AND OR NEAR("'), [])
+        self.assertEqual(self.search_ids('!!'), [])
+
+    def test_triggers_keep_mirror_in_sync(self):
+        self.earthsea.title = 'The Tombs of Atuan'
+        self.earthsea.save()
+        self.assertEqual(self.search_ids('atuan'), [self.earthsea.pk])
+        self.assertEqual(self.search_ids('earthsea'), [])
+        Author.objects.filter(pk=self.author.pk).update(last_name='LeGuin')
+        self.assertEqual(len(self.search_ids('leguin')), 3)
+        self.dispossessed.delete()
+        self.assertEqual(self.search_ids('anarres'), [])
+
+    def test_icontains_fallback(self):
+        with mock.patch.object(fts, 'fts_enabled', return_value=False):
+            self.assertEqual(self.search_ids('guin wizard'), [self.earthsea.pk])
+            # The fallback never scans the summary column.
+            self.assertEqual(self.search_ids('anarres'), [])
+
+    @override_settings(CATALOG_SEARCH_BACKEND='database')
+    def test_search_endpoint_database_backend(self):
+        response = self.client.get(reverse('book-search'), {'q': 'wizard'})
+        self.assertEqual([book['id'] for book in response.data['results']],
+                         [self.earthsea.pk, self.dispossessed.pk])
+        self.assertIsNotNone(response.data['results'][0]['score'])
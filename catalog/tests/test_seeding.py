@@ -0,0 +1,74 @@
+import io
+import json
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.db.models import Count
+from django.test import TestCase
+
+from catalog import availability, counters, isbn as isbns, seeding
+from catalog.models import Book, BookAvailability, BookInstance, BorrowedBook, SearchJournal
+
+
+class SeedCatalogTest(TestCase):
+
+    def test_seed(self):
+        out = io.StringIO()
+        call_command('seed_catalog', '--books', '300', '--copies-per-book', '2', '--users', '20',
+                     '--loans', '150', '--chunk-size', '70', stdout=out)
+        self.assertIn('Added 300 books, 600 copies, 37 authors, 20 patrons and 150 loans', out.getvalue())
+
+        self.assertEqual(BorrowedBook.objects.count(), 150)
+        self.assertEqual(SearchJournal.objects.count(), 300)
+        self.assertEqual(counters.get_counts(), counters.exact_counts())
+        stored = {row.pop('book_id'): row for row in BookAvailability.objects.values('book_id', *availability.FIELDS)}
+        self.assertEqual(stored, availability.compute(Book.objects.values_list('pk', flat=True)))
+        for isbn in Book.objects.values_list('isbn', flat=True)[:20]:
+            self.assertEqual(isbns.normalize(isbn), isbn)
+        genres = Book.objects.annotate(genres=Count('genre')).values_list('genres', flat=True)
+        self.assertEqual(set(genres), {1, 2, 3})
+
+        # Zipf skew: the most read book is lent out in full, most books not at all.
+        lent = BookInstance.objects.filter(status='o').values('book').annotate(n=Count('pk'))
+        self.assertEqual(max(row['n'] for row in lent), 2)
+        self.assertLess(len(lent), 150)
+
+        # Seeding again continues the ISBN range, with new copy ids.
+        seeding.seed(10, copies_per_book=1)
+        seeding.seed(10, copies_per_book=1)
+        self.assertEqual(Book.objects.filter(isbn__startswith=seeding.ISBN_PREFIX).count(), 320)
+
+    def test_seed_reproduces_catalog(self):
+        def catalog():
+            seeding.seed(20, copies_per_book=2, users=3, loans=10, random_seed=7)
+            return (list(Book.objects.order_by('isbn').values_list('isbn', 'title', 'summary')),
+                    sorted(BookInstance.objects.values_list('id', 'book__isbn', 'status')))
+
+        first = catalog()
+        self.assertTrue(all(copy_id.version == 4 for copy_id, _, _ in first[1]))
+        BookInstance.objects.all().delete()
+        Book.objects.all().delete()
+        self.assertEqual(catalog(), first)
+
+
+class BenchmarkCatalogTest(TestCase):
+
+    def test_every_catalog_url(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            call_command('benchmark_catalog', '--scales', '40', '--requests', '2', '--output', output,
+                         stdout=io.StringIO())
+            with open(output) as file:
+                results = json.load(file)
+        [scale] = results['scales']
+        self.assertEqual(scale['books'], 40)
+        names = {url['name'] for url in scale['urls']}
+        self.assertTrue({'index', 'books', 'book-detail', 'my-borrowed', 'book-list', 'catalog-export'} <= names)
+        for url in scale['urls']:
+            self.assertLess(url['status'], 500, url['path'])
+            self.assertLessEqual(url['p50_ms'], url['p95_ms'])
+            self.assertGreater(url['peak_memory_kb'], 0)
+        detail = next(url for url in scale['urls'] if url['name'] == 'book-detail')
+        self.assertEqual(detail['status'], 200)
+        self.assertGreater(detail['queries'], 0)
@@ -0,0 +1,82 @@
+import io
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog import sqlstats
+from catalog.models import Author, Book, Genre, SQLStat
+
+
+class SQLStatsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser(username='admin', password='1X<ISRUkw+tuK')
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        genre = Genre.objects.create(name='Fantasy')
+        for n in range(6):
+            book = Book.objects.create(title=f'Book {n}', summary='Summary', isbn=f'ISBN{n}', author=author)
+            book.genre.add(genre)
+
+    def setUp(self):
+        sqlstats.reset()
+        self.client.force_login(self.admin)
+
+    def test_fingerprint(self):
+        self.assertEqual(sqlstats.fingerprint('SELECT "a" FROM "t" WHERE "id" IN (%s, %s, %s) AND "n" = 12'),
+                         sqlstats.fingerprint('SELECT "a" FROM "t" WHERE "id" IN (%s) AND "n" = 7'))
+        self.assertEqual(sqlstats.fingerprint("SELECT 'it''s', \"col_1\""), 'SELECT ?, "col_1"')
+
+    def test_sampling_off(self):
+        response = self.client.get(reverse('books'))
+        self.assertNotIn('Server-Timing', response.headers)
+        self.assertEqual(sqlstats.report(), [])
+
+    @override_settings(CATALOG_SQL_SAMPLE_RATE=1)
+    def test_flags_n_plus_one(self):
+        with self.assertLogs('catalog.sql', 'INFO') as logs:
+            response = self.client.get(reverse('admin:catalog_book_changelist'))
+            self.client.get(reverse('admin:catalog_book_changelist'))
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response.headers['Server-Timing'], r'^sql;dur=[\d.]+;desc="\d+ queries, \d+ repeated"$')
+        # Book.display_genre() queries the genres of each book, the author column its author.
+        record = logs.records[0]
+        self.assertEqual(record.levelname, 'WARNING')
+        suspects = {suspect['sql'].split(' FROM ')[1].split()[0]: suspect['count']
+                    for suspect in record.sql_stats['n_plus_one']}
+        self.assertEqual(suspects, {'"catalog_genre"': 6, '"catalog_author"': 6})
+
+        [entry] = sqlstats.report()
+        self.assertEqual((entry['url_name'], entry['requests'], entry['n_plus_one']),
+                         ('admin:catalog_book_changelist', 2, 2))
+        self.assertEqual(entry['queries'], 2 * record.sql_stats['queries'])
+        out = io.StringIO()
+        call_command('sql_report', '--reset', stdout=out)
+        self.assertIn('N+1: 6x SELECT', out.getvalue())
+        self.assertEqual(sqlstats.report(), [])
+
+    @override_settings(CATALOG_SQL_SAMPLE_RATE=1)
+    def test_clean_view(self):
+        with self.assertLogs('catalog.sql', 'INFO') as logs:
+            self.client.get(reverse('books'))
+        self.assertEqual(logs.records[0].levelname, 'INFO')
+        self.assertEqual(logs.records[0].sql_stats['url_name'], 'books')
+        self.assertEqual(connection.execute_wrappers, [])
+
+    @override_settings(CATALOG_SQL_SAMPLE_RATE=1)
+    def test_totals_shared_through_database(self):
+        # What sql_report reads in a process of its own, whichever worker served the requests.
+        with self.assertLogs('catalog.sql', 'INFO'):
+            self.client.get(reverse('books'))
+            self.client.get(reverse('books'))
+            self.client.get(reverse('authors'))
+        self.assertEqual(dict(SQLStat.objects.values_list('url_name', 'requests')), {'books': 2, 'authors': 1})
+        # A row another worker created is added to, not replaced.
+        recorder = sqlstats.Recorder()
+        recorder.count = 3
+        SQLStat.objects.create(url_name='raced')
+        sqlstats.aggregate('raced', recorder)
+        self.assertEqual(SQLStat.objects.get(url_name='raced').queries, 3)
@@ -1,3 +1,4 @@
+from django.core.cache import cache
 from django.test import TestCase
 
 # Create your tests here.
@@ -17,6 +18,10 @@ class AuthorListViewTest(TestCase):
             Author.objects.create(first_name='Christian {0}'.format(author_id),
                                   last_name='Surname {0}'.format(author_id))
 
+    def setUp(self):
+        # These tests inspect the rendering, which a cached page skips.
+        cache.clear()
+
     def test_view_url_exists_at_desired_location(self):
         response = self.client.get('/catalog/authors/')
         self.assertEqual(response.status_code, 200)
@@ -411,3 +416,74 @@ class AuthorCreateViewTest(TestCase):
         # Manually check redirect because we don't know what author was created
         self.assertEqual(response.status_code, 302)
         self.assertTrue(response.url.startswith('/catalog/author/'))
+
+
+class DetailViewQueryCountTest(TestCase):
+    """Detail pages run a fixed number of queries however many books and copies they show."""
+
+    def setUp(self):
+        self.author = Author.objects.create(first_name='John', last_name='Smith')
+        self.genre = Genre.objects.create(name='Fantasy')
+        self.language = Language.objects.create(name='English')
+        self.librarian = User.objects.create_user(username='librarian', password='2HJ1vRV0Z&3iD')
+        for codename in ('change_book', 'delete_book', 'change_author', 'delete_author',
+                         'change_genre', 'delete_genre'):
+            self.librarian.user_permissions.add(Permission.objects.get(codename=codename))
+
+    def add_book(self, copies):
+        book = Book.objects.create(title=f'Book {Book.objects.count()}', summary='Summary',
+                                   isbn=f'ISBN{Book.objects.count()}', author=self.author,
+                                   language=self.language)
+        book.genre.set([self.genre])
+        for i in range(copies):
+            BookInstance.objects.create(book=book, imprint='Imprint', status='ao'[i % 2],
+                                        due_back=datetime.date.today())
+        return book
+
+    def assertConstantQueries(self, url_name, pk, num):
+        for grow in (0, 3):
+            for i in range(grow):
+                self.add_book(copies=4)
+            with self.assertNumQueries(num):
+                response = self.client.get(reverse(url_name, args=[pk]))
+            self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_book_detail(self):
+        book = self.add_book(copies=1)
+        response = self.assertConstantQueries('book-detail', book.pk, 4)
+        self.assertTemplateUsed(response, 'catalog/book_detail.html')
+        self.assertTrue(response.context['book'].has_copies)
+
+    def test_book_detail_copies_grow(self):
+        book = self.add_book(copies=1)
+        with self.assertNumQueries(4):
+            self.client.get(reverse('book-detail', args=[book.pk]))
+        for i in range(5):
+            BookInstance.objects.create(book=book, imprint='Imprint')
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('book-detail', args=[book.pk]))
+        self.assertContains(response, 'Imprint:</strong>', count=6)
+
+    def test_author_detail(self):
+        self.add_book(copies=2)
+        response = self.assertConstantQueries('author-detail', self.author.pk, 3)
+        self.assertTemplateUsed(response, 'catalog/author_detail.html')
+        self.assertEqual([book.copy_count for book in response.context['author'].book_set.all()],
+                         [2, 4, 4, 4])
+
+    def test_genre_detail(self):
+        self.add_book(copies=0)
+        response = self.assertConstantQueries('genre-detail', self.genre.pk, 3)
+        self.assertTemplateUsed(response, 'catalog/genre_detail.html')
+        self.assertContains(response, 'Smith, John', count=4)
+
+    def test_delete_links_for_librarian(self):
+        book = self.add_book(copies=0)
+        self.client.force_login(self.librarian)
+        response = self.client.get(reverse('book-detail', args=[book.pk]))
+        self.assertContains(response, reverse('book-delete', args=[book.pk]))
+        response = self.client.get(reverse('author-detail', args=[self.author.pk]))
+        self.assertNotContains(response, reverse('author-delete', args=[self.author.pk]))
+        response = self.client.get(reverse('genre-detail', args=[self.genre.pk]))
+        self.assertNotContains(response, reverse('genre-delete', args=[self.genre.pk]))
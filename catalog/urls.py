@@ -5,18 +5,18 @@ from . import views
 from .views import LoginView
 
 
-from .views import AuthorListCreateView,AuthorUpdateView, AuthorDetailView
+from .views import AuthorListCreateView,AuthorUpdateView, AuthorRetrieveDestroyView
 
 
-# from .views import BorrowBookAPI
+from .views import BorrowBookAPI
 from .views import BorrowBookView
 
-from .views import GenreListView, GenreUpdateView, GenreDeleteView, GenreDetailView
+from .views import GenreListView, GenreUpdateView, GenreDeleteView, GenreRetrieveView
 
 
 # urls.py
 from .views import (
-    BookListView, BookUpdateView, BookDeleteView, BookDetailView,
+    BookListView, BookUpdateView, BookDeleteView, BookRetrieveView,
     BorrowerListView, BorrowerDetailView
 )
 
@@ -31,6 +31,11 @@ from .views import UserCreateView
 
 
 from .views import LanguageListView, LanguageCreateView, LanguageUpdateView, LanguageDeleteView
+from .views import BookSearchView
+from .views import AuthorBulkCreateView, BookBulkCreateView, BookInstanceBulkCreateView
+from .views import CatalogExportView
+from .views import BookInstanceAPIListView
+from .views import HoldCancelView, HoldListCreateView
 
 
 urlpatterns = [
@@ -38,7 +43,8 @@ urlpatterns = [
     path('api/books/create/', BookListView.as_view(), name='book-create'),
     path('api/books/update/<int:pk>/', BookUpdateView.as_view(), name='book-update'),
     path('api/books/delete/<int:pk>/', BookDeleteView.as_view(), name='book-delete'),
-    path('api/books/view/<int:pk>/', BookDetailView.as_view(), name='book-view'),
+    path('api/books/view/<int:pk>/', BookRetrieveView.as_view(), name='book-view'),
+    path('api/books/available/', BorrowBookAPI.as_view(), name='book-available'),
     path('api/borrowers/', BorrowerListView.as_view(), name='borrower-list'),
     path('api/borrowers/<int:pk>/', BorrowerDetailView.as_view(), name='borrower-detail'),
     path('api/login/', LoginView.as_view(), name='api-login'),
@@ -50,13 +56,21 @@ urlpatterns = [
     path('api/genres/create/', GenreListView.as_view(), name='genre-create'),
     path('api/genres/update/<int:pk>/', GenreUpdateView.as_view(), name='genre-update'),
     path('api/genres/delete/<int:pk>/', GenreDeleteView.as_view(), name='genre-delete'),
-    path('api/genres/view/<int:pk>/', GenreDetailView.as_view(), name='genre-view'),
+    path('api/genres/view/<int:pk>/', GenreRetrieveView.as_view(), name='genre-view'),
     path('api/authors/', AuthorListCreateView.as_view(), name='author-view'),
     path('api/authors/create/', AuthorListCreateView.as_view(), name='author-list-create'),
-    path('api/authors/delete/<int:pk>/', AuthorDetailView.as_view(), name='author-detail'),
+    path('api/authors/delete/<int:pk>/', AuthorRetrieveDestroyView.as_view(), name='author-detail'),
     path('api/authors/update/<int:pk>/', AuthorUpdateView.as_view(), name='author-update'),
     path('api/borrow-books/', BorrowBookView.as_view(), name='borrow-books'),
     path('api/users/create/', UserCreateView.as_view(), name='user-create'),
+    path('api/search/', BookSearchView.as_view(), name='book-search'),
+    path('api/books/bulk/', BookBulkCreateView.as_view(), name='book-bulk'),
+    path('api/authors/bulk/', AuthorBulkCreateView.as_view(), name='author-bulk'),
+    path('api/bookinstances/', BookInstanceAPIListView.as_view(), name='bookinstance-api-list'),
+    path('api/bookinstances/bulk/', BookInstanceBulkCreateView.as_view(), name='bookinstance-bulk'),
+    path('api/export/<str:dataset>.<str:fmt>', CatalogExportView.as_view(), name='catalog-export'),
+    path('api/holds/', HoldListCreateView.as_view(), name='hold-list'),
+    path('api/holds/<int:pk>/', HoldCancelView.as_view(), name='hold-cancel'),
     # Add other API patterns as needed
 ]
 
@@ -76,6 +90,7 @@ urlpatterns += [
 urlpatterns += [
     path('mybooks/', views.LoanedBooksByUserListView.as_view(), name='my-borrowed'),
     path(r'borrowed/', views.LoanedBooksAllListView.as_view(), name='all-borrowed'),  # Added for challenge
+    path('borrowed/overdue/', views.LoanedBooksAllListView.as_view(overdue_only=True), name='all-overdue'),
 ]
 
 
@@ -0,0 +1,93 @@
+"""Per-model version stamps for conditional GET (ETag / Last-Modified).
+
+Each tracked model has a CatalogCounter row ``version:<model>``. The signal
+handlers in catalog/signals.py call bump() whenever an instance of the model is
+saved, deleted or has its many-to-many links changed, inside the same
+transaction. The stamp is the time of the change in microseconds, forced to
+grow by at least one on every bump, so it serves as both the version (for
+ETags) and the modification time (for Last-Modified).
+
+conditional() wraps a view with django.views.decorators.http.condition(): one
+query reads the stamps the view depends on, and a client whose copy is current
+gets 304 Not Modified before the view builds any queryset. Code that writes
+without signals (bulk_create(), queryset.update()) must call bump() itself.
+"""
+import datetime
+import hashlib
+import time
+
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.views.decorators.http import condition
+
+from .models import CatalogCounter
+from .serializers import expanded_paths
+
+AUTHOR = 'author'
+BOOK = 'book'
+BOOKINSTANCE = 'bookinstance'
+GENRE = 'genre'
+LANGUAGE = 'language'
+
+PREFIX = 'version:'
+
+
+def now_stamp():
+    return int(time.time() * 1_000_000)
+
+
+def bump(*names):
+    """Advance the version stamps of the given models."""
+    stamp = now_stamp()
+    for name in names:
+        updated = CatalogCounter.objects.filter(name=PREFIX + name).update(value=Greatest(F('value') + 1, stamp))
+        if not updated:
+            CatalogCounter.objects.get_or_create(name=PREFIX + name, defaults={'value': stamp})
+
+
+def get_versions(names):
+    """Return {name: stamp} with one query; models never bumped have stamp 0."""
+    stamps = dict(CatalogCounter.objects.filter(name__in=[PREFIX + name for name in names])
+                  .values_list('name', 'value'))
+    return {name: stamps.get(PREFIX + name, 0) for name in names}
+
+
+def conditional(*names, expandable=None, default_expand=()):
+    """View decorator answering If-None-Match / If-Modified-Since from the stamps of names.
+
+    expandable maps the relations a request can expand (?expand=, see
+    serializers.DynamicFieldsMixin) to the models they embed, whose stamps then
+    count as well; default_expand lists those expanded unless collapsed, as
+    the serializer's Meta.default_expand does. The ETag also covers the user
+    and the Accept header, since pages show who is logged in and the API
+    renders JSON or HTML from the same URL.
+    """
+    def request_names(request):
+        expanded = expanded_paths(request.GET.get('fields', ''), request.GET.get('expand', ''), default_expand)
+        extra = [name for path in sorted(expandable or {}) if path in expanded for name in expandable[path]]
+        return tuple(dict.fromkeys(names + tuple(extra)))
+
+    def versions(request):
+        # condition() asks for the ETag and the modification time separately.
+        cached = getattr(request, '_catalog_versions', None)
+        if cached is None or cached[0] != names:
+            cached = (names, get_versions(request_names(request)))
+            request._catalog_versions = cached
+        return cached[1]
+
+    def etag(request, *args, **kwargs):
+        stamps = versions(request)
+        key = '|'.join([
+            *(f'{name}={stamp}' for name, stamp in stamps.items()),
+            str(request.user.pk),
+            request.META.get('HTTP_ACCEPT', ''),
+        ])
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        stamp = max(versions(request).values(), default=0)
+        if not stamp:
+            return None
+        return datetime.datetime.fromtimestamp(stamp / 1_000_000, tz=datetime.timezone.utc)
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
@@ -3,16 +3,24 @@ from django.shortcuts import render
 # Create your views here.
 
 from .models import Book, Author, BookInstance, Genre, Language
+from django.utils.decorators import method_decorator
+
+from . import borrowing, circulation, counters, overdue, pagecache
+from .mixins import CompiledListMixin, PageCacheMixin, StreamingRenderMixin
+from .versioning import AUTHOR, BOOK, BOOKINSTANCE, GENRE, LANGUAGE, conditional
+
+# The models embedded by each relation book API responses can ?expand=.
+BOOK_EXPANDABLE = {'author': [AUTHOR], 'language': [LANGUAGE]}
 
 def index(request):
     """View function for home page of site."""
-    # Generate counts of some of the main objects
-    num_books = Book.objects.all().count()
-    num_instances = BookInstance.objects.all().count()
+    # Counts of the main objects are maintained by signals; read them in one query.
+    counts = counters.get_counts()
+    num_books = counts[counters.BOOKS]
+    num_instances = counts[counters.INSTANCES]
     # Available copies of books
-    num_instances_available = BookInstance.objects.filter(
-        status__exact='a').count()
-    num_authors = Author.objects.count()  # The 'all()' is implied by default.
+    num_instances_available = counts[counters.INSTANCES_AVAILABLE]
+    num_authors = counts[counters.AUTHORS]
 
     # Number of visits to this view, as counted in the session variable.
     num_visits = request.session.get('num_visits', 1)
@@ -27,6 +35,7 @@ def index(request):
                  'num_visits': num_visits},
     )
 
+from django.db.models import Count, Exists, OuterRef, Prefetch
 from django.views import generic
 
 
@@ -35,24 +44,62 @@ class BookListView(generic.ListView):
     model = Book
     paginate_by = 10
 
-class BookDetailView(generic.DetailView):
+@method_decorator(conditional(BOOK, AUTHOR, GENRE, LANGUAGE, BOOKINSTANCE), name='get')
+class BookDetailView(PageCacheMixin, generic.DetailView):
     """Generic class-based detail view for a book."""
     model = Book
 
-class AuthorListView(generic.ListView):
+    def get_queryset(self):
+        # Everything book_detail.html reads, in a fixed number of queries.
+        return (
+            Book.objects.select_related('author', 'language', 'availability')
+            .prefetch_related('genre', 'bookinstance_set')
+            .annotate(has_copies=Exists(BookInstance.objects.filter(book=OuterRef('pk'))))
+        )
+
+class AuthorListView(PageCacheMixin, generic.ListView):
     """Generic class-based list view for a list of authors."""
     model = Author
     paginate_by = 10
 
-class AuthorDetailView(generic.DetailView):
+@method_decorator(conditional(AUTHOR, BOOK, BOOKINSTANCE), name='get')
+class AuthorDetailView(PageCacheMixin, generic.DetailView):
     """Generic class-based detail view for an author."""
     model = Author
 
+    def get_queryset(self):
+        # Each book carries its copy count, so author_detail.html never queries per book.
+        books = Book.objects.annotate(copy_count=Count('bookinstance')).order_by(*Book._meta.ordering)
+        return (
+            Author.objects.prefetch_related(Prefetch('book_set', queryset=books))
+            .annotate(has_books=Exists(Book.objects.filter(author=OuterRef('pk'))))
+        )
+
+    def get_cache_tags(self, response):
+        tags = super().get_cache_tags(response)
+        for book in self.object.book_set.all():
+            tags |= pagecache.object_tags(book)
+        return tags
+
 
-class GenreDetailView(generic.DetailView):
+@method_decorator(conditional(GENRE, BOOK, AUTHOR), name='get')
+class GenreDetailView(PageCacheMixin, generic.DetailView):
     """Generic class-based detail view for a genre."""
     model = Genre
 
+    def get_queryset(self):
+        books = Book.objects.select_related('author')
+        return (
+            Genre.objects.prefetch_related(Prefetch('book_set', queryset=books))
+            .annotate(has_books=Exists(Book.genre.through.objects.filter(genre=OuterRef('pk'))))
+        )
+
+    def get_cache_tags(self, response):
+        tags = super().get_cache_tags(response)
+        for book in self.object.book_set.all():
+            tags |= pagecache.object_tags(book)
+        return tags
+
 class GenreListView(generic.ListView):
     """Generic class-based list view for a list of genres."""
     model = Genre
@@ -88,7 +135,7 @@ class LoanedBooksByUserListView(LoginRequiredMixin, generic.ListView):
         return (
             BookInstance.objects.filter(borrower=self.request.user)
             .filter(status__exact='o')
-            .order_by('due_back')
+            .order_by('due_back', 'id')
         )
 
 # Added as part of challenge!
@@ -102,8 +149,16 @@ class LoanedBooksAllListView(PermissionRequiredMixin, generic.ListView):
     template_name = 'catalog/bookinstance_list_borrowed_all.html'
     paginate_by = 10
 
+    # Only the overdue loans (the all-overdue URL): a seek on the (status, due_back) index.
+    overdue_only = False
+
     def get_queryset(self):
-        return BookInstance.objects.filter(status__exact='o').order_by('due_back')
+        if self.overdue_only:
+            return overdue.loans().select_related('book', 'borrower')
+        return BookInstance.objects.filter(status__exact='o').order_by('due_back', 'id')
+
+    def get_context_data(self, **kwargs):
+        return super().get_context_data(overdue_only=self.overdue_only, **kwargs)
 
 from django.shortcuts import get_object_or_404
 from django.http import HttpResponseRedirect
@@ -127,12 +182,14 @@ def renew_book_librarian(request, pk):
 
         # Check if the form is valid:
         if form.is_valid():
-            # process the data in form.cleaned_data as required (here we just write it to the model due_back field)
-            book_instance.due_back = form.cleaned_data['renewal_date']
-            book_instance.save()
-
-            # redirect to a new URL:
-            return HttpResponseRedirect(reverse('all-borrowed'))
+            # process the data in form.cleaned_data as required (here we extend the loan to the new due date)
+            try:
+                circulation.renew(book_instance, form.cleaned_data['renewal_date'])
+            except circulation.CirculationError as error:
+                form.add_error(None, str(error))
+            else:
+                # redirect to a new URL:
+                return HttpResponseRedirect(reverse('all-borrowed'))
 
     # If this is a GET (or any other method) create the default form
     else:
@@ -274,6 +331,7 @@ from .models import BookInstance
 
 from .forms import BorrowBookForm  # Assuming you have a form for borrowing
 
+@login_required
 def borrow_book(request, pk):
     # Get the BookInstance object
     book_instance = get_object_or_404(BookInstance, pk=pk)
@@ -282,14 +340,15 @@ def borrow_book(request, pk):
         form = BorrowBookForm(request.POST)
 
         if form.is_valid():
-            # Your logic for processing the form and updating the book instance
-            # ...
-
-            # Redirect to a success page or another view
-            return HttpResponseRedirect(reverse('borrow_success'))
+            try:
+                circulation.borrow(request.user, copy=book_instance, due_back=form.cleaned_data['return_date'])
+            except circulation.CirculationError as error:
+                form.add_error(None, str(error))
+            else:
+                return HttpResponseRedirect(reverse('my-borrowed'))
 
     else:
-        form = BorrowBookForm()
+        form = BorrowBookForm(initial={'return_date': datetime.date.today() + circulation.loan_period()})
 
     return render(request, 'catalog/borrow_book.html', {'form': form, 'book_instance': book_instance})
 
@@ -317,14 +376,16 @@ class UserCreateView(generics.CreateAPIView):
 
 # views.py
 
-from rest_framework import generics
+from rest_framework import generics, permissions
 from rest_framework.response import Response
 from rest_framework import status
 from .models import BookInstance
 from .serializers import BorrowBookSerializer
 
 class BorrowBookView(generics.CreateAPIView):
+    """Lend a copy to a named patron: a librarian's action, for staff only."""
     serializer_class = BorrowBookSerializer
+    permission_classes = [permissions.IsAdminUser]
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -344,8 +405,10 @@ from rest_framework.response import Response
 from rest_framework import status
 from .models import Book,  BorrowedBook, Borrower
 from .serializers import BookSerializer, BorrowerSerializer
+from .mixins import EagerLoadingMixin
 
-class BookListView(generics.ListCreateAPIView):
+@method_decorator(conditional(BOOK, GENRE, BOOKINSTANCE, expandable=BOOK_EXPANDABLE), name='get')
+class BookListView(PageCacheMixin, StreamingRenderMixin, CompiledListMixin, EagerLoadingMixin, generics.ListCreateAPIView):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
 
@@ -358,7 +421,7 @@ class BookListView(generics.ListCreateAPIView):
     def perform_create(self, serializer):
         serializer.save()
 
-class BookUpdateView(generics.UpdateAPIView):
+class BookUpdateView(EagerLoadingMixin, generics.UpdateAPIView):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
 
@@ -389,11 +452,12 @@ class BookDeleteView(generics.DestroyAPIView):
         # Use the destroy method for handling POST requests as well
         return self.destroy(request, *args, **kwargs)
 
-class BookDetailView(generics.RetrieveAPIView):
+@method_decorator(conditional(BOOK, GENRE, BOOKINSTANCE, expandable=BOOK_EXPANDABLE), name='get')
+class BookRetrieveView(EagerLoadingMixin, generics.RetrieveAPIView):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
 
-class BorrowerListView(generics.ListCreateAPIView):
+class BorrowerListView(EagerLoadingMixin, generics.ListCreateAPIView):
     queryset = Borrower.objects.all()
     serializer_class = BorrowerSerializer
 
@@ -443,7 +507,8 @@ from rest_framework import status
 from .models import Language
 from .serializers import LanguageSerializer
 
-class LanguageListView(generics.ListCreateAPIView):
+@method_decorator(conditional(LANGUAGE), name='get')
+class LanguageListView(PageCacheMixin, StreamingRenderMixin, CompiledListMixin, EagerLoadingMixin, generics.ListCreateAPIView):
     queryset = Language.objects.all()
     serializer_class = LanguageSerializer
 
@@ -507,7 +572,8 @@ from rest_framework import status
 from .models import Genre
 from .serializers import GenreSerializer
 
-class GenreListView(generics.ListCreateAPIView):
+@method_decorator(conditional(GENRE), name='get')
+class GenreListView(PageCacheMixin, StreamingRenderMixin, CompiledListMixin, EagerLoadingMixin, generics.ListCreateAPIView):
     queryset = Genre.objects.all()
     serializer_class = GenreSerializer
 
@@ -553,7 +619,8 @@ class GenreDeleteView(generics.DestroyAPIView):
         return self.destroy(request, *args, **kwargs)
 
 
-class GenreDetailView(generics.RetrieveAPIView):
+@method_decorator(conditional(GENRE), name='get')
+class GenreRetrieveView(generics.RetrieveAPIView):
     queryset = Genre.objects.all()
     serializer_class = GenreSerializer
 
@@ -565,7 +632,8 @@ from rest_framework import status
 from .models import Author
 from .serializers import AuthorSerializer
 
-class AuthorListCreateView(generics.ListCreateAPIView):
+@method_decorator(conditional(AUTHOR), name='get')
+class AuthorListCreateView(StreamingRenderMixin, CompiledListMixin, EagerLoadingMixin, generics.ListCreateAPIView):
     queryset = Author.objects.all()
     serializer_class = AuthorSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -580,7 +648,7 @@ class AuthorListCreateView(generics.ListCreateAPIView):
         serializer.save()
 
     
-class AuthorDetailView(generics.RetrieveDestroyAPIView):
+class AuthorRetrieveDestroyView(generics.RetrieveDestroyAPIView):
     queryset = Author.objects.all()
     serializer_class = AuthorSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -618,16 +686,13 @@ from rest_framework import status
 from .models import Book, BorrowedBook
 from .serializers import BookSerializer
 
-class BorrowBookAPI(generics.ListAPIView):
+class BorrowBookAPI(EagerLoadingMixin, generics.ListAPIView):
+    queryset = Book.objects.all()
     serializer_class = BookSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        user = self.request.user
-        borrowed_books = BorrowedBook.objects.filter(borrower=user)
-        borrowed_book_ids = borrowed_books.values_list('book__id', flat=True)
-        available_books = Book.objects.exclude(id__in=borrowed_book_ids)
-        return available_books
+        return borrowing.available_books(self.request.user, super().get_queryset())
 
 
 
@@ -641,3 +706,189 @@ def your_view(request):
     return HttpResponse("CSRF protection is disabled for this view.")
 
 
+# views.py
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from django.conf import settings
+from .models import Book
+from .search import search_books
+from .search.fts import search_queryset
+from .serializers import BookSerializer, related_lookups
+
+
+class BookSearchView(APIView):
+    """Full-text search over book titles, summaries and author names, ranked by BM25.
+
+    ?q= is the query; ``term*`` matches a prefix, and ?prefix=1 treats the
+    last term as a prefix (search as you type). ?limit= caps the results.
+    CATALOG_SEARCH_BACKEND selects the in-process index ('memory') or the
+    database ('database': SQLite FTS5, icontains elsewhere).
+    """
+    default_limit = 20
+    max_limit = 100
+
+    def get(self, request, *args, **kwargs):
+        query = request.query_params.get('q', '').strip()
+        try:
+            limit = min(int(request.query_params.get('limit', self.default_limit)), self.max_limit)
+        except ValueError:
+            limit = self.default_limit
+        prefix = request.query_params.get('prefix') in ('1', 'true')
+
+        serializer = BookSerializer(context={'request': request})
+        select, prefetch = related_lookups(serializer)
+        queryset = Book.objects.select_related(*select).prefetch_related(*prefetch)
+        if not query:
+            hits = []
+        elif getattr(settings, 'CATALOG_SEARCH_BACKEND', 'memory') == 'database':
+            books = search_queryset(query, queryset, prefix=prefix)[:max(limit, 1)]
+            # bm25() ranks lower-is-better; unranked fallback matches have no score.
+            hits = [(book, -book.rank if hasattr(book, 'rank') else None) for book in books]
+        else:
+            ranked = search_books(query, limit=max(limit, 1), prefix=prefix)
+            books = queryset.in_bulk([book_id for book_id, score in ranked])
+            hits = [(books[book_id], score) for book_id, score in ranked if book_id in books]
+
+        results = BookSerializer([book for book, _ in hits], many=True, context={'request': request}).data
+        for data, (_, score) in zip(results, hits):
+            data['score'] = None if score is None else round(score, 4)
+        return Response({'query': query, 'results': results})
+
+
+
+# views.py
+from rest_framework.parsers import JSONParser
+from .bulk import AuthorLoader, BookInstanceLoader, BookLoader
+from .models import Author, Book, BookInstance
+from .parsers import NDJSONParser
+
+
+class BulkCreateView(APIView):
+    """Create many objects from a JSON array or an NDJSON stream (see catalog/bulk.py).
+
+    ?chunk_size= overrides CATALOG_BULK_CHUNK_SIZE. The response lists the
+    primary keys created and the errors of rejected rows by input position;
+    it is 201 if every row was created, 400 if none was and 207 otherwise.
+    """
+    loader_class = None
+    parser_classes = [JSONParser, NDJSONParser]
+    permission_classes = [permissions.DjangoModelPermissions]
+
+    def post(self, request, *args, **kwargs):
+        rows = request.data
+        if isinstance(rows, dict):
+            return Response({'detail': 'Expected a list of objects.'}, status=status.HTTP_400_BAD_REQUEST)
+        chunk_size = request.query_params.get('chunk_size')
+        if chunk_size is not None:
+            try:
+                chunk_size = int(chunk_size)
+            except ValueError:
+                chunk_size = 0
+            if chunk_size < 1:
+                return Response({'detail': 'chunk_size must be a positive integer.'},
+                                status=status.HTTP_400_BAD_REQUEST)
+        loader = self.loader_class(chunk_size=chunk_size).load(rows)
+        errors = sorted(loader.errors, key=lambda error: error['index'])
+        if not errors:
+            response_status = status.HTTP_201_CREATED
+        elif not loader.created:
+            response_status = status.HTTP_400_BAD_REQUEST
+        else:
+            response_status = status.HTTP_207_MULTI_STATUS
+        return Response({'created': loader.created, 'errors': errors}, status=response_status)
+
+
+class BookBulkCreateView(BulkCreateView):
+    queryset = Book.objects.none()
+    loader_class = BookLoader
+
+
+class AuthorBulkCreateView(BulkCreateView):
+    queryset = Author.objects.none()
+    loader_class = AuthorLoader
+
+
+class BookInstanceBulkCreateView(BulkCreateView):
+    queryset = BookInstance.objects.none()
+    loader_class = BookInstanceLoader
+
+
+# views.py
+from django.http import Http404, StreamingHttpResponse
+from . import export
+
+
+class CatalogExportView(APIView):
+    """Stream a whole dataset (books, authors or bookinstances) as CSV or NDJSON.
+
+    Rows are read and encoded chunk by chunk (see catalog/export.py), so the
+    response starts at once and memory stays flat however large the catalog.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, dataset, fmt, *args, **kwargs):
+        if dataset not in export.DATASETS or fmt not in export.FORMATS:
+            raise Http404('Unknown export.')
+        response = StreamingHttpResponse(export.stream(dataset, fmt), content_type=export.CONTENT_TYPES[fmt])
+        response['Content-Disposition'] = f'attachment; filename="{dataset}.{fmt}"'
+        return response
+
+
+# views.py
+from .serializers import BookInstanceSerializer
+
+
+@method_decorator(conditional(BOOKINSTANCE, expandable={
+    'book': [BOOK, GENRE], 'book.author': [AUTHOR], 'book.language': [LANGUAGE]},
+    default_expand=BookInstanceSerializer.Meta.default_expand), name='get')
+class BookInstanceAPIListView(StreamingRenderMixin, EagerLoadingMixin, generics.ListAPIView):
+    """Book copies with their books embedded; ?expand=-book gives book ids, ?fields= picks the fields."""
+    queryset = BookInstance.objects.all()
+    serializer_class = BookInstanceSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+
+# views.py
+from rest_framework.exceptions import ValidationError
+from . import holds
+from .models import Hold
+from .pagination import HoldCursorPagination
+from .serializers import HoldSerializer
+
+
+class HoldListCreateView(generics.ListCreateAPIView):
+    """The current user's open holds with their queue positions; POST {"book": id} places a hold."""
+    serializer_class = HoldSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    # Cursor pagination orders the page itself; an order_by() here would be replaced.
+    pagination_class = HoldCursorPagination
+
+    def get_queryset(self):
+        return Hold.objects.filter(patron=self.request.user, status__in=Hold.OPEN_STATUSES)
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        return page if page is None else holds.positions(page)
+
+
+class HoldCancelView(generics.DestroyAPIView):
+    """DELETE withdraws one of the current user's open holds."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return Hold.objects.filter(patron=self.request.user, status__in=Hold.OPEN_STATUSES)
+
+    def perform_destroy(self, instance):
+        try:
+            holds.cancel(instance)
+        except circulation.CirculationError as error:
+            raise ValidationError({'detail': str(error)})
+
+
+# views.py
+from . import metrics as catalog_metrics
+
+
+def metrics(request):
+    """The request and query metrics of all worker processes, in the Prometheus text format."""
+    return HttpResponse(catalog_metrics.render(), content_type=catalog_metrics.CONTENT_TYPE)
@@ -55,12 +55,104 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.BasicAuthentication',
     ),
+    # Keyset pagination for every list endpoint; clients may ask for a smaller
+    # or larger page with ?page_size= up to CATALOG_API_MAX_PAGE_SIZE.
+    'DEFAULT_PAGINATION_CLASS': 'catalog.pagination.CatalogCursorPagination',
+    'PAGE_SIZE': int(os.environ.get('CATALOG_API_PAGE_SIZE', 20)),
+    # Same bytes as DRF's JSONRenderer, encoded faster (catalog/renderers.py).
+    'DEFAULT_RENDERER_CLASSES': (
+        'catalog.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
 }
 
+CATALOG_API_MAX_PAGE_SIZE = int(os.environ.get('CATALOG_API_MAX_PAGE_SIZE', 100))
+
+# Snapshot of the in-process book search index (see catalog/search/index.py),
+# written by `manage.py rebuild_search_index` and loaded by each worker.
+CATALOG_SEARCH_SNAPSHOT = os.environ.get('CATALOG_SEARCH_SNAPSHOT', BASE_DIR / 'search_index.snapshot')
+
+# Seconds between two replays of the search journal into a worker's index:
+# changes to books show in search results this long after at most. Searches
+# never wait on a replay; 0 replays before every search that finds no replay
+# already running.
+CATALOG_SEARCH_SYNC_INTERVAL = float(os.environ.get('CATALOG_SEARCH_SYNC_INTERVAL', 1.0))
+
+# 'memory' serves /catalog/api/search/ from that index; 'database' uses the
+# SQLite FTS5 mirror (icontains on other backends, see catalog/search/fts.py).
+CATALOG_SEARCH_BACKEND = os.environ.get('CATALOG_SEARCH_BACKEND', 'memory')
+
+# Seconds to cache the ids of the books each user has borrowed, for the
+# /catalog/api/books/available/ list (catalog/borrowing.py); 0 disables it.
+# With several workers this needs a shared CACHES backend.
+CATALOG_BORROWED_CACHE_TIMEOUT = int(os.environ.get('CATALOG_BORROWED_CACHE_TIMEOUT', 0))
+
+# Seconds anonymous catalog pages stay in the tag-invalidated page cache
+# (catalog/pagecache.py); 0 disables it. Invalidation goes through the CACHES
+# backend, so running more than one worker process needs a shared one.
+CATALOG_PAGE_CACHE_TIMEOUT = int(os.environ.get('CATALOG_PAGE_CACHE_TIMEOUT', 300))
+
+# Seconds each book's serialized representation stays in the cache
+# (catalog/reprcache.py); 0 disables it. Needs a shared CACHES backend with
+# more than one worker process, like the page cache.
+CATALOG_REPRESENTATION_CACHE_TIMEOUT = int(os.environ.get('CATALOG_REPRESENTATION_CACHE_TIMEOUT', 300))
+
+# Opt in to serving the book, author, genre and language API lists through
+# compiled serializers over values() rows (catalog/compiled.py); same output,
+# less CPU. Off unless the variable is True.
+CATALOG_COMPILED_SERIALIZERS = os.environ.get('CATALOG_COMPILED_SERIALIZERS', '') == 'True'
+
+# API responses holding a list longer than this are encoded and streamed this
+# many items at a time (catalog/renderers.py). It defaults to the API page
+# size: pages of the default size go out whole, larger ones (?page_size=, up
+# to CATALOG_API_MAX_PAGE_SIZE) are streamed. Keep it below the maximum page
+# size, or no page is ever streamed.
+CATALOG_JSON_CHUNK_SIZE = int(os.environ.get('CATALOG_JSON_CHUNK_SIZE', REST_FRAMEWORK['PAGE_SIZE']))
+
+# Responses of at least this many bytes are sent gzip or deflate compressed
+# to clients accepting it (catalog/compression.py).
+CATALOG_COMPRESSION_MIN_SIZE = int(os.environ.get('CATALOG_COMPRESSION_MIN_SIZE', 1024))
+
+# Seconds the compressed body of a response with an ETag is kept for the next
+# request of the same page; 0 compresses every response anew.
+CATALOG_COMPRESSION_CACHE_TIMEOUT = int(os.environ.get('CATALOG_COMPRESSION_CACHE_TIMEOUT', 300))
+
+# Days a copy is lent for, and renewed for by default (catalog/circulation.py).
+CATALOG_LOAN_PERIOD_DAYS = int(os.environ.get('CATALOG_LOAN_PERIOD_DAYS', 21))
+
+# Days a copy set aside for a hold waits to be picked up (catalog/holds.py).
+CATALOG_HOLD_PICKUP_DAYS = int(os.environ.get('CATALOG_HOLD_PICKUP_DAYS', 7))
+
+# Share of requests (0 to 1) whose queries are counted, timed and reported
+# (catalog/sqlstats.py): Server-Timing header, 'catalog.sql' log line and
+# ``manage.py sql_report``. 0 leaves requests uninstrumented. The per-URL
+# totals are kept in the database, so every worker adds to the same figures,
+# at the cost of an UPDATE per sampled request.
+CATALOG_SQL_SAMPLE_RATE = float(os.environ.get('CATALOG_SQL_SAMPLE_RATE', 0))
+
+# A SELECT run this many times in one instrumented request is reported as a
+# likely N+1 query.
+CATALOG_SQL_N_PLUS_ONE_THRESHOLD = int(os.environ.get('CATALOG_SQL_N_PLUS_ONE_THRESHOLD', 5))
+
+# Directory where each worker process keeps its metrics file, summed by the
+# /metrics endpoint (catalog/metrics.py); all workers of a server must share
+# it, and no other server should. Empty the directory when the server
+# restarts. Unset or '' turns metrics off.
+CATALOG_METRICS_DIR = os.environ.get('CATALOG_METRICS_DIR', '')
+
+# Rows inserted per transaction by the bulk create endpoints (catalog/bulk.py).
+CATALOG_BULK_CHUNK_SIZE = int(os.environ.get('CATALOG_BULK_CHUNK_SIZE', 500))
+
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    # Before compression, so response sizes are the bytes sent.
+    'catalog.middleware.MetricsMiddleware',
+    # Static files never reach the database; everything after this does.
+    'catalog.middleware.SQLStatsMiddleware',
+    # After WhiteNoise, which serves its own precompressed static files.
+    'catalog.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -183,3 +275,24 @@ STORAGES = {
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Logging
+# https://docs.djangoproject.com/en/4.2/topics/logging/
+# The per-request SQL figures of catalog/sqlstats.py go to the console.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'catalog.sql': {
+            'handlers': ['console'],
+            'level': os.environ.get('CATALOG_SQL_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
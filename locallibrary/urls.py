@@ -49,3 +49,10 @@ urlpatterns += [
 urlpatterns += [
     path('accounts/', include('django.contrib.auth.urls')),
 ]
+
+# Prometheus scrape endpoint (catalog/metrics.py).
+from catalog.views import metrics
+
+urlpatterns += [
+    path('metrics', metrics, name='metrics'),
+]